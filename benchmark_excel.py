@@ -0,0 +1,92 @@
+# benchmark_excel.py - compara leitura completa (pd.read_excel) x somente leitura em blocos
+import io
+import sys
+import time
+import random
+import tracemalloc
+from datetime import datetime, timedelta
+
+import pandas as pd
+from openpyxl import Workbook
+
+from extrato_service import NA_VALUES, processar_excel_em_blocos, transformar_dataframe
+
+HISTORICOS = [
+    'PIX RECEBIDO CLIENTE', 'TED ENVIADA FORNECEDOR', 'PAGAMENTO BOLETO ENERGIA',
+    'TARIFA BANCARIA', 'DEBITO AUTOMATICO INTERNET', 'CREDITO SALÁRIO', 'SAQUE 24H'
+]
+
+
+def gerar_planilha(linhas: int) -> bytes:
+    """Gera um extrato .xlsx sintético com a mesma estrutura dos bancos"""
+    aleatorio = random.Random(42)
+    workbook = Workbook(write_only=True)
+    planilha = workbook.create_sheet()
+    planilha.append(['Data', 'Histórico', 'Documento', 'Valor (R$)', 'Saldo (R$)'])
+    planilha.append([None, 'SALDO ANTERIOR', None, None, 1000.0])
+
+    data = datetime(2025, 1, 1)
+    saldo = 1000.0
+    for i in range(linhas):
+        valor = round(aleatorio.uniform(-5000, 5000), 2)
+        saldo = round(saldo + valor, 2)
+        planilha.append([
+            data + timedelta(days=i // 200),
+            f"{aleatorio.choice(HISTORICOS)} {i}",
+            str(100000 + i),
+            valor,
+            saldo
+        ])
+
+    arquivo = io.BytesIO()
+    workbook.save(arquivo)
+    return arquivo.getvalue()
+
+
+def caminho_completo(conteudo: bytes):
+    df = pd.read_excel(io.BytesIO(conteudo), engine='openpyxl', na_values=NA_VALUES)
+    df.columns = df.columns.str.strip()
+    return transformar_dataframe(df, 'AAI')
+
+
+def caminho_somente_leitura(conteudo: bytes):
+    transacoes = []
+    for bloco in processar_excel_em_blocos(io.BytesIO(conteudo), 'AAI', 5000):
+        transacoes.extend(bloco)
+    return transacoes
+
+
+def medir(nome: str, funcao, conteudo: bytes):
+    inicio = time.perf_counter()
+    transacoes = funcao(conteudo)
+    duracao = time.perf_counter() - inicio
+
+    # Memória medida numa segunda execução (tracemalloc deixa tudo mais lento)
+    tracemalloc.start()
+    funcao(conteudo)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"{nome:<20} {duracao:8.2f}s  pico {pico / 1024 / 1024:8.1f} MB  {len(transacoes)} transações")
+    return transacoes
+
+
+if __name__ == "__main__":
+    from loguru import logger
+    logger.remove()
+
+    linhas = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    print(f"Gerando planilha com {linhas} linhas...")
+    conteudo = gerar_planilha(linhas)
+    print(f"Planilha: {len(conteudo) / 1024 / 1024:.1f} MB")
+
+    completo = medir("pd.read_excel", caminho_completo, conteudo)
+    somente_leitura = medir("somente leitura", caminho_somente_leitura, conteudo)
+
+    def comparavel(transacao):
+        return {k: v for k, v in transacao.items() if k not in ('id', 'created_at')}
+
+    iguais = len(completo) == len(somente_leitura) and all(
+        comparavel(a) == comparavel(b) for a, b in zip(completo, somente_leitura)
+    )
+    print("Resultados idênticos" if iguais else "❌ Resultados divergentes")
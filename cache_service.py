@@ -4,17 +4,27 @@ import logging
 from typing import Any, Optional, Dict, List, Union
 from datetime import datetime, timedelta
 import asyncio
+import threading
 from functools import wraps
 
 logger = logging.getLogger(__name__)
 
 class CacheService:
+    # Estado que não é cópia do banco (jobs de upload, dialetos e formatos
+    # aprendidos, contadores): invalidações por padrão genérico não o apagam,
+    # só um padrão que comece pelo próprio prefixo
+    PREFIXOS_DURAVEIS = ('upload_job:', 'dialeto_csv:', 'formato_data:', 'perfil_csv:', 'contadores:')
+
     def __init__(self, redis_url: str = None, redis_host: str = "localhost", redis_port: int = 6379, redis_db: int = 0):
         """
         Inicializa o serviço de cache com Redis e fallback para memória
         """
         # Cache L1 (memória) - sempre disponível
         self.memory_cache: Dict[str, Dict] = {}
+        
+        # Contadores de transações sem Redis (fora do L1: não expiram nem são invalidados por padrão)
+        self.contadores: Dict[str, Union[int, str]] = {}
+        self._lock_contadores = threading.Lock()
                 
         # Cache L2 (Redis) - pode falhar
         self.redis_client = None
@@ -32,6 +42,8 @@ class CacheService:
             'transacoes': 300,          # 5 min - dados transacionais
             'stats': 300,               # 5 min - estatísticas
             'pendentes': 60,            # 1 min - dados dinâmicos
+            'dialetos': 86400,          # 24 horas - dialeto CSV por banco
+            'uploads': 86400,           # 24 horas - estado dos jobs de upload
             'default': 300              # 5 min - padrão
         }
                 
@@ -154,14 +166,20 @@ class CacheService:
         
         return True
 
+    def _protegida(self, key: str, pattern: str) -> bool:
+        """Chave durável que o padrão não nomeia explicitamente pelo prefixo"""
+        return any(key.startswith(prefixo) and not pattern.startswith(prefixo) for prefixo in self.PREFIXOS_DURAVEIS)
+
     def invalidate_pattern(self, pattern: str, cache_type: str = None) -> int:
         """
-        Invalida chaves que correspondem ao padrão
+        Invalida chaves que correspondem ao padrão (exceto as de PREFIXOS_DURAVEIS,
+        a menos que o padrão comece pelo prefixo delas)
         """
         count = 0
         
         # L1: Memória
-        keys_to_remove = [k for k in self.memory_cache.keys() if self._matches_pattern(k, pattern)]
+        keys_to_remove = [k for k in self.memory_cache.keys()
+                          if self._matches_pattern(k, pattern) and not self._protegida(k, pattern)]
         for key in keys_to_remove:
             del self.memory_cache[key]
             count += 1
@@ -169,7 +187,7 @@ class CacheService:
         # L2: Redis
         if self.redis_available:
             try:
-                keys = self.redis_client.keys(pattern)
+                keys = [k for k in self.redis_client.keys(pattern) if not self._protegida(k, pattern)]
                 if keys:
                     self.redis_client.delete(*keys)
                     count += len(keys)
@@ -282,6 +300,160 @@ class CacheService:
         """
         self.invalidate_pattern('lookups:*')
 
+    def invalidar_classificacoes(self):
+        """
+        Limpa a estrutura de classificações e os lookups após mudança em
+        classificações, planos de contas ou itens
+        """
+        self.invalidate_pattern('classificacoes:*')
+        self.clear_lookups_cache()
+
+    # MÉTODOS ESPECÍFICOS PARA JOBS DE UPLOAD
+
+    def get_upload_job(self, job_id: str) -> Optional[Dict]:
+        """
+        Busca estado de um job de upload. Lê o Redis antes do L1, pois o job
+        pode estar rodando em outro worker e o L1 deste ficaria desatualizado
+        """
+        key = f"upload_job:{job_id}"
+
+        if self.redis_available:
+            try:
+                value = self.redis_client.get(key)
+                if value:
+                    return self._deserialize_value(value)
+            except Exception as e:
+                logger.error(f"❌ Erro no Redis GET {key}: {e}")
+
+        cache_data = self.memory_cache.get(key)
+        if cache_data and cache_data['expires_at'] > datetime.now():
+            return cache_data['value']
+        return None
+
+    def set_upload_job(self, job_id: str, estado: Dict) -> bool:
+        """
+        Armazena estado de um job de upload
+        """
+        return self.set(f"upload_job:{job_id}", estado, 'uploads')
+
+    # CONTADORES DE TRANSAÇÕES POR BANCO E STATUS
+    #
+    # Hash com quantidade e valor (em centavos, para somar sem erro de ponto
+    # flutuante) de cada (banco, status), atualizado a cada inserção ou
+    # conciliação. Só vale depois de uma reconciliação com o banco, que grava
+    # o campo CAMPO_RECONCILIACAO; sem ele (ex.: hash apagado por uma
+    # invalidação) a leitura devolve None e quem lê reconcilia de novo
+
+    CHAVE_CONTADORES = 'contadores:transacoes'
+    CAMPO_RECONCILIACAO = '_reconciliado_em'
+
+    @staticmethod
+    def _variacoes_contadores(transacoes: List[Dict], sinal: int, status: Optional[str] = None) -> Dict[str, int]:
+        """Incrementos dos campos do hash para somar (sinal=1) ou subtrair (sinal=-1) as transações"""
+        variacoes: Dict[str, int] = {}
+        for transacao in transacoes:
+            grupo = f"{transacao.get('banco') or '-'}|{status or transacao.get('status') or '-'}"
+            variacoes[f"{grupo}|quantidade"] = variacoes.get(f"{grupo}|quantidade", 0) + sinal
+            variacoes[f"{grupo}|centavos"] = (variacoes.get(f"{grupo}|centavos", 0)
+                                              + sinal * round(float(transacao.get('valor') or 0) * 100))
+        return variacoes
+
+    def _incrementar_contadores(self, variacoes: Dict[str, int]):
+        """Aplica os incrementos no Redis (HINCRBY, atômico entre workers) ou na memória"""
+        variacoes = {campo: valor for campo, valor in variacoes.items() if valor}
+        if not variacoes:
+            return
+
+        if self.redis_available:
+            try:
+                pipe = self.redis_client.pipeline()
+                for campo, valor in variacoes.items():
+                    pipe.hincrby(self.CHAVE_CONTADORES, campo, valor)
+                pipe.execute()
+                return
+            except Exception as e:
+                logger.error(f"❌ Erro no Redis HINCRBY {self.CHAVE_CONTADORES}: {e}")
+
+        with self._lock_contadores:
+            for campo, valor in variacoes.items():
+                self.contadores[campo] = int(self.contadores.get(campo, 0)) + valor
+
+    def somar_transacoes_contadores(self, transacoes: List[Dict]):
+        """Somar transações recém-inseridas aos contadores do seu banco e status"""
+        self._incrementar_contadores(self._variacoes_contadores(transacoes, 1))
+
+    def mudar_status_contadores(self, transacoes: List[Dict], novo_status: str):
+        """Mover transações (com o status anterior) para `novo_status` nos contadores"""
+        variacoes = self._variacoes_contadores(transacoes, -1)
+        for campo, valor in self._variacoes_contadores(transacoes, 1, novo_status).items():
+            variacoes[campo] = variacoes.get(campo, 0) + valor
+        self._incrementar_contadores(variacoes)
+
+    def get_contadores(self) -> Optional[List[Dict]]:
+        """
+        Totais por (banco, status) no formato da view transacoes_estatisticas
+        (banco, status, quantidade, valor_total). None se ainda não reconciliados
+        """
+        campos = None
+        if self.redis_available:
+            try:
+                campos = self.redis_client.hgetall(self.CHAVE_CONTADORES)
+            except Exception as e:
+                logger.error(f"❌ Erro no Redis HGETALL {self.CHAVE_CONTADORES}: {e}")
+        if campos is None:
+            with self._lock_contadores:
+                campos = dict(self.contadores)
+
+        if self.CAMPO_RECONCILIACAO not in campos:
+            return None
+
+        grupos: Dict[str, Dict] = {}
+        for campo, valor in campos.items():
+            if campo == self.CAMPO_RECONCILIACAO:
+                continue
+            banco, status, medida = campo.rsplit('|', 2)
+            grupo = grupos.setdefault(f"{banco}|{status}", {'banco': banco, 'status': status,
+                                                            'quantidade': 0, 'valor_total': 0.0})
+            if medida == 'quantidade':
+                grupo['quantidade'] = int(valor)
+            else:
+                grupo['valor_total'] = int(valor) / 100
+        return [grupo for grupo in grupos.values() if grupo['quantidade']]
+
+    def reconciliar_contadores(self, grupos: List[Dict]) -> int:
+        """
+        Substitui os contadores pelos totais lidos do banco (mesmo formato de
+        get_contadores). Retorna quantos grupos divergiam dos contadores atuais
+        (0 se ainda não havia contadores reconciliados)
+        """
+        anteriores = self.get_contadores()
+        atuais = {(g['banco'], g['status']): (g['quantidade'], round(g['valor_total'], 2))
+                  for g in anteriores or []}
+        campos: Dict[str, Union[int, str]] = {self.CAMPO_RECONCILIACAO: datetime.now().isoformat()}
+        corretos = {}
+        for grupo in grupos:
+            chave = (grupo['banco'] or '-', grupo['status'] or '-')
+            quantidade, centavos = int(grupo['quantidade'] or 0), round(float(grupo['valor_total'] or 0) * 100)
+            campos[f"{chave[0]}|{chave[1]}|quantidade"] = quantidade
+            campos[f"{chave[0]}|{chave[1]}|centavos"] = centavos
+            corretos[chave] = (quantidade, round(centavos / 100, 2))
+        divergentes = 0 if anteriores is None else sum(
+            1 for chave in set(atuais) | set(corretos) if atuais.get(chave) != corretos.get(chave)
+        )
+
+        if self.redis_available:
+            try:
+                pipe = self.redis_client.pipeline()
+                pipe.delete(self.CHAVE_CONTADORES)
+                pipe.hset(self.CHAVE_CONTADORES, mapping=campos)
+                pipe.execute()
+            except Exception as e:
+                logger.error(f"❌ Erro no Redis ao reconciliar {self.CHAVE_CONTADORES}: {e}")
+
+        with self._lock_contadores:
+            self.contadores = campos
+        return divergentes
+
 # Instância global
 cache = CacheService()
 
@@ -0,0 +1,1461 @@
+# extrato_service.py
+import codecs
+import csv
+import gzip
+import hashlib
+import io
+import re
+import uuid
+from contextlib import closing
+from datetime import date, datetime
+from itertools import chain, islice, repeat
+from typing import IO, Any, Callable, Dict, Generator, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from loguru import logger
+from openpyxl import load_workbook
+
+from perfis_extrato import MAX_LINHAS_CABECALHO, normalizar_nome_coluna, perfil_por_cabecalho
+
+try:
+    import zstandard
+except ImportError:  # .csv.zst só é aceito com o pacote zstandard instalado
+    zstandard = None
+
+# Colunas obrigatórias - mesmo critério para ambos os bancos
+COLUNAS_OBRIGATORIAS = ['Data', 'Histórico', 'Valor (R$)']
+
+NA_VALUES = ['', 'nan', 'NaN', 'null', 'NULL']
+
+# Colunas monetárias do extrato e quantos exemplos de células inválidas vão no resumo
+COLUNAS_MOEDA = ['Valor (R$)', 'Saldo (R$)']
+MAX_EXEMPLOS_INVALIDOS = 10
+
+# Formatos de data aceitos na coluna Data (ordem = prioridade na detecção)
+FORMATOS_DATA = [
+    '%d/%m/%Y', '%d/%m/%y', '%Y-%m-%d', '%d-%m-%Y', '%d.%m.%Y', '%Y/%m/%d',
+    '%d/%m/%Y %H:%M:%S', '%Y-%m-%d %H:%M:%S'
+]
+TAMANHO_AMOSTRA_DATAS = 200
+
+# Continuidade do saldo: diferença tolerada (arredondamento) e exemplos de quebras no relatório
+TOLERANCIA_SALDO = 0.01
+MAX_EXEMPLOS_SALDO = 10
+
+# Leitura de CSV: codificações e separadores testados (ordem = prioridade)
+ENCODINGS_CSV = ['utf-8', 'latin-1', 'cp1252', 'iso-8859-1']
+SEPARADORES_CSV = [';', ',', '\t']
+
+# BOMs reconhecidos (têm precedência sobre a lista de codificações)
+BOMS_CSV = [
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
+
+# Tamanho da amostra usada para detectar codificação/separador
+TAMANHO_AMOSTRA_CSV = 64 * 1024
+
+# CSV compactado aceito no upload (descompactado em fluxo, nunca inteiro em memória)
+COMPRESSOES_CSV = ['.csv.gz'] + (['.csv.zst'] if zstandard else [])
+
+# Arquivos bancários estruturados (OFX e CNAB), lidos em fluxo; maiúsculas comuns nos nomes gerados pelos bancos
+EXTENSOES_ESTRUTURADAS = ('.ofx', '.ret', '.OFX', '.RET')
+TAMANHO_LEITURA_OFX = 64 * 1024
+
+# OFX (SGML ou XML): cada tag e o texto até a próxima tag
+REGEX_TAG_OFX = re.compile(r'<(/?)([A-Za-z0-9.]+)>([^<]*)')
+REGEX_ENCODING_UTF8_OFX = re.compile(rb'(ENCODING|CHARSET)\s*[:=]\s*"?UTF-?8', re.IGNORECASE)
+
+# CNAB: posições (início, fim) como nos manuais FEBRABAN, contando de 1
+CNAB240_LOTE_EXTRATO = {'data_saldo': (143, 150), 'saldo': (151, 168), 'situacao_saldo': (169, 169)}
+CNAB240_SEGMENTO_E = {
+    'data': (143, 150), 'valor': (151, 168), 'tipo': (169, 169),
+    'historico': (177, 201), 'documento': (202, 240)
+}
+CNAB240_SEGMENTO_T = {'nosso_numero': (38, 57), 'documento': (59, 73)}
+CNAB240_SEGMENTO_U = {'valor_pago': (78, 92), 'data_ocorrencia': (138, 145), 'data_credito': (146, 153)}
+CNAB400_DETALHE = {
+    'data_ocorrencia': (111, 116), 'documento': (117, 126), 'valor_pago': (254, 266), 'data_credito': (296, 301)
+}
+
+# Regras de tipo de transação (ordem = prioridade)
+REGRAS_TIPO_TRANSACAO = [
+    (('PIX',), 'PIX'),
+    (('TED',), 'TED'),
+    (('PAGAMENTO',), 'PAGAMENTO'),
+    (('TARIFA',), 'TARIFA'),
+    (('DEBITO', 'DÉBITO'), 'DÉBITO'),
+    (('CREDITO', 'CRÉDITO'), 'CRÉDITO'),
+]
+
+# Regras de forma de pagamento (ordem = prioridade)
+REGRAS_FORMA_PAGAMENTO = [
+    (('PIX',), 'PIX'),
+    (('TED',), 'TED'),
+    (('DOC',), 'DOC'),
+    (('DÉBITO AUTOMÁTICO', 'DEBITO AUTOMATICO'), 'Débito Automático'),
+    (('CARTÃO', 'CARTAO'), 'Cartão'),
+    (('BOLETO',), 'Boleto'),
+    (('TRANSFERÊNCIA', 'TRANSFERENCIA'), 'Transferência'),
+    (('DEPÓSITO', 'DEPOSITO'), 'Depósito'),
+    (('SAQUE',), 'Saque'),
+    (('TARIFA',), 'Tarifa'),
+]
+
+# Padrões comuns de contrapartes (ordem = prioridade)
+PADROES_CONTRAPARTE = [
+    ('PAGSEGURO', 'PagSeguro'),
+    ('MERCADO PAGO', 'Mercado Pago'),
+    ('IFood', 'iFood'),
+    ('UBER', 'Uber'),
+    ('99', '99 Taxi'),
+    ('TÁXI', 'Taxi'),
+    ('POSTO', 'Posto de Combustível'),
+    ('DROGARIA', 'Drogaria'),
+    ('FARMÁCIA', 'Farmácia'),
+    ('SUPERMERCADO', 'Supermercado'),
+    ('RESTAURANTE', 'Restaurante'),
+    ('HOSPITAL', 'Hospital'),
+    ('CLÍNICA', 'Clínica'),
+    ('ESCOLA', 'Escola'),
+    ('UNIVERSIDADE', 'Universidade'),
+    ('ALUGUEL', 'Proprietário'),
+    ('CONDOMINIO', 'Síndico'),
+    ('IPTU', 'Prefeitura'),
+    ('IPVA', 'Governo Estadual'),
+    ('ENERGIA', 'Companhia Energética'),
+    ('ÁGUA', 'Companhia de Água'),
+    ('TELEFONE', 'Operadora Telefônica'),
+    ('INTERNET', 'Provedor Internet'),
+    ('NETFLIX', 'Netflix'),
+    ('SPOTIFY', 'Spotify'),
+    ('AMAZON', 'Amazon'),
+    ('GOOGLE', 'Google'),
+    ('FACEBOOK', 'Facebook'),
+    ('INSTAGRAM', 'Instagram'),
+    ('IFOOD', 'iFood'),
+    ('RAKUTEN', 'Rakuten'),
+    ('PICPAY', 'PicPay'),
+    ('NUBANK', 'Nubank'),
+    ('ITAU', 'Itaú'),
+    ('BRADESCO', 'Bradesco'),
+    ('SANTANDER', 'Santander'),
+    ('BB', 'Banco do Brasil'),
+    ('CAIXA', 'Caixa Econômica'),
+    ('BANCO', 'Banco'),
+    ('SALÁRIO', 'Empregador'),
+    ('FGTS', 'Governo'),
+    ('INSS', 'Governo'),
+    ('IRPF', 'Receita Federal'),
+    ('PIX', 'Transferência PIX'),
+    ('TED', 'Transferência TED'),
+    ('DOC', 'Transferência DOC'),
+    ('BOLETO', 'Cobrança Boleto')
+]
+
+REGEX_CPF_CNPJ = re.compile(r'(\d{3}\.?\d{3}\.?\d{3}-?\d{2}|\d{2}\.?\d{3}\.?\d{3}/?\d{4}-?\d{2})')
+
+# Classificador do histórico, montado uma vez na importação do módulo.
+# Cada família é (regras em ordem de prioridade, rótulo padrão); 'contraparte' usa '' como
+# padrão porque ainda passa pelo fallback de CPF/CNPJ e primeiras palavras.
+FAMILIAS_CLASSIFICACAO = {
+    'tipo_transacao': (REGRAS_TIPO_TRANSACAO, 'OUTROS'),
+    'forma_pagamento': (REGRAS_FORMA_PAGAMENTO, 'Outros'),
+    'contraparte': ([((padrao,), contraparte) for padrao, contraparte in PADROES_CONTRAPARTE], ''),
+}
+
+
+def _montar_classificador():
+    """
+    Junta os termos de todas as regras numa única alternância compilada.
+    O lookahead faz o finditer testar todas as posições do texto; em cada posição
+    vence o termo mais longo, e os termos que são prefixo dele também casam ali.
+    """
+    termos = sorted({
+        termo
+        for regras, _ in FAMILIAS_CLASSIFICACAO.values()
+        for termos_regra, _ in regras
+        for termo in termos_regra
+    }, key=len, reverse=True)
+    regex = re.compile('(?=(' + '|'.join(re.escape(termo) for termo in termos) + '))')
+
+    # Termo -> termos que também casam quando ele casa (ele mesmo e seus prefixos)
+    prefixos = {termo: [outro for outro in termos if termo.startswith(outro)] for termo in termos}
+
+    # Termo -> (família, prioridade da regra) em que aparece
+    regras_por_termo: Dict[str, List[Tuple[str, int]]] = {termo: [] for termo in termos}
+    for familia, (regras, _) in FAMILIAS_CLASSIFICACAO.items():
+        for prioridade, (termos_regra, _) in enumerate(regras):
+            for termo in termos_regra:
+                regras_por_termo[termo].append((familia, prioridade))
+
+    return regex, prefixos, regras_por_termo
+
+
+_REGEX_TERMOS, _PREFIXOS_TERMO, _REGRAS_POR_TERMO = _montar_classificador()
+
+
+def _fallback_contraparte(historico_upper: str) -> str:
+    """Contraparte quando nenhum padrão casou: CPF/CNPJ ou primeiras palavras do histórico"""
+    cpf_cnpj = REGEX_CPF_CNPJ.search(historico_upper)
+    if cpf_cnpj:
+        return f"CPF/CNPJ: {cpf_cnpj.group(0)}"
+
+    partes = historico_upper.split()
+    if len(partes) > 3:
+        return ' '.join(partes[:3]) + '...'
+
+    return historico_upper if historico_upper else 'Não identificado'
+
+
+def classificar_historico(historico_upper: str) -> Tuple[str, str, str]:
+    """
+    Tipo de transação, forma de pagamento e contraparte de um histórico em
+    maiúsculas, numa única varredura do texto (primeira regra da lista vence)
+    """
+    if not historico_upper:
+        return 'OUTROS', 'Outros', 'Não identificado'
+
+    melhores: Dict[str, int] = {}
+    for encontrado in _REGEX_TERMOS.finditer(historico_upper):
+        for termo in _PREFIXOS_TERMO[encontrado.group(1)]:
+            for familia, prioridade in _REGRAS_POR_TERMO[termo]:
+                if prioridade < melhores.get(familia, len(FAMILIAS_CLASSIFICACAO[familia][0])):
+                    melhores[familia] = prioridade
+
+    rotulos = []
+    for familia, (regras, padrao) in FAMILIAS_CLASSIFICACAO.items():
+        prioridade = melhores.get(familia)
+        rotulos.append(padrao if prioridade is None else regras[prioridade][1])
+
+    tipo, forma, contraparte = rotulos
+    return tipo, forma, contraparte or _fallback_contraparte(historico_upper)
+
+
+def classificar_historicos(historicos_upper: pd.Series) -> Tuple[pd.Series, pd.Series, pd.Series]:
+    """
+    Versão colunar de classificar_historico: (tipo_transacao, forma_pagamento, contraparte).
+    Histórico ausente (NaN/None) é classificado como vazio
+    """
+    # Históricos se repetem muito no extrato: classifica só os valores distintos.
+    # Sem sentinela, o ausente vira um valor distinto (com o sentinela -1 ele pegaria os rótulos do último)
+    codigos, unicos = pd.factorize(historicos_upper, use_na_sentinel=False)
+    classificados = np.array([
+        classificar_historico(historico if isinstance(historico, str) else '') for historico in unicos
+    ], dtype=object)
+    classificados = classificados.reshape(len(unicos), 3)[codigos]
+    return tuple(
+        pd.Series(classificados[:, coluna], index=historicos_upper.index, dtype=object)
+        for coluna in range(3)
+    )
+
+
+def detectar_forma_pagamento(historico):
+    """Detectar forma de pagamento baseado no histórico"""
+    return classificar_historico(historico.upper())[1]
+
+
+def detectar_contraparte_backend(historico):
+    """Detectar contraparte baseado no histórico"""
+    if not historico:
+        return 'Não identificado'
+
+    return classificar_historico(historico.upper())[2]
+
+
+def processar_valor_moeda(valor_raw):
+    """Função para processar valores monetários uniformemente"""
+    if isinstance(valor_raw, str):
+        # Remove espaços, pontos (milhares) e substitui vírgula por ponto (decimal)
+        valor_str = str(valor_raw).strip()
+        # Remove símbolos de moeda se existir
+        valor_str = valor_str.replace('R$', '').replace('$', '').strip()
+        # Remove pontos que são separadores de milhares e substitui vírgula por ponto
+        valor_str = valor_str.replace('.', '').replace(',', '.')
+        # Remove espaços extras
+        valor_str = valor_str.replace(' ', '')
+        try:
+            return float(valor_str) if valor_str and valor_str != '-' else 0.0
+        except ValueError:
+            logger.warning(f"Valor inválido encontrado: {valor_raw}")
+            return 0.0
+    else:
+        return float(valor_raw) if pd.notna(valor_raw) else 0.0
+
+
+def processar_valores_moeda(serie: pd.Series, decimal: str = ',') -> Tuple[pd.Series, pd.Series]:
+    """
+    Versão colunar de processar_valor_moeda: converte a coluna inteira de uma vez
+    (textos 'R$ 1.234,56', '-', vazios e números já tipados pelo Excel).
+    Com decimal='.' os textos seguem o estilo '1,234.56' (perfis de extrato).
+    Retorna (valores float64, máscara de células inválidas). Texto inválido vira
+    0.0; célula não textual inválida (ex.: data) vira NaN e a linha é descartada.
+    """
+    invalidos = pd.Series(False, index=serie.index)
+
+    if pd.api.types.is_numeric_dtype(serie):
+        return serie.astype('float64').fillna(0.0), invalidos
+
+    valores = pd.Series(0.0, index=serie.index, dtype='float64')
+    e_texto = serie.map(lambda v: isinstance(v, str)).astype(bool)
+
+    # Textos: mesma limpeza de processar_valor_moeda, coluna inteira
+    textos = serie[e_texto].str.strip()
+    textos = textos.str.replace('R$', '', regex=False).str.replace('$', '', regex=False).str.strip()
+    if decimal == ',':
+        textos = textos.str.replace('.', '', regex=False).str.replace(',', '.', regex=False)
+    else:
+        textos = textos.str.replace(',', '', regex=False)
+    textos = textos.str.replace(' ', '', regex=False)
+    vazios = (textos == '') | (textos == '-')
+    numeros = pd.to_numeric(textos.where(~vazios), errors='coerce').astype('float64')
+    valores[e_texto] = numeros.fillna(0.0)
+    invalidos[e_texto] = numeros.isna() & ~vazios
+
+    # Células já tipadas (números do Excel); NaN continua 0.0
+    outros = serie[~e_texto & serie.notna()]
+    if len(outros):
+        numeros = pd.to_numeric(outros, errors='coerce').astype('float64')
+        valores[outros.index] = numeros
+        invalidos[outros.index] = numeros.isna()
+
+    return valores, invalidos
+
+
+def _celulas_vazias(serie: pd.Series) -> pd.Series:
+    """Células sem valor ('', '-', só 'R$' ou vazias), que processar_valores_moeda converte em 0.0"""
+    vazias = serie.isna()
+    if pd.api.types.is_numeric_dtype(serie):
+        return vazias
+    e_texto = serie.map(lambda v: isinstance(v, str)).astype(bool)
+    textos = serie[e_texto].astype(str).str.replace('R$', '', regex=False).str.replace(' ', '', regex=False)
+    vazias[e_texto] = textos.isin(['', '-'])
+    return vazias
+
+
+def novo_relatorio_valores(formato_data: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Acumulador das células inválidas (data e valores) de um arquivo, somado
+    bloco a bloco. Guarda também o formato de data detectado no primeiro bloco
+    e as linhas puladas por já estarem importadas (importação incremental)
+    """
+    return {
+        'celulas_invalidas': {coluna: 0 for coluna in ['Data'] + COLUNAS_MOEDA},
+        'linhas_descartadas': 0,
+        'linhas_ja_importadas': 0,
+        'exemplos': [],
+        'formato_data': formato_data
+    }
+
+
+def _registrar_celulas_invalidas(relatorio: Optional[Dict[str, Any]], coluna: str,
+                                 serie: pd.Series, invalidos: pd.Series):
+    """Soma as células inválidas da coluna no relatório e guarda alguns exemplos"""
+    total = int(invalidos.sum())
+    if not total:
+        return
+
+    logger.warning(f"{total} células inválidas em {coluna}")
+    if relatorio is None:
+        return
+
+    relatorio['celulas_invalidas'][coluna] += total
+    faltam = MAX_EXEMPLOS_INVALIDOS - len(relatorio['exemplos'])
+    if faltam > 0:
+        relatorio['exemplos'].extend(
+            {'coluna': coluna, 'valor': str(valor)} for valor in serie[invalidos].head(faltam).tolist()
+        )
+
+
+def _converter_com_formato(textos: pd.Series, formato: str) -> pd.Series:
+    return pd.to_datetime(textos, format=formato, errors='coerce')
+
+
+def detectar_formato_data(amostra: pd.Series) -> Optional[str]:
+    """Formato de FORMATOS_DATA que converte mais células da amostra (empate = ordem da lista)"""
+    melhor, convertidas_melhor = None, 0
+    for formato in FORMATOS_DATA:
+        convertidas = int(_converter_com_formato(amostra, formato).notna().sum())
+        if convertidas == len(amostra):
+            return formato
+        if convertidas > convertidas_melhor:
+            melhor, convertidas_melhor = formato, convertidas
+    return melhor
+
+
+def converter_datas(serie: pd.Series, formato: Optional[str] = None) -> Tuple[pd.Series, pd.Series, Optional[str]]:
+    """
+    Converte a coluna Data de uma vez para texto ISO (AAAA-MM-DD).
+    O formato dos textos vem do parâmetro (cache) ou é detectado numa amostra.
+    Retorna (datas ISO, máscara de células não convertidas, formato usado)
+    """
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        return serie.dt.strftime('%Y-%m-%d'), serie.isna(), formato
+
+    # Datas já tipadas pelo Excel dispensam formato
+    e_data = serie.map(lambda v: isinstance(v, (datetime, date))).astype(bool)
+    textos = serie[~e_data].astype(str).str.strip()
+
+    if len(textos):
+        amostra = textos.head(TAMANHO_AMOSTRA_DATAS)
+        if formato is None or _converter_com_formato(amostra, formato).isna().any():
+            formato = detectar_formato_data(amostra)
+            logger.info(f"Formato de data detectado: {formato}")
+
+    convertidas = pd.Series(pd.NaT, index=serie.index, dtype='datetime64[ns]')
+    if formato and len(textos):
+        convertidas[textos.index] = _converter_com_formato(textos, formato)
+    if e_data.any():
+        convertidas[e_data] = pd.to_datetime(serie[e_data].tolist())
+
+    return convertidas.dt.strftime('%Y-%m-%d'), convertidas.isna(), formato
+
+
+def _documento_texto(valor) -> str:
+    """Documento como texto; número inteiro lido como float (ex.: 123.0) perde o '.0'"""
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    return str(valor)
+
+
+def _montar_registros(colunas: Dict[str, Any], total: int) -> List[Dict]:
+    """Monta os dicts de transação a partir de colunas (Series, listas ou constantes)"""
+    listas = []
+    for valor in colunas.values():
+        if isinstance(valor, pd.Series):
+            listas.append(valor.tolist())
+        elif isinstance(valor, list):
+            listas.append(valor)
+        else:
+            listas.append(repeat(valor, total))
+    nomes = list(colunas)
+    return [dict(zip(nomes, linha)) for linha in zip(*listas)]
+
+
+def gerar_chaves_naturais(banco: str, datas: pd.Series, documentos: pd.Series, valores: pd.Series,
+                          historicos: pd.Series, posicoes_dia: Optional[Dict[str, int]] = None,
+                          selecionadas: Optional[pd.Series] = None) -> List[str]:
+    """
+    Chave natural de cada linha: hash de banco, data, documento, valor, histórico
+    e posição da linha no dia (diferencia lançamentos idênticos do mesmo dia).
+    posicoes_dia carrega a contagem por data entre blocos do mesmo arquivo.
+    Com selecionadas (máscara), só essas linhas recebem chave, mas a posição no
+    dia conta todas - a chave é a mesma de quando o arquivo é importado inteiro.
+    Documentos, valores e históricos vêm já filtrados por selecionadas.
+    """
+    posicoes = datas.groupby(datas, sort=False).cumcount()
+    if posicoes_dia is not None:
+        posicoes = posicoes + datas.map(posicoes_dia).fillna(0).astype(int)
+        for data, total in datas.value_counts(sort=False).items():
+            posicoes_dia[data] = posicoes_dia.get(data, 0) + total
+    if selecionadas is not None:
+        datas, posicoes = datas[selecionadas], posicoes[selecionadas]
+
+    return [
+        hashlib.sha256(f"{banco}|{data}|{documento}|{valor:.2f}|{historico}|{posicao}".encode('utf-8')).hexdigest()
+        for data, documento, valor, historico, posicao in zip(
+            datas.tolist(), documentos.tolist(), valores.tolist(), historicos.tolist(), posicoes.tolist()
+        )
+    ]
+
+
+def transformar_dataframe(df: pd.DataFrame, banco: str, posicoes_dia: Optional[Dict[str, int]] = None,
+                          relatorio: Optional[Dict[str, Any]] = None,
+                          ancora: Optional[Dict[str, Any]] = None) -> List[Dict]:
+    """
+    Transformar DataFrame do extrato em transações usando operações colunares.
+    Células de valor inválidas são somadas em relatorio (ver novo_relatorio_valores).
+    Com ancora (última linha já importada do banco), só as linhas posteriores a
+    ela são classificadas e devolvidas (importação incremental)
+    """
+    total_linhas = len(df)
+
+    # str() de cada célula, como a leitura linha a linha: célula vazia vira 'nan'
+    # (astype(str) no pandas 3 mantém o NaN)
+    historicos = df['Histórico'].map(str)
+
+    # Pular linhas sem data e saldo anterior - mesmo critério para ambos
+    validas = df['Data'].notna() & ~historicos.str.upper().str.contains('SALDO ANTERIOR', regex=False)
+    df = df[validas]
+    historicos = historicos[validas].str.strip()
+
+    # APLICAR MESMA TRATATIVA DE VALOR E SALDO PARA AMBOS OS BANCOS
+    valores, valores_invalidos = processar_valores_moeda(df['Valor (R$)'])
+    _registrar_celulas_invalidas(relatorio, 'Valor (R$)', df['Valor (R$)'], valores_invalidos)
+    if 'Saldo (R$)' in df.columns:
+        saldos, saldos_invalidos = processar_valores_moeda(df['Saldo (R$)'])
+        _registrar_celulas_invalidas(relatorio, 'Saldo (R$)', df['Saldo (R$)'], saldos_invalidos)
+        # Saldo em branco ou texto inválido: desconhecido, fora da verificação de continuidade
+        saldos_desconhecidos = saldos_invalidos | _celulas_vazias(df['Saldo (R$)'])
+    else:
+        saldos = pd.Series(0.0, index=df.index)
+        saldos_desconhecidos = pd.Series(False, index=df.index)
+
+    # Datas convertidas de uma vez; formato do relatório (cache/bloco anterior) ou detectado
+    formato_data = relatorio.get('formato_data') if relatorio is not None else None
+    datas, datas_invalidas, formato_data = converter_datas(df['Data'], formato_data)
+    _registrar_celulas_invalidas(relatorio, 'Data', df['Data'], datas_invalidas)
+    if relatorio is not None:
+        relatorio['formato_data'] = formato_data
+
+    # Data não reconhecida ou valor não numérico que não é texto: linha descartada
+    manter = valores.notna() & saldos.notna() & ~datas_invalidas
+    descartadas = int((~manter).sum())
+    if descartadas:
+        logger.warning(f"{descartadas} linhas descartadas: data ou valor inválido")
+        if relatorio is not None:
+            relatorio['linhas_descartadas'] += descartadas
+
+    df = df[manter]
+    historicos = historicos[manter]
+    datas = datas[manter]
+    valores = valores[manter]
+    saldos = saldos[manter].mask(saldos_desconhecidos[manter])
+
+    # Importação incremental: a posição no dia (chave natural) conta as linhas já importadas
+    todas_datas = datas
+    novas = None
+    if ancora:
+        novas = linhas_apos_ancora(datas, valores, saldos, ancora)
+        if novas is not None:
+            ja_importadas = int((~novas).sum())
+            logger.info(f"Âncora {ancora['data']} encontrada: {ja_importadas} linhas já importadas ignoradas")
+            if relatorio is not None:
+                relatorio['linhas_ja_importadas'] += ja_importadas
+            df, historicos, datas, valores, saldos = df[novas], historicos[novas], datas[novas], valores[novas], saldos[novas]
+
+    historicos_upper = historicos.str.upper()
+    tipos, formas, contrapartes = classificar_historicos(historicos_upper)
+
+    if 'Documento' in df.columns:
+        # astype(str): num bloco vazio o map não devolve texto
+        documentos = df['Documento'].map(_documento_texto).astype(str).str.strip()
+    else:
+        documentos = pd.Series('', index=df.index)
+
+    total = len(df)
+    agora = datetime.now().isoformat()
+
+    colunas = {
+        'id': [str(uuid.uuid4()) for _ in range(total)],
+        'banco': banco,
+        'data': datas,
+        'historico': historicos,
+        'documento': documentos,
+        'valor': valores,
+        'saldo': saldos.astype(object).where(saldos.notna(), None),
+        'tipo_transacao': tipos,
+        'status': 'PENDENTE',
+        'classificacao': '',
+        'plano_contas': '',
+        'item': '',
+        'forma_pagamento': formas,  # Autopreenchido
+        'banco_origem': banco,  # Autopreenchido (AAI ou EDUCAÇÃO)
+        'centro_custo': '',
+        'nome_recebedor': '',
+        'data_pagamento': datas,  # Autopreenchido com data do extrato
+        'data_referencia': '',
+        'observacoes': '',
+        'conciliado_em': None,
+        'conciliado_por': None,
+        'created_at': agora,
+        'contraparte': contrapartes,
+        'chave_natural': gerar_chaves_naturais(banco, todas_datas, documentos, valores, historicos, posicoes_dia, novas)
+    }
+
+    transacoes = _montar_registros(colunas, total)
+    logger.info(f"Processamento concluído para {banco}: {len(transacoes)} transações de {total_linhas} linhas")
+    return transacoes
+
+
+def verificar_colunas_obrigatorias(df: pd.DataFrame):
+    """Levanta ValueError se faltar alguma coluna obrigatória"""
+    colunas_faltando = [col for col in COLUNAS_OBRIGATORIAS if col not in df.columns]
+
+    if colunas_faltando:
+        logger.warning(f"Colunas obrigatórias não encontradas: {colunas_faltando}")
+        logger.info(f"Colunas disponíveis: {list(df.columns)}")
+        raise ValueError(f"Colunas obrigatórias não encontradas: {colunas_faltando}")
+
+
+def nova_integridade_saldo() -> Dict[str, Any]:
+    """Relatório de continuidade do saldo de um arquivo (acumulado bloco a bloco)"""
+    return {
+        'ordem': None,
+        'linhas_verificadas': 0,
+        'linhas_sem_saldo': 0,
+        'lacunas': 0,
+        'duplicadas': 0,
+        'exemplos': [],
+        'primeira': None,
+        'ultima': None,
+        'descontinuidade_anterior': None,
+        '_linha_anterior': None,
+        '_valor_pendente': 0.0,
+        '_valor_antes_primeira': 0.0
+    }
+
+
+def _diferencas_saldo(valores: np.ndarray, saldos: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Diferença entre saldo informado e esperado entre cada par de saldos conhecidos
+    consecutivos, nas duas ordens: na crescente o segundo do par é o mais recente,
+    na decrescente o primeiro. Linhas sem saldo (NaN) ficam de fora da comparação,
+    mas seus valores entram na soma entre os dois saldos do par
+    """
+    conhecidas = np.flatnonzero(~np.isnan(saldos))
+    acumulado = np.concatenate(([0.0], np.cumsum(valores)))
+    inicio, fim = conhecidas[:-1], conhecidas[1:]
+    saldos = saldos[conhecidas]
+    return {
+        'crescente': saldos[1:] - (saldos[:-1] + (acumulado[fim + 1] - acumulado[inicio + 1])),
+        'decrescente': saldos[:-1] - (saldos[1:] + (acumulado[fim] - acumulado[inicio]))
+    }
+
+
+def _ordem_saldo(diferencas: Dict[str, np.ndarray]) -> str:
+    """Ordem do arquivo que quebra menos a cadeia de saldo (empate: crescente)"""
+    quebras_por_ordem = {ordem: int((np.abs(d) > TOLERANCIA_SALDO).sum()) for ordem, d in diferencas.items()}
+    return min(quebras_por_ordem, key=quebras_por_ordem.get)
+
+
+def _localizar_ancora(datas: pd.Series, valores: pd.Series, saldos: pd.Series,
+                     ancora: Dict[str, Any]) -> Optional[Tuple[int, str]]:
+    """
+    Posição da âncora (mesma data, valor e saldo) e ordem do saldo nas linhas.
+    None quando ela não aparece ou aparece mais de uma vez
+    """
+    coincide = (
+        (datas.to_numpy() == ancora['data'])
+        & (np.abs(valores.to_numpy() - ancora['valor']) <= TOLERANCIA_SALDO)
+        & (np.abs(saldos.to_numpy() - ancora['saldo']) <= TOLERANCIA_SALDO)
+    )
+    posicoes = np.flatnonzero(coincide)
+    if len(posicoes) != 1:
+        return None
+    return int(posicoes[0]), _ordem_saldo(_diferencas_saldo(valores.to_numpy(), saldos.to_numpy()))
+
+
+def linhas_apos_ancora(datas: pd.Series, valores: pd.Series, saldos: pd.Series,
+                       ancora: Dict[str, Any]) -> Optional[pd.Series]:
+    """
+    Máscara das linhas posteriores à âncora (última linha já importada do banco),
+    localizada pela cadeia de saldo: mesma data, valor e saldo. None quando a
+    âncora não está no arquivo ou aparece mais de uma vez - ele é importado inteiro
+    """
+    localizada = _localizar_ancora(datas, valores, saldos, ancora)
+    if localizada is None:
+        return None
+
+    posicao, ordem = localizada
+    indices = np.arange(len(datas))
+    novas = indices > posicao if ordem == 'crescente' else indices < posicao
+    return pd.Series(novas, index=datas.index)
+
+
+def transacoes_antes_da_ancora(transacoes: List[Dict], ancora: Dict[str, Any]) -> Optional[List[Dict]]:
+    """
+    Leitura em blocos: transações do bloco anteriores à âncora, quando ela está
+    no bloco e o arquivo vem do mais recente para o mais antigo - o restante do
+    arquivo já foi importado. None nos demais casos, inclusive na ordem crescente:
+    ali as linhas antigas já saíram nos blocos anteriores (a chave natural as ignora)
+    """
+    if not transacoes:
+        return None
+    localizada = _localizar_ancora(
+        pd.Series([t['data'] for t in transacoes]),
+        pd.Series([t['valor'] for t in transacoes], dtype=float),
+        pd.Series([t['saldo'] for t in transacoes], dtype=float),
+        ancora
+    )
+    if localizada is None or localizada[1] != 'decrescente':
+        return None
+    return transacoes[:localizada[0]]
+
+
+def _linha_saldo(datas: List[str], valores: np.ndarray, saldos: np.ndarray, posicao: int) -> Dict[str, Any]:
+    """Data, valor e saldo de uma linha (forma guardada no relatório)"""
+    return {'data': datas[posicao], 'valor': float(valores[posicao]), 'saldo': float(saldos[posicao])}
+
+
+def verificar_continuidade_saldo(integridade: Dict[str, Any], transacoes: List[Dict]):
+    """
+    Confere, de forma vetorizada, se saldo anterior + valores = saldo entre linhas
+    com saldo, continuando do último bloco. Linhas sem saldo (None: célula vazia ou
+    inválida, comum em bancos que só informam o saldo do dia) não são conferidas;
+    seus valores entram no saldo esperado da próxima linha com saldo. A ordem do
+    arquivo (crescente ou decrescente) é a que quebra menos no primeiro bloco.
+    Quebras com a linha repetida contam como duplicadas; as demais como lacunas
+    (linhas faltando no extrato)
+    """
+    if not transacoes:
+        return
+
+    datas = [t['data'] for t in transacoes]
+    valores = np.fromiter((t['valor'] for t in transacoes), dtype=float, count=len(transacoes))
+    saldos = np.array([t['saldo'] for t in transacoes], dtype=float)
+    conhecidos = ~np.isnan(saldos)
+    anterior = integridade['_linha_anterior']
+
+    # Nenhum saldo, ou saldo zerado em todas as linhas com movimento: nada a verificar
+    # neste bloco; os valores seguem pendentes até o próximo saldo conhecido
+    if not conhecidos.any() or (not saldos[conhecidos].any() and valores.any()):
+        integridade['linhas_sem_saldo'] += len(transacoes)
+        integridade['_valor_pendente' if anterior else '_valor_antes_primeira'] += float(valores.sum())
+        return
+    integridade['linhas_sem_saldo'] += int((~conhecidos).sum())
+
+    if anterior:
+        # Última linha com saldo do bloco anterior e, como uma linha sem saldo, a soma do que veio depois dela
+        datas = [anterior['data'], anterior['data']] + datas
+        valores = np.concatenate(([anterior['valor'], integridade['_valor_pendente']], valores))
+        saldos = np.concatenate(([anterior['saldo'], np.nan], saldos))
+    posicoes = np.flatnonzero(~np.isnan(saldos))
+    primeira, ultima = posicoes[0], posicoes[-1]
+    integridade['_linha_anterior'] = _linha_saldo(datas, valores, saldos, ultima)
+    integridade['_valor_pendente'] = float(valores[ultima + 1:].sum())
+
+    diferencas = _diferencas_saldo(valores, saldos)
+    if integridade['ordem'] is None:
+        integridade['ordem'] = _ordem_saldo(diferencas)
+        crescente = integridade['ordem'] == 'crescente'
+        integridade['primeira' if crescente else 'ultima'] = _linha_saldo(datas, valores, saldos, primeira)
+        if crescente:
+            integridade['_valor_antes_primeira'] += float(valores[:primeira].sum())
+    crescente = integridade['ordem'] == 'crescente'
+    integridade['ultima' if crescente else 'primeira'] = _linha_saldo(datas, valores, saldos, ultima)
+
+    # Pares entre linhas com saldo: posicoes[par] e posicoes[par + 1]
+    datas = np.asarray(datas, dtype=object)[posicoes]
+    valores, saldos = valores[posicoes], saldos[posicoes]
+    diferenca = diferencas[integridade['ordem']]
+    quebras = np.abs(diferenca) > TOLERANCIA_SALDO
+    duplicadas = quebras & (valores[1:] == valores[:-1]) & (saldos[1:] == saldos[:-1]) & (datas[1:] == datas[:-1])
+
+    integridade['linhas_verificadas'] += len(diferenca)
+    integridade['duplicadas'] += int(duplicadas.sum())
+    integridade['lacunas'] += int((quebras & ~duplicadas).sum())
+
+    for par in np.flatnonzero(quebras)[:MAX_EXEMPLOS_SALDO - len(integridade['exemplos'])]:
+        recente = par + 1 if crescente else par
+        integridade['exemplos'].append({
+            'data': datas[recente],
+            'tipo': 'duplicada' if duplicadas[par] else 'lacuna',
+            'valor': float(valores[recente]),
+            'saldo_informado': float(saldos[recente]),
+            'saldo_esperado': round(float(saldos[recente] - diferenca[par]), 2),
+            'diferenca': round(float(diferenca[par]), 2)
+        })
+
+
+def concluir_integridade_saldo(integridade: Dict[str, Any], anterior: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Fechar o relatório: confere a primeira linha com saldo do arquivo contra o último
+    saldo já importado do banco (`anterior`, com data e saldo), somando os valores das
+    linhas sem saldo mais antigas que ela, e resume a consistência
+    """
+    integridade.pop('_linha_anterior', None)
+    valor_pendente = integridade.pop('_valor_pendente', 0.0)
+    valor_antes_primeira = integridade.pop('_valor_antes_primeira', 0.0)
+    if integridade['ordem'] == 'decrescente':
+        # No arquivo decrescente as linhas mais antigas vêm depois da última com saldo
+        valor_antes_primeira = valor_pendente
+
+    primeira = integridade['primeira']
+    if anterior and primeira:
+        esperado = anterior['saldo'] + valor_antes_primeira + primeira['valor']
+        if abs(primeira['saldo'] - esperado) > TOLERANCIA_SALDO:
+            integridade['descontinuidade_anterior'] = {
+                **anterior,
+                'saldo_esperado': round(esperado, 2),
+                'saldo_informado': primeira['saldo'],
+                'diferenca': round(primeira['saldo'] - esperado, 2)
+            }
+
+    integridade['verificado'] = integridade['primeira'] is not None
+    integridade['consistente'] = (
+        integridade['verificado'] and not integridade['lacunas'] and not integridade['duplicadas']
+        and integridade['descontinuidade_anterior'] is None
+    )
+    return integridade
+
+
+def _decodificar_amostra(amostra: bytes, encoding: str) -> str:
+    """Decodifica a amostra tolerando um caractere cortado no final"""
+    return codecs.getincrementaldecoder(encoding)().decode(amostra, final=False)
+
+
+def _linha_cabecalho(texto: str) -> str:
+    """Primeira linha não vazia (o pandas ignora linhas em branco)"""
+    for linha in texto.splitlines():
+        if linha.strip():
+            return linha
+    return ''
+
+
+def _detectar_encoding(amostra: bytes) -> str:
+    """BOM ou primeira codificação de ENCODINGS_CSV que decodifica a amostra"""
+    for bom, encoding_bom in BOMS_CSV:
+        if amostra.startswith(bom):
+            return encoding_bom
+
+    for candidato in ENCODINGS_CSV:
+        try:
+            _decodificar_amostra(amostra, candidato)
+        except UnicodeDecodeError:
+            continue
+        return candidato
+
+    raise ValueError("Não foi possível ler o arquivo CSV com nenhuma codificação testada")
+
+
+def _separador_linha(linha: str) -> str:
+    """Separador mais frequente na linha (empate fica com o primeiro da lista)"""
+    return max(SEPARADORES_CSV, key=linha.count)
+
+
+def detectar_dialeto_csv(amostra: bytes) -> Tuple[str, str]:
+    """
+    Detectar codificação e separador olhando só o início do arquivo:
+    BOM, primeira codificação que decodifica a amostra e o separador
+    mais frequente na linha de cabeçalho
+    """
+    encoding = _detectar_encoding(amostra)
+
+    cabecalho = _linha_cabecalho(_decodificar_amostra(amostra, encoding))
+    sep = _separador_linha(cabecalho)
+    if not cabecalho.count(sep):
+        raise ValueError("Não foi possível identificar o separador do arquivo CSV")
+
+    logger.info(f"CSV detectado com encoding {encoding} e separador '{sep}'")
+    return encoding, sep
+
+
+def detectar_perfil_csv(amostra: bytes) -> Optional[Dict[str, Any]]:
+    """
+    Perfil de extrato (perfis_extrato) cujo cabeçalho está nas primeiras linhas
+    da amostra, na posição declarada no perfil. Encoding e separador que o
+    perfil não define vêm da própria amostra. None = layout padrão
+    """
+    try:
+        encoding = _detectar_encoding(amostra)
+        linhas = _decodificar_amostra(amostra, encoding).split('\n')
+    except (ValueError, LookupError):
+        return None
+
+    for posicao, linha in enumerate(linhas[:MAX_LINHAS_CABECALHO]):
+        if not linha.strip():
+            continue
+        sep = _separador_linha(linha)
+        perfil = perfil_por_cabecalho(next(csv.reader([linha.strip()], delimiter=sep)), posicao)
+        if perfil:
+            logger.info(f"CSV reconhecido pelo perfil {perfil['nome']}")
+            return {**perfil, 'encoding': perfil['encoding'] or encoding, 'separador': perfil['separador'] or sep}
+    return None
+
+
+def completar_perfil_csv(perfil: Dict[str, Any], amostra: bytes) -> Dict[str, Any]:
+    """
+    Perfil já conhecido com encoding e separador preenchidos: os que ele não
+    define vêm da amostra (separador da linha de cabeçalho). Sem detecção se o perfil define os dois
+    """
+    if perfil['encoding'] and perfil['separador']:
+        return perfil
+    encoding = perfil['encoding'] or _detectar_encoding(amostra)
+    linhas = _decodificar_amostra(amostra, encoding).split('\n')
+    cabecalho = linhas[perfil['linhas_ignoradas']] if len(linhas) > perfil['linhas_ignoradas'] else ''
+    return {**perfil, 'encoding': encoding, 'separador': perfil['separador'] or _separador_linha(cabecalho)}
+
+
+def aplicar_perfil(df: pd.DataFrame, perfil: Optional[Dict[str, Any]]) -> pd.DataFrame:
+    """
+    Traz um bloco lido com perfil de extrato para o layout padrão: renomeia as
+    colunas, converte as datas no formato do perfil para ISO e os valores no
+    separador decimal do perfil, aplicando a convenção de sinal. Células que
+    não convertem ficam como estão e são contadas como inválidas em transformar_dataframe
+    """
+    if perfil is None:
+        return df
+
+    nomes = {normalizar_nome_coluna(origem): destino for destino, origem in perfil['colunas'].items()}
+    df = df.rename(columns=lambda coluna: nomes.get(normalizar_nome_coluna(coluna), str(coluna).strip()))
+
+    if perfil['formato_data'] and 'Data' in df.columns:
+        serie = df['Data']
+        e_texto = serie.map(lambda v: isinstance(v, str)).astype(bool)
+        convertidas = pd.to_datetime(serie[e_texto].str.strip(), format=perfil['formato_data'], errors='coerce').dropna()
+        df['Data'] = serie.astype(object)
+        df.loc[convertidas.index, 'Data'] = convertidas.dt.strftime('%Y-%m-%d')
+
+    sinal = perfil['sinal']
+    if perfil['decimal'] == ',' and sinal == 'normal':
+        return df
+
+    for coluna in COLUNAS_MOEDA:
+        if coluna not in df.columns:
+            continue
+        valores, invalidos = processar_valores_moeda(df[coluna], perfil['decimal'])
+        if coluna == 'Valor (R$)' and sinal == 'invertido':
+            valores = 0.0 - valores
+        elif coluna == 'Valor (R$)' and isinstance(sinal, dict):
+            coluna_sinal = next(
+                (c for c in df.columns if normalizar_nome_coluna(c) == normalizar_nome_coluna(sinal['coluna'])), None
+            )
+            if coluna_sinal is None:
+                raise ValueError(f"Coluna de sinal não encontrada: {sinal['coluna']}")
+            debitos = df[coluna_sinal].astype(str).str.strip().str.upper() == str(sinal['debito']).strip().upper()
+            valores = valores.abs().where(~debitos, 0.0 - valores.abs())
+        validos = ~invalidos & valores.notna()
+        df[coluna] = valores if validos.all() else valores.astype(object).where(validos, df[coluna])
+    return df
+
+
+def dialeto_compativel(amostra: bytes, dialeto: Tuple[str, str]) -> bool:
+    """
+    Confere se um dialeto já conhecido serve para este arquivo: a amostra
+    decodifica, não é UTF-8 válido (ou com BOM) lido em outra codificação
+    (latin-1 decodifica quaisquer bytes) e o cabeçalho separado por `sep` tem
+    as colunas obrigatórias
+    """
+    encoding, sep = dialeto
+    try:
+        cabecalho = _linha_cabecalho(_decodificar_amostra(amostra, encoding))
+        detectado = _detectar_encoding(amostra)
+        if detectado.startswith('utf') and codecs.lookup(encoding).name != codecs.lookup(detectado).name:
+            return False
+    except (UnicodeDecodeError, LookupError, ValueError):
+        return False
+    if not cabecalho.count(sep):
+        return False
+    colunas = {normalizar_nome_coluna(coluna) for coluna in next(csv.reader([cabecalho.lstrip('\ufeff')], delimiter=sep))}
+    return all(normalizar_nome_coluna(coluna) in colunas for coluna in COLUNAS_OBRIGATORIAS)
+
+
+def _abrir_conteudo(conteudo) -> IO[bytes]:
+    """Arquivo posicionado no início sobre bytes ou arquivo aberto, sem copiar o conteúdo"""
+    if hasattr(conteudo, 'read'):
+        conteudo.seek(0)
+        return conteudo
+    return io.BytesIO(conteudo)
+
+
+def ler_csv(conteudo, dialeto: Optional[Tuple[str, str]] = None,
+            perfil: Optional[Dict[str, Any]] = None) -> pd.DataFrame:
+    """
+    Ler o CSV inteiro em uma única passada, com o dialeto informado ou detectado.
+    `conteudo` são os bytes do arquivo ou o caminho dele em disco (lido via mmap, sem cópia).
+    Com perfil de extrato, pula as linhas antes do cabeçalho e devolve o layout padrão
+    """
+    em_disco = isinstance(conteudo, str)
+    if dialeto is None:
+        if em_disco:
+            with open(conteudo, 'rb') as arquivo:
+                dialeto = detectar_dialeto_csv(arquivo.read(TAMANHO_AMOSTRA_CSV))
+        else:
+            dialeto = detectar_dialeto_csv(conteudo[:TAMANHO_AMOSTRA_CSV])
+    encoding, sep = dialeto
+    
+    def ler(encoding: str) -> pd.DataFrame:
+        fonte = conteudo if em_disco else io.BytesIO(conteudo)
+        return pd.read_csv(fonte, sep=sep, encoding=encoding, na_values=NA_VALUES, memory_map=em_disco,
+                           skiprows=perfil['linhas_ignoradas'] if perfil else None)
+    
+    try:
+        df = ler(encoding)
+    except UnicodeDecodeError:
+        # Byte inválido depois da amostra: latin-1 decodifica qualquer byte
+        logger.warning(f"Encoding {encoding} falhou após a amostra, relendo como latin-1")
+        df = ler('latin-1')
+    return aplicar_perfil(df, perfil)
+
+
+def ler_csv_em_blocos(arquivo: IO[bytes], linhas_por_bloco: int,
+                      dialeto: Optional[Tuple[str, str]] = None,
+                      perfil: Optional[Dict[str, Any]] = None) -> Iterator[pd.DataFrame]:
+    """
+    Lê um CSV binário em blocos de linhas, sem decodificar o arquivo inteiro.
+    O arquivo precisa permitir seek (UploadFile/SpooledTemporaryFile).
+    Com perfil de extrato, os blocos saem no layout padrão
+    """
+    if dialeto is None:
+        inicio = arquivo.tell()
+        dialeto = detectar_dialeto_csv(arquivo.read(TAMANHO_AMOSTRA_CSV))
+        arquivo.seek(inicio)
+    encoding, sep = dialeto
+    logger.info(f"CSV em blocos com encoding {encoding}, separador '{sep}' e {linhas_por_bloco} linhas por bloco")
+
+    leitor = pd.read_csv(
+        arquivo,
+        sep=sep,
+        encoding=encoding,
+        na_values=NA_VALUES,
+        skiprows=perfil['linhas_ignoradas'] if perfil else None,
+        chunksize=linhas_por_bloco
+    )
+    with leitor:
+        for bloco in leitor:
+            # Limpar nomes das colunas (remover espaços extras)
+            bloco.columns = bloco.columns.str.strip()
+            yield aplicar_perfil(bloco, perfil)
+
+
+def compressao_csv(filename: str) -> Optional[str]:
+    """Extensão de compressão do CSV ('.gz'/'.zst') ou None se o arquivo não é CSV compactado"""
+    for extensao in COMPRESSOES_CSV:
+        if filename.endswith(extensao):
+            return extensao[len('.csv'):]
+    return None
+
+
+def abrir_csv_compactado(arquivo: IO[bytes], compressao: str) -> IO[bytes]:
+    """
+    Fluxo descompactado do arquivo a partir da posição atual. Lê aos poucos:
+    o CSV descompactado nunca fica inteiro em memória. Fechar o fluxo não fecha `arquivo`
+    """
+    if compressao == '.gz':
+        return gzip.GzipFile(fileobj=arquivo, mode='rb')
+    if compressao == '.zst' and zstandard:
+        return zstandard.ZstdDecompressor().stream_reader(arquivo, closefd=False)
+    raise ValueError(f"Compressão não suportada: {compressao}")
+
+
+def amostra_csv_compactado(arquivo: IO[bytes], compressao: str) -> bytes:
+    """Início do CSV descompactado (para detectar o dialeto), voltando `arquivo` ao começo"""
+    arquivo.seek(0)
+    with abrir_csv_compactado(arquivo, compressao) as descompactado:
+        amostra = descompactado.read(TAMANHO_AMOSTRA_CSV)
+    arquivo.seek(0)
+    return amostra
+
+
+def formato_estruturado(filename: str) -> Optional[str]:
+    """'ofx' ou 'cnab' pela extensão do arquivo (None para CSV/Excel)"""
+    nome = filename.lower()
+    if nome.endswith('.ofx'):
+        return 'ofx'
+    if nome.endswith('.ret'):
+        return 'cnab'
+    return None
+
+
+def _bloco_estruturado(linhas: List[tuple], formato_data: str) -> pd.DataFrame:
+    """
+    Bloco no layout padrão a partir de (data em texto, histórico, documento, valor, saldo).
+    Datas convertidas de uma vez no formato do arquivo; as inválidas seguem como texto
+    """
+    bloco = pd.DataFrame(linhas, columns=['Data', 'Histórico', 'Documento', 'Valor (R$)', 'Saldo (R$)'])
+    textos = bloco['Data']
+    datas = pd.to_datetime(textos, format=formato_data, errors='coerce')
+    bloco['Data'] = datas if datas.notna().equals(textos.notna()) else datas.astype(object).where(datas.notna(), textos)
+    return bloco
+
+
+def _em_blocos(linhas: Iterator[tuple], linhas_por_bloco: int, formato_data: str) -> Iterator[pd.DataFrame]:
+    """Agrupa as linhas lidas em blocos (um bloco vazio se o arquivo não tem lançamentos)"""
+    buffer = []
+    blocos_lidos = 0
+    for linha in linhas:
+        buffer.append(linha)
+        if len(buffer) >= linhas_por_bloco:
+            blocos_lidos += 1
+            yield _bloco_estruturado(buffer, formato_data)
+            buffer = []
+
+    if buffer or not blocos_lidos:
+        yield _bloco_estruturado(buffer, formato_data)
+
+
+def _texto_em_fluxo(arquivo: IO[bytes], encoding: str) -> io.TextIOWrapper:
+    """Leitor de texto sobre o arquivo binário, decodificando aos poucos"""
+    return io.TextIOWrapper(arquivo, encoding=encoding, errors='replace', newline='')
+
+
+def _tags_ofx(texto: IO[str]) -> Iterator[Tuple[bool, str, str]]:
+    """(é fechamento, tag, texto) de cada tag do OFX, lendo TAMANHO_LEITURA_OFX por vez"""
+    resto = ''
+    while True:
+        pedaco = texto.read(TAMANHO_LEITURA_OFX)
+        buffer = resto + pedaco
+        # A última tag do pedaço pode continuar no próximo: fica para a volta seguinte
+        corte = buffer.rfind('<') if pedaco else len(buffer)
+        if corte > 0:
+            for tag in REGEX_TAG_OFX.finditer(buffer, 0, corte):
+                yield tag.group(1) == '/', tag.group(2).upper(), tag.group(3).strip()
+            buffer = buffer[corte:]
+        if not pedaco:
+            return
+        resto = buffer
+
+
+def _valor_ofx(texto: str):
+    """TRNAMT como número (alguns bancos usam vírgula decimal); texto inválido volta como está"""
+    try:
+        return float(texto.replace(',', '.'))
+    except ValueError:
+        return texto
+
+
+def _lancamento_ofx(transacao: Dict[str, str]) -> tuple:
+    """Linha do layout padrão para um <STMTTRN>. OFX não traz saldo por lançamento"""
+    historico = transacao.get('MEMO') or transacao.get('NAME') or transacao.get('TRNTYPE', '')
+    documento = transacao.get('CHECKNUM') or transacao.get('REFNUM') or transacao.get('FITID', '')
+    # DTPOSTED: AAAAMMDD[HHMMSS[.XXX]][fuso]
+    data = transacao.get('DTPOSTED', '')[:8] or None
+    return data, historico, documento, _valor_ofx(transacao.get('TRNAMT', '')), 0.0
+
+
+def _lancamentos_ofx(texto: IO[str]) -> Iterator[tuple]:
+    transacao = None
+    for fechamento, tag, valor in _tags_ofx(texto):
+        if tag == 'STMTTRN':
+            # Um <STMTTRN> sem fechamento termina no seguinte
+            if transacao is not None:
+                yield _lancamento_ofx(transacao)
+            transacao = None if fechamento else {}
+        elif tag == 'BANKTRANLIST' and fechamento and transacao is not None:
+            yield _lancamento_ofx(transacao)
+            transacao = None
+        elif transacao is not None and not fechamento:
+            transacao[tag] = valor
+
+
+def ler_ofx_em_blocos(arquivo: IO[bytes], linhas_por_bloco: int) -> Iterator[pd.DataFrame]:
+    """
+    Lê um OFX (SGML 1.x ou XML 2.x) em uma passada, sem carregá-lo inteiro:
+    cada <STMTTRN> vira uma linha do layout padrão (data, MEMO/NAME, CHECKNUM/REFNUM/FITID, valor)
+    """
+    inicio = arquivo.tell()
+    encoding = 'utf-8' if REGEX_ENCODING_UTF8_OFX.search(arquivo.read(1024)) else 'cp1252'
+    arquivo.seek(inicio)
+    logger.info(f"OFX em blocos com encoding {encoding} e {linhas_por_bloco} lançamentos por bloco")
+
+    texto = _texto_em_fluxo(arquivo, encoding)
+    try:
+        yield from _em_blocos(_lancamentos_ofx(texto), linhas_por_bloco, '%Y%m%d')
+    finally:
+        # Devolve o arquivo sem fechá-lo
+        texto.detach()
+
+
+def _campo(linha: str, posicoes: Tuple[int, int]) -> str:
+    inicio, fim = posicoes
+    return linha[inicio - 1:fim].strip()
+
+
+def _data_cnab(texto: str) -> Optional[str]:
+    """Data do CNAB (convertida no bloco); zeros/brancos = sem data"""
+    return texto if texto.strip('0 ') else None
+
+
+def _valor_cnab(texto: str):
+    """Número com 2 casas decimais implícitas; texto inválido volta como está"""
+    return int(texto) / 100 if texto.isdigit() else texto
+
+
+def _lancamentos_cnab240(linhas: Iterator[str]) -> Iterator[tuple]:
+    """
+    CNAB 240: lançamentos do extrato para conciliação (segmento E), com o saldo
+    corrido a partir do saldo inicial do lote, e liquidações do retorno de
+    cobrança (segmentos T + U) como créditos
+    """
+    saldo = 0.0
+    titulo = {}
+    for linha in linhas:
+        tipo_registro, segmento = linha[7], linha[13]
+        if tipo_registro == '1':
+            saldo_inicial = _valor_cnab(_campo(linha, CNAB240_LOTE_EXTRATO['saldo']))
+            saldo = saldo_inicial if isinstance(saldo_inicial, float) else 0.0
+            if _campo(linha, CNAB240_LOTE_EXTRATO['situacao_saldo']) == 'D':
+                saldo = -saldo
+        elif tipo_registro != '3':
+            continue
+        elif segmento == 'E':
+            valor = _valor_cnab(_campo(linha, CNAB240_SEGMENTO_E['valor']))
+            if isinstance(valor, float):
+                valor = -valor if _campo(linha, CNAB240_SEGMENTO_E['tipo']) == 'D' else valor
+                saldo = round(saldo + valor, 2)
+            yield (_data_cnab(_campo(linha, CNAB240_SEGMENTO_E['data'])), _campo(linha, CNAB240_SEGMENTO_E['historico']),
+                   _campo(linha, CNAB240_SEGMENTO_E['documento']), valor, saldo)
+        elif segmento == 'T':
+            titulo = {campo: _campo(linha, posicoes) for campo, posicoes in CNAB240_SEGMENTO_T.items()}
+        elif segmento == 'U':
+            valor = _valor_cnab(_campo(linha, CNAB240_SEGMENTO_U['valor_pago']))
+            if valor == 0:
+                continue
+            data = (_data_cnab(_campo(linha, CNAB240_SEGMENTO_U['data_credito']))
+                    or _data_cnab(_campo(linha, CNAB240_SEGMENTO_U['data_ocorrencia'])))
+            yield (data, f"CREDITO LIQUIDACAO BOLETO {titulo.get('nosso_numero', '')}".strip(),
+                   titulo.get('documento', ''), valor, 0.0)
+            titulo = {}
+
+
+def _lancamentos_cnab400(linhas: Iterator[str]) -> Iterator[tuple]:
+    """CNAB 400 (retorno de cobrança): títulos com valor pago viram créditos"""
+    for linha in linhas:
+        if linha[0] != '1':
+            continue
+        valor = _valor_cnab(_campo(linha, CNAB400_DETALHE['valor_pago']))
+        if valor == 0:
+            continue
+        documento = _campo(linha, CNAB400_DETALHE['documento'])
+        data = (_data_cnab(_campo(linha, CNAB400_DETALHE['data_credito']))
+                or _data_cnab(_campo(linha, CNAB400_DETALHE['data_ocorrencia'])))
+        yield data, f"CREDITO LIQUIDACAO BOLETO {documento}".strip(), documento, valor, 0.0
+
+
+def ler_cnab_em_blocos(arquivo: IO[bytes], linhas_por_bloco: int) -> Iterator[pd.DataFrame]:
+    """
+    Lê um arquivo CNAB 240 ou 400 (largura fixa; o layout vem do tamanho da
+    primeira linha) em uma passada, linha a linha, no layout padrão
+    """
+    texto = _texto_em_fluxo(arquivo, 'latin-1')
+    try:
+        linhas = (linha.rstrip('\r\n') for linha in texto if linha.strip())
+        primeira = next(linhas, '')
+        largura = 240 if len(primeira) <= 240 else 400
+        logger.info(f"CNAB {largura} em blocos com {linhas_por_bloco} lançamentos por bloco")
+
+        # Linhas com brancos finais cortados voltam à largura do layout
+        linhas = (linha.ljust(largura) for linha in chain([primeira], linhas))
+        if largura == 240:
+            yield from _em_blocos(_lancamentos_cnab240(linhas), linhas_por_bloco, '%d%m%Y')
+        else:
+            yield from _em_blocos(_lancamentos_cnab400(linhas), linhas_por_bloco, '%d%m%y')
+    finally:
+        texto.detach()
+
+
+def _nomes_colunas_excel(cabecalho) -> List[str]:
+    """Nomes das colunas a partir da primeira linha da planilha (mesma regra do pandas para vazias)"""
+    return [
+        f"Unnamed: {posicao}" if valor is None else str(valor).strip()
+        for posicao, valor in enumerate(cabecalho)
+    ]
+
+
+def _bloco_excel(linhas: List[tuple], colunas: List[str]) -> pd.DataFrame:
+    """Monta o DataFrame de um bloco de linhas da planilha"""
+    total_colunas = len(colunas)
+    bloco = pd.DataFrame([linha[:total_colunas] for linha in linhas], columns=colunas)
+
+    # Células vazias e na_values viram NaN e textos numéricos viram números, como no pd.read_excel
+    for coluna in bloco.columns[bloco.dtypes == object]:
+        valores = bloco[coluna]
+        valores = valores.mask(valores.isna() | valores.isin(NA_VALUES), np.nan)
+        try:
+            valores = pd.to_numeric(valores)
+        except (TypeError, ValueError):
+            pass
+        bloco[coluna] = valores
+    return bloco
+
+
+def _cabecalho_excel(linhas: Iterator[tuple]) -> Tuple[Optional[Dict[str, Any]], Iterator[tuple]]:
+    """
+    Procura nas primeiras linhas da planilha o cabeçalho de um perfil de extrato.
+    Devolve o perfil (ou None) e as linhas a partir do cabeçalho (sem perfil, a primeira linha)
+    """
+    inicio = list(islice(linhas, MAX_LINHAS_CABECALHO))
+    for posicao, linha in enumerate(inicio):
+        perfil = perfil_por_cabecalho(['' if valor is None else valor for valor in linha], posicao)
+        if perfil:
+            logger.info(f"Excel reconhecido pelo perfil {perfil['nome']}")
+            return perfil, chain(inicio[posicao:], linhas)
+    return None, chain(inicio, linhas)
+
+
+def ler_excel_em_blocos(arquivo: IO[bytes], linhas_por_bloco: int) -> Iterator[pd.DataFrame]:
+    """
+    Lê a primeira planilha de um .xlsx em modo somente leitura (sem estilos
+    nem modelo de objetos), entregando blocos de linhas
+    """
+    workbook = load_workbook(arquivo, read_only=True, data_only=True)
+    try:
+        planilha = workbook.worksheets[0]
+        # Ignora a dimensão gravada no arquivo: evita uma passada extra para calculá-la
+        planilha.reset_dimensions()
+        linhas = planilha.iter_rows(values_only=True)
+
+        perfil, linhas = _cabecalho_excel(linhas)
+        cabecalho = next(linhas, None)
+        if cabecalho is None:
+            raise ValueError("Planilha vazia")
+        colunas = _nomes_colunas_excel(cabecalho)
+        logger.info(f"Excel em modo somente leitura com colunas {colunas} e {linhas_por_bloco} linhas por bloco")
+
+        buffer = []
+        blocos_lidos = 0
+        for linha in linhas:
+            # Linhas totalmente vazias não geram transação
+            if all(valor is None for valor in linha):
+                continue
+            buffer.append(linha)
+            if len(buffer) >= linhas_por_bloco:
+                blocos_lidos += 1
+                yield aplicar_perfil(_bloco_excel(buffer, colunas), perfil)
+                buffer = []
+
+        if buffer or not blocos_lidos:
+            yield aplicar_perfil(_bloco_excel(buffer, colunas), perfil)
+    finally:
+        workbook.close()
+
+
+def _transformar_bloco_isolado(bloco: pd.DataFrame, banco: str, posicoes_dia: Dict[str, int],
+                               relatorio: Optional[Dict[str, Any]]):
+    """Transformação de um bloco em outro processo: o estado atualizado volta junto"""
+    return transformar_dataframe(bloco, banco, posicoes_dia, relatorio), posicoes_dia, relatorio
+
+
+def _processar_blocos(blocos: Generator[pd.DataFrame, None, None], banco: str,
+                      relatorio: Optional[Dict[str, Any]] = None,
+                      executar: Optional[Callable] = None,
+                      ancora: Optional[Dict[str, Any]] = None) -> Iterator[List[Dict]]:
+    """
+    Aplica a transformação colunar em cada bloco lido. Com executar(funcao, *args),
+    a transformação roda fora deste processo (ex.: pool de processos). Com ancora,
+    a leitura para no bloco da âncora quando o arquivo é decrescente (ver
+    transacoes_antes_da_ancora); as linhas puladas desse bloco vão para o relatório
+    """
+    # Posição no dia continua de um bloco para o outro (chave natural)
+    posicoes_dia: Dict[str, int] = {}
+    # O leitor é fechado mesmo se um bloco falhar, enquanto o arquivo ainda está aberto
+    with closing(blocos):
+        for numero, bloco in enumerate(blocos, start=1):
+            verificar_colunas_obrigatorias(bloco)
+            logger.debug(f"Bloco {numero}: {len(bloco)} linhas")
+            if executar is None:
+                transacoes = transformar_dataframe(bloco, banco, posicoes_dia, relatorio)
+            else:
+                transacoes, posicoes_atualizadas, relatorio_atualizado = executar(
+                    _transformar_bloco_isolado, bloco, banco, posicoes_dia, relatorio
+                )
+                posicoes_dia.update(posicoes_atualizadas)
+                if relatorio is not None:
+                    relatorio.update(relatorio_atualizado)
+
+            novas = transacoes_antes_da_ancora(transacoes, ancora) if ancora else None
+            if novas is None:
+                yield transacoes
+                continue
+
+            ja_importadas = len(transacoes) - len(novas)
+            logger.info(f"Âncora {ancora['data']} encontrada no bloco {numero}: restante do arquivo já importado")
+            if relatorio is not None:
+                relatorio['linhas_ja_importadas'] += ja_importadas
+            yield novas
+            return
+
+
+def processar_csv_em_blocos(arquivo: IO[bytes], banco: str, linhas_por_bloco: int,
+                            dialeto: Optional[Tuple[str, str]] = None,
+                            relatorio: Optional[Dict[str, Any]] = None,
+                            executar: Optional[Callable] = None,
+                            perfil: Optional[Dict[str, Any]] = None,
+                            ancora: Optional[Dict[str, Any]] = None) -> Iterator[List[Dict]]:
+    """Gera as transações do CSV bloco a bloco, para inserir sem manter o arquivo todo em memória"""
+    return _processar_blocos(
+        ler_csv_em_blocos(arquivo, linhas_por_bloco, dialeto, perfil), banco, relatorio, executar, ancora
+    )
+
+
+def processar_excel_em_blocos(arquivo: IO[bytes], banco: str, linhas_por_bloco: int,
+                              relatorio: Optional[Dict[str, Any]] = None,
+                              executar: Optional[Callable] = None,
+                              ancora: Optional[Dict[str, Any]] = None) -> Iterator[List[Dict]]:
+    """Gera as transações do .xlsx bloco a bloco, em memória limitada"""
+    return _processar_blocos(ler_excel_em_blocos(arquivo, linhas_por_bloco), banco, relatorio, executar, ancora)
+
+
+def processar_estruturado_em_blocos(arquivo: IO[bytes], filename: str, banco: str, linhas_por_bloco: int,
+                                    relatorio: Optional[Dict[str, Any]] = None,
+                                    executar: Optional[Callable] = None,
+                                    ancora: Optional[Dict[str, Any]] = None) -> Iterator[List[Dict]]:
+    """Gera as transações de um OFX/CNAB bloco a bloco (uma passada, memória constante)"""
+    ler = ler_ofx_em_blocos if formato_estruturado(filename) == 'ofx' else ler_cnab_em_blocos
+    return _processar_blocos(ler(arquivo, linhas_por_bloco), banco, relatorio, executar, ancora)
+
+
+def processar_arquivo(file_content, filename: str, banco: str, dialeto: Optional[Tuple[str, str]] = None,
+                      relatorio: Optional[Dict[str, Any]] = None, linhas_por_bloco: int = 5000,
+                      ancora: Optional[Dict[str, Any]] = None, perfil: Optional[Dict[str, Any]] = None):
+    """
+    Processar arquivo CSV ou Excel (bytes, arquivo aberto ou, no CSV, caminho em disco)
+    e extrair transações (células inválidas somadas em relatorio). A âncora
+    (importação incremental) é aplicada depois da leitura no CSV e no .xls; no
+    .xlsx e no OFX/CNAB, lidos em blocos, só no arquivo decrescente. O perfil
+    de extrato do CSV vem de detectar_perfil_csv; no Excel ele é reconhecido pelo cabeçalho
+    """
+    try:
+        logger.info(f"Iniciando processamento de {filename} para banco {banco}")
+
+        # Detectar tipo de arquivo
+        if filename.endswith('.csv'):
+            # Processar CSV - aplicar mesma tratativa para ambos os bancos
+            logger.info("Processando arquivo CSV...")
+
+            # Dialeto conhecido ou detectado pela amostra: o arquivo é lido uma única vez
+            df = ler_csv(file_content, dialeto, perfil)
+
+        elif formato_estruturado(filename):
+            # OFX/CNAB lidos em fluxo, bloco a bloco
+            logger.info(f"Processando arquivo {formato_estruturado(filename).upper()}...")
+            transacoes = []
+            for bloco in processar_estruturado_em_blocos(_abrir_conteudo(file_content), filename, banco,
+                                                         linhas_por_bloco, relatorio, ancora=ancora):
+                transacoes.extend(bloco)
+            return transacoes
+
+        elif filename.endswith('.xlsx'):
+            # Processar Excel em modo somente leitura, bloco a bloco
+            logger.info("Processando arquivo Excel (somente leitura)...")
+            transacoes = []
+            for bloco in processar_excel_em_blocos(_abrir_conteudo(file_content), banco, linhas_por_bloco, relatorio,
+                                                   ancora=ancora):
+                transacoes.extend(bloco)
+            return transacoes
+
+        else:
+            # Processar Excel - aplicar mesma tratativa para ambos os bancos
+            logger.info("Processando arquivo Excel...")
+            df = pd.read_excel(
+                _abrir_conteudo(file_content), 
+                engine='openpyxl',
+                na_values=NA_VALUES
+            )
+            df = aplicar_perfil(df, perfil_por_cabecalho(df.columns))
+
+        logger.info(f"Arquivo lido com {len(df)} linhas e colunas: {list(df.columns)}")
+
+        # Limpar nomes das colunas (remover espaços extras)
+        df.columns = df.columns.str.strip()
+
+        # Verificar se tem as colunas necessárias - mesmo critério para ambos os bancos
+        verificar_colunas_obrigatorias(df)
+
+        # Transformação colunar (filtro, valores, datas e classificação)
+        return transformar_dataframe(df, banco, relatorio=relatorio, ancora=ancora)
+
+    except Exception as e:
+        logger.error(f"ERRO CRÍTICO ao processar arquivo {banco}: {e}")
+        logger.error(f"Tipo do erro: {type(e)}")
+        import traceback
+        logger.error(f"Traceback completo: {traceback.format_exc()}")
+        raise ValueError(f"Erro ao processar arquivo: {str(e)}")
+
+
+def processar_arquivo_em_disco(caminho: str, filename: str, banco: str,
+                               dialeto: Optional[Tuple[str, str]], relatorio: Optional[Dict[str, Any]],
+                               linhas_por_bloco: int, ancora: Optional[Dict[str, Any]] = None,
+                               perfil: Optional[Dict[str, Any]] = None):
+    """
+    processar_arquivo direto do arquivo em disco, sem copiar o conteúdo para a
+    memória do processo (nem enviá-lo a outro processo, que recebe só o caminho).
+    CSV é lido via mmap; Excel do próprio arquivo. O relatório volta junto com as transações
+    """
+    if filename.endswith('.csv'):
+        return processar_arquivo(caminho, filename, banco, dialeto, relatorio, linhas_por_bloco, ancora, perfil), relatorio
+    with open(caminho, 'rb') as arquivo:
+        return processar_arquivo(arquivo, filename, banco, dialeto, relatorio, linhas_por_bloco, ancora), relatorio
@@ -1,21 +1,41 @@
-from fastapi import FastAPI, HTTPException, UploadFile, Depends, File, Form, Request
+from fastapi import FastAPI, HTTPException, UploadFile, Depends, File, Form, Request, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import HTMLResponse, JSONResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
-import pandas as pd
 from cache_service import cache
-import io
+from extrato_service import (
+    COMPRESSOES_CSV, TAMANHO_AMOSTRA_CSV, abrir_csv_compactado, amostra_csv_compactado, compressao_csv,
+    concluir_integridade_saldo, detectar_dialeto_csv, nova_integridade_saldo, verificar_continuidade_saldo, dialeto_compativel, novo_relatorio_valores, processar_arquivo_em_disco,
+    processar_csv_em_blocos, processar_excel_em_blocos, completar_perfil_csv, detectar_perfil_csv,
+    EXTENSOES_ESTRUTURADAS, formato_estruturado, processar_estruturado_em_blocos,
+    FAMILIAS_CLASSIFICACAO, REGRAS_TIPO_TRANSACAO
+)
+from perfis_extrato import LINHAS_ATE_CABECALHO, PERFIS, VERSAO_PERFIS
 import uuid
+import base64
 import os
 import json
-from datetime import datetime
-from typing import List, Dict, Any, Optional
+import hashlib
+import tempfile
+import zipfile
+from html import escape
+from urllib.parse import urlencode
+from contextlib import closing
+import threading
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date, datetime
+from typing import List, Dict, Any, Callable, Iterator, Optional, Tuple
 from dotenv import load_dotenv
 load_dotenv()
 
 from supabase_client import SupabaseClient
 from supabase_auth import get_current_user, require_operador, require_supervisor, require_admin
-from supabase_models import LoginRequest, LoginResponse, UsuarioResponse
+from supabase_models import BancoEnum, ListResponse, LoginRequest, LoginResponse, TransacaoFilter, UsuarioResponse
+from upload_jobs import UploadJob, UploadLote, ETAPA_PROCESSANDO, ETAPA_SALVANDO
 
 from loguru import logger
 
@@ -34,6 +54,46 @@ from typing import Dict, Any, Optional
 ENVIRONMENT = os.getenv("ENVIRONMENT", "development")
 SECRET_KEY = os.getenv("SECRET_KEY", "dev-key-123")
 
+# Upload de extratos: arquivos CSV/XLSX a partir deste tamanho são importados em blocos
+UPLOAD_STREAMING_MIN_BYTES = int(os.getenv("UPLOAD_STREAMING_MIN_BYTES", 5 * 1024 * 1024))
+UPLOAD_LINHAS_POR_BLOCO = int(os.getenv("UPLOAD_LINHAS_POR_BLOCO", 5000))
+
+# Inserção de transações: tamanho do lote, lotes simultâneos e novas tentativas com backoff
+INSERT_TAMANHO_LOTE = int(os.getenv("INSERT_TAMANHO_LOTE", 100))
+INSERT_CONCORRENCIA = int(os.getenv("INSERT_CONCORRENCIA", 8))
+INSERT_TENTATIVAS = int(os.getenv("INSERT_TENTATIVAS", 3))
+INSERT_BACKOFF_SEGUNDOS = float(os.getenv("INSERT_BACKOFF_SEGUNDOS", 0.5))
+
+# Parsing: arquivos a partir deste tamanho são processados no pool de processos (0 processos = desliga)
+PARSE_PROCESSOS = int(os.getenv("PARSE_PROCESSOS", 2))
+PARSE_PROCESSO_MIN_BYTES = int(os.getenv("PARSE_PROCESSO_MIN_BYTES", 512 * 1024))
+
+# Uploads simultâneos por worker; acima disso responde 503 com Retry-After
+UPLOADS_MAX_EM_ANDAMENTO = int(os.getenv("UPLOADS_MAX_EM_ANDAMENTO", 4))
+UPLOAD_RETRY_AFTER_SEGUNDOS = int(os.getenv("UPLOAD_RETRY_AFTER_SEGUNDOS", 30))
+
+# Bancos/contas aceitos vêm da configuração (variável BANCOS, ver supabase_models)
+BANCOS_VALIDOS = tuple(banco.value for banco in BancoEnum)
+EXTENSOES_EXTRATO = ('.xlsx', '.xls', '.csv', *COMPRESSOES_CSV, *EXTENSOES_ESTRUTURADAS)
+# accept do <input type="file">: só o que o servidor aceita (.csv.zst só com zstandard instalado)
+ACCEPT_EXTRATO = ','.join(dict.fromkeys(extensao.lower() for extensao in EXTENSOES_EXTRATO))
+
+# Validação (dry_run): chaves naturais consultadas por requisição e exemplos no relatório
+VALIDACAO_LOTE_CHAVES = int(os.getenv("VALIDACAO_LOTE_CHAVES", 500))
+VALIDACAO_MAX_EXEMPLOS = 10
+
+# Upload em lote: arquivos importados em paralelo por lote e máximo de arquivos aceitos
+LOTE_CONCORRENCIA = int(os.getenv("LOTE_CONCORRENCIA", 4))
+LOTE_MAX_ARQUIVOS = int(os.getenv("LOTE_MAX_ARQUIVOS", 50))
+
+# Extração do .zip do lote: tamanho descompactado de cada extrato, total do zip e entradas aceitas
+ZIP_MAX_BYTES_ARQUIVO = int(os.getenv("ZIP_MAX_BYTES_ARQUIVO", 200 * 1024 * 1024))
+ZIP_MAX_BYTES_TOTAL = int(os.getenv("ZIP_MAX_BYTES_TOTAL", 1024 * 1024 * 1024))
+ZIP_MAX_ENTRADAS = int(os.getenv("ZIP_MAX_ENTRADAS", 1000))
+
+# Contadores de /api/stats: intervalo da reconciliação com o banco (corrige desvios dos incrementos)
+CONTADORES_RECONCILIACAO_SEGUNDOS = int(os.getenv("CONTADORES_RECONCILIACAO_SEGUNDOS", 900))
+
 # Configuração condicional
 if ENVIRONMENT == "production":
     # Logs menos verbosos
@@ -228,33 +288,6 @@ classificacoes = {
 
 centros_custo = ['Araraquara', 'Campinas', 'Ribeirão Preto', 'Thera Geral']
 
-def detectar_forma_pagamento(historico):
-    """Detectar forma de pagamento baseado no histórico"""
-    historico_upper = historico.upper()
-    
-    if 'PIX' in historico_upper:
-        return 'PIX'
-    elif 'TED' in historico_upper:
-        return 'TED'
-    elif 'DOC' in historico_upper:
-        return 'DOC'
-    elif 'DÉBITO AUTOMÁTICO' in historico_upper or 'DEBITO AUTOMATICO' in historico_upper:
-        return 'Débito Automático'
-    elif 'CARTÃO' in historico_upper or 'CARTAO' in historico_upper:
-        return 'Cartão'
-    elif 'BOLETO' in historico_upper:
-        return 'Boleto'
-    elif 'TRANSFERÊNCIA' in historico_upper or 'TRANSFERENCIA' in historico_upper:
-        return 'Transferência'
-    elif 'DEPÓSITO' in historico_upper or 'DEPOSITO' in historico_upper:
-        return 'Depósito'
-    elif 'SAQUE' in historico_upper:
-        return 'Saque'
-    elif 'TARIFA' in historico_upper:
-        return 'Tarifa'
-    else:
-        return 'Outros'
-
 # Modelos Pydantic para validação
 class ConciliacaoRequest(BaseModel):
     transacao_id: str
@@ -301,264 +334,108 @@ class UpdateItemRequest(BaseModel):
     nome_antigo: str
     nome_novo: str    
 
-def processar_valor_moeda(valor_raw):
-    """Função para processar valores monetários uniformemente"""
-    if isinstance(valor_raw, str):
-        # Remove espaços, pontos (milhares) e substitui vírgula por ponto (decimal)
-        valor_str = str(valor_raw).strip()
-        # Remove símbolos de moeda se existir
-        valor_str = valor_str.replace('R$', '').replace('$', '').strip()
-        # Remove pontos que são separadores de milhares e substitui vírgula por ponto
-        valor_str = valor_str.replace('.', '').replace(',', '.')
-        # Remove espaços extras
-        valor_str = valor_str.replace(' ', '')
-        try:
-            return float(valor_str) if valor_str and valor_str != '-' else 0.0
-        except ValueError:
-            logger.warning(f"Valor inválido encontrado: {valor_raw}")
-            return 0.0
-    else:
-        return float(valor_raw) if pd.notna(valor_raw) else 0.0
+# Pool de processos do parsing (criado no primeiro uso) e vagas de upload deste worker
+_pool_parsing: Optional[ProcessPoolExecutor] = None
+_lock_pool_parsing = threading.Lock()
+_vagas_upload = threading.BoundedSemaphore(UPLOADS_MAX_EM_ANDAMENTO)
 
-def processar_arquivo(file_content: bytes, filename: str, banco: str):
-    """Processar arquivo CSV ou Excel e extrair transações"""
-    try:
-                
-        logger.info(f"Iniciando processamento de {filename} para banco {banco}")
-        
-        # Detectar tipo de arquivo
-        if filename.endswith('.csv'):
-            # Processar CSV - aplicar mesma tratativa para ambos os bancos
-            logger.info("Processando arquivo CSV...")
-            
-            # Tentar diferentes codificações
-            encodings = ['utf-8', 'latin-1', 'cp1252', 'iso-8859-1']
-            df = None
-            
-            for encoding in encodings:
-                try:
-                    content_str = file_content.decode(encoding)
-                    # Tentar diferentes separadores
-                    separadores = [';', ',', '\t']
-                    for sep in separadores:
-                        try:
-                            df = pd.read_csv(
-                                io.StringIO(content_str), 
-                                sep=sep,
-                                encoding=encoding,
-                                na_values=['', 'nan', 'NaN', 'null', 'NULL']
-                            )
-                            if len(df.columns) > 1:  # Se encontrou múltiplas colunas, provavelmente acertou o separador
-                                logger.info(f"CSV lido com encoding {encoding} e separador '{sep}'")
-                                break
-                        except:
-                            continue
-                    if df is not None and len(df.columns) > 1:
-                        break
-                except:
-                    continue
-                    
-            if df is None:
-                raise ValueError("Não foi possível ler o arquivo CSV com nenhuma codificação testada")
-                
-        else:
-            # Processar Excel - aplicar mesma tratativa para ambos os bancos
-            logger.info("Processando arquivo Excel...")
-            df = pd.read_excel(
-                io.BytesIO(file_content), 
-                engine='openpyxl',
-                na_values=['', 'nan', 'NaN', 'null', 'NULL']
-            )
-        
-        logger.info(f"Arquivo lido com {len(df)} linhas e colunas: {list(df.columns)}")
-        
-        # Limpar nomes das colunas (remover espaços extras)
-        df.columns = df.columns.str.strip()
-        
-        # Verificar se tem as colunas necessárias - mesmo critério para ambos os bancos
-        colunas_necessarias = ['Data', 'Histórico', 'Valor (R$)']
-        colunas_faltando = [col for col in colunas_necessarias if col not in df.columns]
-        
-        if colunas_faltando:
-            logger.warning(f"Colunas obrigatórias não encontradas: {colunas_faltando}")
-            logger.info(f"Colunas disponíveis: {list(df.columns)}")
-            raise ValueError(f"Colunas obrigatórias não encontradas: {colunas_faltando}")
-        
-        transacoes = []
-        linhas_processadas = 0
-        
-        for index, row in df.iterrows():
-            try:
-                # Pular linha de cabeçalho e saldo anterior - mesmo critério para ambos
-                if pd.isna(row.get('Data')) or 'SALDO ANTERIOR' in str(row.get('Histórico', '')).upper():
-                    continue
-                    
-                # Extrair dados - mesmo processamento para ambos os bancos
-                data = row.get('Data')
-                if isinstance(data, pd.Timestamp):
-                    data_str = data.strftime('%Y-%m-%d')
-                else:
-                    data_str = str(data)
-                    
-                historico = str(row.get('Histórico', '')).strip()
-                documento = str(row.get('Documento', '')).strip()
-                
-                # APLICAR MESMA TRATATIVA DE VALOR PARA AMBOS OS BANCOS
-                valor_raw = row.get('Valor (R$)', 0)
-                valor = processar_valor_moeda(valor_raw)
-                
-                # APLICAR MESMA TRATATIVA DE SALDO PARA AMBOS OS BANCOS
-                saldo_raw = row.get('Saldo (R$)', 0)
-                saldo = processar_valor_moeda(saldo_raw)
-                
-                # Log para debug - especialmente para EDUCAÇÃO
-                if banco == 'EDUCAÇÃO':
-                    logger.debug(f"EDUCAÇÃO - Linha {index}: Valor raw='{valor_raw}' -> processado={valor}, Saldo raw='{saldo_raw}' -> processado={saldo}")
-                
-                # Classificar tipo de transação - mesmo critério para ambos
-                tipo_transacao = 'OUTROS'
-                historico_upper = historico.upper()
-                if 'PIX' in historico_upper:
-                    tipo_transacao = 'PIX'
-                elif 'TED' in historico_upper:
-                    tipo_transacao = 'TED'
-                elif 'PAGAMENTO' in historico_upper:
-                    tipo_transacao = 'PAGAMENTO'
-                elif 'TARIFA' in historico_upper:
-                    tipo_transacao = 'TARIFA'
-                elif 'DEBITO' in historico_upper or 'DÉBITO' in historico_upper:
-                    tipo_transacao = 'DÉBITO'
-                elif 'CREDITO' in historico_upper or 'CRÉDITO' in historico_upper:
-                    tipo_transacao = 'CRÉDITO'
-                
-                transacao = {
-                    'id': str(uuid.uuid4()),
-                    'banco': banco,
-                    'data': data_str,
-                    'historico': historico,
-                    'documento': documento,
-                    'valor': valor,
-                    'saldo': saldo,
-                    'tipo_transacao': tipo_transacao,
-                    'status': 'PENDENTE',
-                    'classificacao': '',
-                    'plano_contas': '',
-                    'item': '',
-                    'forma_pagamento': detectar_forma_pagamento(historico),  # Autopreenchido
-                    'banco_origem': banco,  # Autopreenchido (AAI ou EDUCAÇÃO)
-                    'centro_custo': '',
-                    'nome_recebedor': '',
-                    'data_pagamento': data_str,  # Autopreenchido com data do extrato
-                    'data_referencia': '',
-                    'observacoes': '',
-                    'conciliado_em': None,
-                    'conciliado_por': None,
-                    'created_at': datetime.now().isoformat(),
-                    'contraparte': detectar_contraparte_backend(historico)  # NOVO CAMPO ADICIONADO
-                }
-                
-                transacoes.append(transacao)
-                linhas_processadas += 1
-                
-            except Exception as e:
-                logger.warning(f"Erro ao processar linha {index}: {e}")
-                continue
-        
-        logger.info(f"Processamento concluído para {banco}: {linhas_processadas} transações de {len(df)} linhas")
-        return transacoes
-        
-    except Exception as e:
-        logger.error(f"ERRO CRÍTICO ao processar arquivo {banco}: {e}")
-        logger.error(f"Tipo do erro: {type(e)}")
-        import traceback
-        logger.error(f"Traceback completo: {traceback.format_exc()}")
-        raise ValueError(f"Erro ao processar arquivo: {str(e)}")
-
-def detectar_contraparte_backend(historico):
-    """Detectar contraparte baseado no histórico"""
-    if not historico:
-        return 'Não identificado'
-    
-    historico = historico.upper()
-    
-    # Padrões comuns de contrapartes
-    padroes = [
-        ('PAGSEGURO', 'PagSeguro'),
-        ('MERCADO PAGO', 'Mercado Pago'),
-        ('IFood', 'iFood'),
-        ('UBER', 'Uber'),
-        ('99', '99 Taxi'),
-        ('TÁXI', 'Taxi'),
-        ('POSTO', 'Posto de Combustível'),
-        ('DROGARIA', 'Drogaria'),
-        ('FARMÁCIA', 'Farmácia'),
-        ('SUPERMERCADO', 'Supermercado'),
-        ('RESTAURANTE', 'Restaurante'),
-        ('HOSPITAL', 'Hospital'),
-        ('CLÍNICA', 'Clínica'),
-        ('ESCOLA', 'Escola'),
-        ('UNIVERSIDADE', 'Universidade'),
-        ('ALUGUEL', 'Proprietário'),
-        ('CONDOMINIO', 'Síndico'),
-        ('IPTU', 'Prefeitura'),
-        ('IPVA', 'Governo Estadual'),
-        ('ENERGIA', 'Companhia Energética'),
-        ('ÁGUA', 'Companhia de Água'),
-        ('TELEFONE', 'Operadora Telefônica'),
-        ('INTERNET', 'Provedor Internet'),
-        ('NETFLIX', 'Netflix'),
-        ('SPOTIFY', 'Spotify'),
-        ('AMAZON', 'Amazon'),
-        ('GOOGLE', 'Google'),
-        ('FACEBOOK', 'Facebook'),
-        ('INSTAGRAM', 'Instagram'),
-        ('IFOOD', 'iFood'),
-        ('RAKUTEN', 'Rakuten'),
-        ('PICPAY', 'PicPay'),
-        ('NUBANK', 'Nubank'),
-        ('ITAU', 'Itaú'),
-        ('BRADESCO', 'Bradesco'),
-        ('SANTANDER', 'Santander'),
-        ('BB', 'Banco do Brasil'),
-        ('CAIXA', 'Caixa Econômica'),
-        ('BANCO', 'Banco'),
-        ('SALÁRIO', 'Empregador'),
-        ('FGTS', 'Governo'),
-        ('INSS', 'Governo'),
-        ('IRPF', 'Receita Federal'),
-        ('PIX', 'Transferência PIX'),
-        ('TED', 'Transferência TED'),
-        ('DOC', 'Transferência DOC'),
-        ('BOLETO', 'Cobrança Boleto')
-    ]
-    
-    for padrao, contraparte in padroes:
-        if padrao in historico:
-            return contraparte
+def executar_no_pool(funcao, *args):
+    """
+    Executar função de parsing no pool de processos, fora do processo que
+    atende as requisições. Se o pool quebrar (processo morto), é recriado no próximo uso
+    """
+    global _pool_parsing
     
-    # Tentar identificar CPF/CNPJ no histórico
-    import re
-    cpf_cnpj = re.search(r'(\d{3}\.?\d{3}\.?\d{3}-?\d{2}|\d{2}\.?\d{3}\.?\d{3}/?\d{4}-?\d{2})', historico)
-    if cpf_cnpj:
-        return f"CPF/CNPJ: {cpf_cnpj.group(0)}"
+    with _lock_pool_parsing:
+        if _pool_parsing is None:
+            logger.info(f"Iniciando pool de parsing com {PARSE_PROCESSOS} processos")
+            _pool_parsing = ProcessPoolExecutor(
+                max_workers=PARSE_PROCESSOS,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        pool = _pool_parsing
     
-    # Se não encontrou nenhum padrão específico
-    partes = historico.split()
-    if len(partes) > 3:
-        return ' '.join(partes[:3]) + '...'
+    try:
+        return pool.submit(funcao, *args).result()
+    except BrokenProcessPool:
+        with _lock_pool_parsing:
+            if _pool_parsing is pool:
+                _pool_parsing = None
+        raise
+
+_tarefa_contadores: Optional[asyncio.Task] = None
+
+def reconciliar_contadores_transacoes() -> Optional[List[dict]]:
+    """
+    Recalcula os contadores de transações por (banco, status) a partir da view
+    transacoes_estatisticas e retorna os totais (None se o banco falhar)
+    """
+    try:
+        grupos = supabase.admin_client.table("transacoes_estatisticas").select(
+            "banco, status, quantidade, valor_total"
+        ).execute().data
+    except Exception as e:
+        logger.error(f"❌ Erro ao reconciliar contadores de transações: {e}")
+        return None
     
-    return historico if historico else 'Não identificado'
+    # Um incremento entre a leitura da view e a gravação se perde até a próxima reconciliação
+    divergentes = cache.reconciliar_contadores(grupos)
+    if divergentes:
+        logger.warning(f"⚠️ Contadores de transações divergiam do banco em {divergentes} grupo(s); corrigidos")
+    return grupos
+
+async def reconciliar_contadores_periodicamente():
+    """Reconciliar os contadores ao iniciar e a cada CONTADORES_RECONCILIACAO_SEGUNDOS"""
+    while True:
+        await asyncio.to_thread(reconciliar_contadores_transacoes)
+        await asyncio.sleep(CONTADORES_RECONCILIACAO_SEGUNDOS)
 
 @app.on_event("startup")
 async def startup():
     """Inicializar aplicação"""
+    global _tarefa_contadores
     logger.info("🚀 Iniciando Sistema de Conciliação Bancária...")
     
     # Pré-carrega lookups no cache
     await carregar_lookups_cache()
     
+    if supabase:
+        _tarefa_contadores = asyncio.create_task(reconciliar_contadores_periodicamente())
+    
     logger.info("✅ Sistema iniciado com sucesso!")
 
+@app.on_event("shutdown")
+async def shutdown():
+    """Encerrar pool de parsing e a reconciliação dos contadores"""
+    if _pool_parsing is not None:
+        _pool_parsing.shutdown(wait=False, cancel_futures=True)
+    if _tarefa_contadores is not None:
+        _tarefa_contadores.cancel()
+
+def cards_upload_bancos() -> str:
+    """Um card de upload por banco de BancoEnum na página inicial"""
+    return ''.join(f"""
+                <!-- Upload {banco} -->
+                <section class="card">
+                    <h3>
+                        <span>📤</span>
+                        Upload Extrato {banco}
+                    </h3>
+                    <div class="upload-area">
+                        <form action="/upload-extrato" method="post" enctype="multipart/form-data">
+                            <input type="hidden" name="banco" value="{banco}">
+                            <p>Selecione o arquivo do banco {banco}</p>
+                            <input type="file" name="file" accept="{ACCEPT_EXTRATO}" required>
+                            <br>
+                            <button type="submit" class="btn btn-primary">
+                                <span>🚀</span>
+                                Processar Extrato {banco}
+                            </button>
+                        </form>
+                    </div>
+                </section>
+                """ for banco in BANCOS_VALIDOS)
+
 @app.get("/")
 async def root():
     """Página inicial"""
@@ -974,7 +851,7 @@ async def root():
             <!-- Header -->
             <header class="header">
                 <h1>🏦 Sistema de Conciliação Bancária</h1>
-                <p>Gerencie extratos AAI e EDUCAÇÃO com eficiência e precisão</p>
+                <p>Gerencie extratos """ + ' e '.join(BANCOS_VALIDOS) + r""" com eficiência e precisão</p>
             </header>
             
             <!-- Navigation -->
@@ -1007,45 +884,7 @@ async def root():
             
             <!-- Main Content -->
             <main class="main-grid">
-                <!-- Upload AAI -->
-                <section class="card">
-                    <h3>
-                        <span>📤</span>
-                        Upload Extrato AAI
-                    </h3>
-                    <div class="upload-area">
-                        <form action="/upload-extrato" method="post" enctype="multipart/form-data">
-                            <input type="hidden" name="banco" value="AAI">
-                            <p>Selecione o arquivo do banco AAI</p>
-                            <input type="file" name="file" accept=".xlsx,.xls,.csv" required>
-                            <br>
-                            <button type="submit" class="btn btn-primary">
-                                <span>🚀</span>
-                                Processar Extrato AAI
-                            </button>
-                        </form>
-                    </div>
-                </section>
-                
-                <!-- Upload EDUCAÇÃO -->
-                <section class="card">
-                    <h3>
-                        <span>📤</span>
-                        Upload Extrato EDUCAÇÃO
-                    </h3>
-                    <div class="upload-area">
-                        <form action="/upload-extrato" method="post" enctype="multipart/form-data">
-                            <input type="hidden" name="banco" value="EDUCAÇÃO">
-                            <p>Selecione o arquivo do banco EDUCAÇÃO</p>
-                            <input type="file" name="file" accept=".xlsx,.xls,.csv" required>
-                            <br>
-                            <button type="submit" class="btn btn-primary">
-                                <span>🚀</span>
-                                Processar Extrato EDUCAÇÃO
-                            </button>
-                        </form>
-                    </div>
-                </section>
+                """ + cards_upload_bancos() + r"""
             </main>
             
             <!-- Statistics -->
@@ -1401,196 +1240,927 @@ async def root():
     """
     return HTMLResponse(content=html_content)
 
+def criar_extrato(banco: str, arquivo: str, total_transacoes: int, status: str,
+                  dialeto: Optional[Tuple[str, str]] = None,
+                  resumo: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Inserir registro do extrato e retornar seu ID. O hash do arquivo só é
+    gravado em finalizar_extrato, quando todas as transações foram salvas
+    """
+    extrato_data = {
+        'banco': banco,
+        'arquivo': arquivo,
+        'total_transacoes': total_transacoes,
+        'status': status,
+        'processado_em': datetime.now().isoformat(),
+        'processado_por': 'Sistema',  # TODO: pegar usuário logado
+        'resumo': resumo
+    }
+    
+    if dialeto:
+        # Dialeto do CSV fica no extrato para os próximos uploads do mesmo banco
+        extrato_data['csv_encoding'], extrato_data['csv_separador'] = dialeto
+        cache.set(f"dialeto_csv:{banco}", list(dialeto), 'dialetos')
+    
+    extrato_result = supabase.admin_client.table("extratos").insert(extrato_data).execute()
+    
+    if not extrato_result.data:
+        logger.error("❌ Erro ao salvar extrato no banco")
+        raise HTTPException(status_code=500, detail="Erro ao salvar extrato no banco")
+    
+    extrato_id = extrato_result.data[0]['id']
+    logger.info(f"✅ Extrato salvo com ID: {extrato_id}")
+    return extrato_id
+
+def finalizar_extrato(extrato_id: str, resumo: Dict[str, Any], sha256: Optional[str],
+                      transacoes_com_erro: int) -> str:
+    """
+    Marcar o extrato como PROCESSADO, com o hash do arquivo, só se todos os lotes
+    foram salvos. Com lotes perdidos fica PARCIAL e sem hash: o mesmo arquivo pode
+    ser enviado de novo e as transações que faltam entram (as já salvas são ignoradas)
+    """
+    status = 'PROCESSADO' if transacoes_com_erro == 0 else 'PARCIAL'
+    supabase.admin_client.table("extratos").update({
+        'status': status,
+        'arquivo_sha256': sha256 if status == 'PROCESSADO' else None,
+        'total_transacoes': resumo['total_transacoes'],
+        'resumo': resumo,
+        'processado_em': datetime.now().isoformat()
+    }).eq("id", extrato_id).execute()
+    
+    if status == 'PARCIAL':
+        logger.warning(f"⚠️ Extrato {extrato_id} parcial: {transacoes_com_erro} transações não foram salvas")
+    return status
+
+def preparar_transacao_banco(transacao: Dict[str, Any], extrato_id: str) -> Dict[str, Any]:
+    """Converter transação processada no formato da tabela transacoes"""
+    return {
+        'extrato_id': extrato_id,
+        'banco': transacao['banco'],
+        'data': transacao['data'] or None,  # já em ISO (converter_datas)
+        'historico': transacao['historico'],
+        'documento': transacao['documento'],
+        'valor': float(transacao['valor']) if transacao['valor'] else 0,
+        'saldo': float(transacao['saldo']) if transacao['saldo'] else 0,
+        'tipo_transacao': transacao['tipo_transacao'],
+        'status': 'PENDENTE',
+        'forma_pagamento': transacao['forma_pagamento'],
+        'banco_origem': transacao['banco_origem'],
+        'contraparte': transacao['contraparte'],
+        'data_pagamento': transacao['data_pagamento'] or None,
+        'chave_natural': transacao['chave_natural'],
+        'created_at': datetime.now().isoformat()
+    }
+
+def inserir_lote(numero: int, batch: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Inserir um lote de transações, tentando de novo com backoff exponencial.
+    Linhas cuja chave natural já existe são ignoradas (extratos sobrepostos)
+    """
+    resultado = {'lote': numero, 'linhas': len(batch), 'salvas': 0, 'ignoradas': 0, 'tentativas': 0, 'erro': None}
+    
+    for tentativa in range(1, INSERT_TENTATIVAS + 1):
+        resultado['tentativas'] = tentativa
+        try:
+            transacoes_result = supabase.admin_client.table("transacoes").upsert(
+                batch, on_conflict='chave_natural', ignore_duplicates=True
+            ).execute()
+            # Só as linhas realmente inseridas voltam na resposta
+            resultado['salvas'] = len(transacoes_result.data or [])
+            cache.somar_transacoes_contadores(transacoes_result.data or [])
+            resultado['ignoradas'] = len(batch) - resultado['salvas']
+            resultado['erro'] = None
+            return resultado
+        except Exception as e:
+            resultado['erro'] = str(e)
+        
+        if tentativa < INSERT_TENTATIVAS:
+            espera = INSERT_BACKOFF_SEGUNDOS * 2 ** (tentativa - 1)
+            logger.warning(f"⚠️ Lote {numero} falhou ({resultado['erro']}), nova tentativa em {espera:.1f}s")
+            time.sleep(espera)
+    
+    return resultado
+
+def salvar_transacoes_em_lotes(transacoes_para_banco: List[Dict[str, Any]], batch_size: Optional[int] = None,
+                               job: Optional[UploadJob] = None,
+                               concorrencia: Optional[int] = None) -> Tuple[int, int, int]:
+    """
+    Inserir transações em lotes (Supabase tem limite), com vários lotes em
+    paralelo, e retornar quantas foram salvas, quantas já existiam e quantas
+    ficaram em lotes que falharam mesmo após as novas tentativas
+    """
+    batch_size = batch_size or INSERT_TAMANHO_LOTE
+    concorrencia = concorrencia or INSERT_CONCORRENCIA
+    lotes = [
+        (i // batch_size + 1, transacoes_para_banco[i:i + batch_size])
+        for i in range(0, len(transacoes_para_banco), batch_size)
+    ]
+    transacoes_salvas = 0
+    transacoes_ignoradas = 0
+    transacoes_com_erro = 0
+    
+    with ThreadPoolExecutor(max_workers=max(1, min(concorrencia, len(lotes)))) as executor:
+        futuros = [executor.submit(inserir_lote, numero, batch) for numero, batch in lotes]
+        
+        # Progresso registrado nesta thread, conforme cada lote termina
+        for futuro in as_completed(futuros):
+            resultado = futuro.result()
+            
+            if resultado['erro'] is None:
+                transacoes_salvas += resultado['salvas']
+                transacoes_ignoradas += resultado['ignoradas']
+                logger.info(f"✅ Lote {resultado['lote']}: {resultado['salvas']} transações salvas, "
+                            f"{resultado['ignoradas']} já existentes ({resultado['tentativas']} tentativa(s))")
+                if job:
+                    job.linhas_inseridas(resultado['salvas'])
+            else:
+                transacoes_com_erro += resultado['linhas']
+                logger.error(f"❌ Erro ao salvar lote {resultado['lote']} após {resultado['tentativas']} "
+                             f"tentativa(s): {resultado['erro']}")
+                if job:
+                    job.erro(f"Erro ao salvar lote {resultado['lote']} ({resultado['linhas']} transações): "
+                             f"{resultado['erro']}")
+    
+    return transacoes_salvas, transacoes_ignoradas, transacoes_com_erro
+
+def resumir_transacoes(transacoes: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Estatísticas do upload: total, entradas, saídas e valor total"""
+    return {
+        'total_transacoes': len(transacoes),
+        'creditos': sum(1 for t in transacoes if t['valor'] > 0),
+        'debitos': sum(1 for t in transacoes if t['valor'] < 0),
+        'valor_total': sum(t['valor'] for t in transacoes)
+    }
+
+def buscar_ultima_linha_importada(banco: str, antes_de: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    Última linha (data, valor e saldo) do extrato mais recente do banco,
+    opcionalmente entre os que terminam antes da data antes_de
+    """
+    coluna_data = "resumo->integridade->ultima->>data"
+    try:
+        query = supabase.admin_client.table("extratos").select("id, resumo").eq("banco", banco).eq(
+            "status", "PROCESSADO"
+        ).not_.is_(coluna_data, "null")
+        if antes_de:
+            query = query.lt(coluna_data, antes_de)
+        result = query.order(coluna_data, desc=True).limit(1).execute()
+    except Exception as e:
+        logger.warning(f"⚠️ Não foi possível buscar a última linha importada de {banco}: {e}")
+        return None
+    
+    if not result.data:
+        return None
+    return {'extrato_id': result.data[0]['id'], **result.data[0]['resumo']['integridade']['ultima']}
+
+def fechar_integridade_saldo(integridade: Dict[str, Any], banco: str,
+                             anterior: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Concluir a verificação do saldo, comparando com o último extrato já importado
+    do banco (ou com `anterior`, a âncora da importação incremental)
+    """
+    primeira = integridade['primeira']
+    if anterior is None and primeira:
+        anterior = buscar_ultima_linha_importada(banco, primeira['data'])
+    integridade = concluir_integridade_saldo(integridade, anterior)
+    if not integridade['consistente'] and integridade['verificado']:
+        logger.warning(
+            f"⚠️ Saldo de {banco} com quebras: {integridade['lacunas']} lacunas, "
+            f"{integridade['duplicadas']} duplicadas, descontinuidade com anterior: "
+            f"{integridade['descontinuidade_anterior'] is not None}"
+        )
+    return integridade
+
+def resolver_dialeto_csv(amostra: bytes, banco: str) -> Tuple[str, str]:
+    """
+    Dialeto (encoding, separador) do CSV: reaproveita o do último extrato
+    do banco quando compatível, senão detecta pela amostra
+    """
+    dialeto = cache.get(f"dialeto_csv:{banco}", 'dialetos')
+    
+    if not dialeto and supabase:
+        try:
+            result = supabase.admin_client.table("extratos").select("csv_encoding, csv_separador").eq(
+                "banco", banco
+            ).not_.is_("csv_encoding", "null").order("processado_em", desc=True).limit(1).execute()
+            if result.data:
+                dialeto = [result.data[0]['csv_encoding'], result.data[0]['csv_separador']]
+                cache.set(f"dialeto_csv:{banco}", dialeto, 'dialetos')
+        except Exception as e:
+            logger.warning(f"⚠️ Não foi possível buscar dialeto salvo para {banco}: {e}")
+    
+    if dialeto and dialeto_compativel(amostra, tuple(dialeto)):
+        logger.info(f"CSV {banco}: usando dialeto conhecido {tuple(dialeto)}")
+        return tuple(dialeto)
+    
+    return detectar_dialeto_csv(amostra)
+
+def resolver_perfil_csv(amostra: bytes) -> Optional[Dict[str, Any]]:
+    """
+    Perfil de extrato do CSV (None = layout padrão). O perfil reconhecido fica
+    em cache pelas linhas até o cabeçalho: layout já visto não é procurado de
+    novo, e perfil com encoding e separador definidos dispensa a detecção do dialeto
+    """
+    if not PERFIS:
+        return None
+    
+    inicio = b'\n'.join(amostra.split(b'\n', LINHAS_ATE_CABECALHO)[:LINHAS_ATE_CABECALHO])
+    chave = f"perfil_csv:{VERSAO_PERFIS}:{hashlib.sha256(inicio).hexdigest()}"
+    conhecido = cache.get(chave, 'dialetos')
+    if conhecido is not None:
+        perfil = PERFIS.get(conhecido['assinatura']) if conhecido['assinatura'] else None
+        return completar_perfil_csv(perfil, amostra) if perfil else None
+    
+    perfil = detectar_perfil_csv(amostra)
+    cache.set(chave, {'assinatura': perfil['assinatura'] if perfil else None}, 'dialetos')
+    return perfil
+
+def importar_em_blocos(blocos, filename: str, banco: str, dialeto: Optional[Tuple[str, str]] = None,
+                       job: Optional[UploadJob] = None, sha256: Optional[str] = None,
+                       relatorio: Optional[Dict[str, Any]] = None,
+                       ancora: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Importar arquivo grande bloco a bloco: cada bloco é transformado e salvo
+    antes do próximo ser lido, mantendo a memória constante. ancora é a última
+    linha já importada passada aos blocos; se ela foi encontrada (linhas puladas
+    no relatorio), o saldo é conferido a partir dela
+    """
+    extrato_id = criar_extrato(banco, filename, 0, 'PROCESSANDO', dialeto)
+    resumo = {'total_transacoes': 0, 'creditos': 0, 'debitos': 0, 'valor_total': 0.0}
+    integridade = nova_integridade_saldo()
+    transacoes_salvas = 0
+    transacoes_ignoradas = 0
+    transacoes_com_erro = 0
+    
+    try:
+        for transacoes in blocos:
+            if job:
+                job.linhas_processadas(len(transacoes))
+            verificar_continuidade_saldo(integridade, transacoes)
+            salvas, ignoradas, com_erro = salvar_transacoes_em_lotes(
+                [preparar_transacao_banco(t, extrato_id) for t in transacoes], job=job
+            )
+            transacoes_salvas += salvas
+            transacoes_ignoradas += ignoradas
+            transacoes_com_erro += com_erro
+            
+            resumo_bloco = resumir_transacoes(transacoes)
+            for campo in resumo:
+                resumo[campo] += resumo_bloco[campo]
+            logger.info(f"📦 Bloco salvo: {resumo['total_transacoes']} transações até agora")
+    except Exception:
+        supabase.admin_client.table("extratos").update({
+            'status': 'ERRO',
+            'total_transacoes': resumo['total_transacoes']
+        }).eq("id", extrato_id).execute()
+        raise
+    
+    if not (relatorio and relatorio['linhas_ja_importadas']):
+        # Âncora ausente ou arquivo crescente: importado inteiro
+        ancora = None
+    resumo['integridade'] = fechar_integridade_saldo(integridade, banco, ancora)
+    if ancora:
+        resumo['incremental'] = {'ancora': ancora, 'linhas_ja_importadas': relatorio['linhas_ja_importadas']}
+    status = finalizar_extrato(extrato_id, resumo, sha256, transacoes_com_erro)
+    
+    logger.info(f"✅ Total de transações salvas: {transacoes_salvas} ({transacoes_ignoradas} já existentes)")
+    resumo.update({
+        'extrato_id': extrato_id,
+        'status': status,
+        'transacoes_salvas': transacoes_salvas,
+        'transacoes_ignoradas': transacoes_ignoradas,
+        'transacoes_com_erro': transacoes_com_erro
+    })
+    return resumo
+
+def copiar_para_temporario(origem, filename: str) -> Tuple[str, str]:
+    """
+    Copiar o conteúdo para um arquivo temporário que sobrevive ao fim da
+    requisição, calculando o SHA-256 na mesma passada
+    """
+    _, extensao = os.path.splitext(filename)
+    sha256 = hashlib.sha256()
+    with tempfile.NamedTemporaryFile(delete=False, suffix=extensao) as destino:
+        while bloco := origem.read(1024 * 1024):
+            sha256.update(bloco)
+            destino.write(bloco)
+    return destino.name, sha256.hexdigest()
+
+def salvar_upload_em_disco(file: UploadFile) -> Tuple[str, str]:
+    """Copiar o upload para disco (caminho temporário e SHA-256)"""
+    file.file.seek(0)
+    return copiar_para_temporario(file.file, file.filename)
+
+def buscar_extrato_duplicado(sha256: str, banco: str) -> Optional[Dict[str, Any]]:
+    """Extrato já processado do mesmo banco com exatamente o mesmo arquivo"""
+    try:
+        result = supabase.admin_client.table("extratos").select("id, total_transacoes, resumo").eq(
+            "arquivo_sha256", sha256
+        ).eq("banco", banco).eq("status", "PROCESSADO").order("processado_em", desc=True).limit(1).execute()
+    except Exception as e:
+        logger.warning(f"⚠️ Não foi possível verificar duplicidade do arquivo: {e}")
+        return None
+    
+    return result.data[0] if result.data else None
+
+def importar_em_memoria(caminho: str, filename: str, banco: str, dialeto: Optional[Tuple[str, str]],
+                        relatorio: Dict[str, Any], job: UploadJob, sha256: str,
+                        executar=None, perfil: Optional[Dict[str, Any]] = None,
+                        ancora: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Importar arquivo pequeno: processa tudo de uma vez (a partir do mmap do arquivo) e salva em lotes.
+    Se o arquivo contém ancora (última linha já importada do banco), só o que vem depois dela é processado
+    """
+    logger.info("Processando arquivo...")
+    executar = executar or (lambda funcao, *args: funcao(*args))
+    transacoes, relatorio_atualizado = executar(
+        processar_arquivo_em_disco, caminho, filename, banco, dialeto, relatorio, UPLOAD_LINHAS_POR_BLOCO, ancora, perfil
+    )
+    relatorio.update(relatorio_atualizado)
+    if not relatorio['linhas_ja_importadas']:
+        # Âncora ausente do arquivo: importado inteiro
+        ancora = None
+    logger.info(f"Processadas {len(transacoes)} transações")
+    job.linhas_processadas(len(transacoes))
+    
+    job.etapa(ETAPA_SALVANDO)
+    resumo = resumir_transacoes(transacoes)
+    integridade = nova_integridade_saldo()
+    verificar_continuidade_saldo(integridade, transacoes)
+    resumo['integridade'] = fechar_integridade_saldo(integridade, banco, ancora)
+    if ancora:
+        resumo['incremental'] = {'ancora': ancora, 'linhas_ja_importadas': relatorio['linhas_ja_importadas']}
+    logger.info("💾 Salvando extrato no banco...")
+    extrato_id = criar_extrato(banco, filename, len(transacoes), 'PROCESSANDO', dialeto, resumo)
+    
+    # Preparar e inserir transações
+    logger.info("💾 Preparando transações para salvar...")
+    transacoes_para_banco = [preparar_transacao_banco(t, extrato_id) for t in transacoes]
+    
+    logger.info(f"💾 Salvando {len(transacoes_para_banco)} transações no banco...")
+    try:
+        transacoes_salvas, transacoes_ignoradas, transacoes_com_erro = salvar_transacoes_em_lotes(
+            transacoes_para_banco, job=job
+        )
+    except Exception:
+        supabase.admin_client.table("extratos").update({'status': 'ERRO'}).eq("id", extrato_id).execute()
+        raise
+    status = finalizar_extrato(extrato_id, resumo, sha256, transacoes_com_erro)
+    logger.info(f"✅ Total de transações salvas: {transacoes_salvas} ({transacoes_ignoradas} já existentes)")
+    
+    return {
+        **resumo,
+        'extrato_id': extrato_id,
+        'status': status,
+        'transacoes_salvas': transacoes_salvas,
+        'transacoes_ignoradas': transacoes_ignoradas,
+        'transacoes_com_erro': transacoes_com_erro
+    }
+
+def importar_arquivo(caminho: str, filename: str, banco: str, job: UploadJob, sha256: str) -> Dict[str, Any]:
+    """Ler, processar e salvar o extrato, registrando o progresso no job"""
+    duplicado = buscar_extrato_duplicado(sha256, banco)
+    if duplicado:
+        # Mesmo arquivo já importado: devolve o resumo existente sem reprocessar
+        logger.info(f"♻️ Arquivo {filename} já importado no extrato {duplicado['id']}")
+        resumo = {'total_transacoes': duplicado['total_transacoes'], 'creditos': 0, 'debitos': 0, 'valor_total': 0.0}
+        resumo.update(duplicado.get('resumo') or {})
+        resumo.update({
+            'extrato_id': duplicado['id'],
+            'transacoes_salvas': 0,
+            'transacoes_ignoradas': resumo['total_transacoes'],
+            'duplicado': True
+        })
+        return resumo
+    
+    job.etapa(ETAPA_PROCESSANDO)
+    # Formato de data do último extrato do banco evita a detecção
+    relatorio = novo_relatorio_valores(cache.get(f"formato_data:{banco}", 'dialetos'))
+    
+    tamanho_arquivo = os.path.getsize(caminho)
+    with open(caminho, 'rb') as arquivo:
+        resumo = importar_conteudo(arquivo, caminho, tamanho_arquivo, filename, banco, relatorio, job, sha256)
+    
+    if relatorio['formato_data']:
+        cache.set(f"formato_data:{banco}", relatorio['formato_data'], 'dialetos')
+    
+    return {**resumo, 'valores_invalidos': relatorio}
+
+def resolver_dialeto_upload(arquivo, filename: str,
+                            banco: str) -> Tuple[Optional[Tuple[str, str]], Optional[str], Optional[Dict[str, Any]]]:
+    """
+    Dialeto (CSV), compressão e perfil de extrato (CSV) do arquivo enviado,
+    deixando o arquivo no início. O perfil, quando reconhecido, define o dialeto
+    """
+    compressao = compressao_csv(filename)
+    if compressao:
+        amostra = amostra_csv_compactado(arquivo, compressao)
+    elif filename.endswith('.csv'):
+        # Encoding/separador decididos uma vez, a partir de uma amostra
+        amostra = arquivo.read(TAMANHO_AMOSTRA_CSV)
+        arquivo.seek(0)
+    else:
+        return None, None, None
+    
+    perfil = resolver_perfil_csv(amostra)
+    if perfil:
+        return (perfil['encoding'], perfil['separador']), compressao, perfil
+    return resolver_dialeto_csv(amostra, banco), compressao, None
+
+def executor_parsing(tamanho_arquivo: int):
+    """Arquivos pequenos são processados na thread atual (None); os demais no pool de processos"""
+    return executar_no_pool if PARSE_PROCESSOS > 0 and tamanho_arquivo >= PARSE_PROCESSO_MIN_BYTES else None
+
+def importar_conteudo(arquivo, caminho: str, tamanho_arquivo: int, filename: str, banco: str,
+                      relatorio: Dict[str, Any], job: UploadJob, sha256: str) -> Dict[str, Any]:
+    """Escolher o caminho de importação pelo formato e tamanho do arquivo"""
+    dialeto, compressao, perfil = resolver_dialeto_upload(arquivo, filename, banco)
+    executar = executor_parsing(tamanho_arquivo)
+    # Última linha já importada do banco: em blocos, só interrompe a leitura de arquivos decrescentes
+    ancora = buscar_ultima_linha_importada(banco)
+    
+    if formato_estruturado(filename):
+        # OFX/CNAB: sempre em fluxo, bloco a bloco (uma passada, memória constante)
+        logger.info(f"Arquivo {formato_estruturado(filename).upper()} de {tamanho_arquivo} bytes - importando em blocos...")
+        blocos = processar_estruturado_em_blocos(
+            arquivo, filename, banco, UPLOAD_LINHAS_POR_BLOCO, relatorio, executar, ancora
+        )
+        resumo = importar_em_blocos(blocos, filename, banco, job=job, sha256=sha256, relatorio=relatorio, ancora=ancora)
+    elif compressao:
+        # CSV compactado: descompactado em fluxo direto para a leitura em blocos
+        logger.info(f"CSV compactado ({compressao}) de {tamanho_arquivo} bytes - importando em blocos...")
+        with abrir_csv_compactado(arquivo, compressao) as descompactado:
+            blocos = processar_csv_em_blocos(
+                descompactado, banco, UPLOAD_LINHAS_POR_BLOCO, dialeto, relatorio, executar, perfil, ancora
+            )
+            resumo = importar_em_blocos(blocos, filename, banco, dialeto, job, sha256, relatorio, ancora)
+    elif dialeto and tamanho_arquivo >= UPLOAD_STREAMING_MIN_BYTES:
+        # CSV grande: lê, transforma e salva bloco a bloco (memória constante)
+        logger.info(f"Arquivo de {tamanho_arquivo} bytes - importando em blocos...")
+        blocos = processar_csv_em_blocos(
+            arquivo, banco, UPLOAD_LINHAS_POR_BLOCO, dialeto, relatorio, executar, perfil, ancora
+        )
+        resumo = importar_em_blocos(blocos, filename, banco, dialeto, job, sha256, relatorio, ancora)
+    elif filename.endswith('.xlsx') and tamanho_arquivo >= UPLOAD_STREAMING_MIN_BYTES:
+        # Excel grande: leitura somente leitura em blocos
+        logger.info(f"Arquivo de {tamanho_arquivo} bytes - importando em blocos...")
+        blocos = processar_excel_em_blocos(arquivo, banco, UPLOAD_LINHAS_POR_BLOCO, relatorio, executar, ancora)
+        resumo = importar_em_blocos(blocos, filename, banco, job=job, sha256=sha256, relatorio=relatorio, ancora=ancora)
+    else:
+        logger.info(f"Arquivo de {tamanho_arquivo} bytes - importando de uma vez...")
+        resumo = importar_em_memoria(caminho, filename, banco, dialeto, relatorio, job, sha256, executar, perfil, ancora)
+    
+    if perfil:
+        resumo['perfil'] = perfil['nome']
+    return resumo
+
+def ler_blocos_para_validacao(arquivo, caminho: str, filename: str, banco: str,
+                              relatorio: Dict[str, Any]) -> Iterator[List[Dict]]:
+    """Transações do arquivo em blocos (qualquer tamanho), sem gravar nada"""
+    dialeto, compressao, perfil = resolver_dialeto_upload(arquivo, filename, banco)
+    executar = executor_parsing(os.path.getsize(caminho))
+    
+    if formato_estruturado(filename):
+        yield from processar_estruturado_em_blocos(arquivo, filename, banco, UPLOAD_LINHAS_POR_BLOCO, relatorio, executar)
+    elif compressao:
+        with abrir_csv_compactado(arquivo, compressao) as descompactado:
+            yield from processar_csv_em_blocos(descompactado, banco, UPLOAD_LINHAS_POR_BLOCO, dialeto, relatorio, executar, perfil)
+    elif dialeto:
+        yield from processar_csv_em_blocos(arquivo, banco, UPLOAD_LINHAS_POR_BLOCO, dialeto, relatorio, executar, perfil)
+    elif filename.endswith('.xlsx'):
+        yield from processar_excel_em_blocos(arquivo, banco, UPLOAD_LINHAS_POR_BLOCO, relatorio, executar)
+    else:
+        executar = executar or (lambda funcao, *args: funcao(*args))
+        transacoes, relatorio_atualizado = executar(
+            processar_arquivo_em_disco, caminho, filename, banco, dialeto, relatorio, UPLOAD_LINHAS_POR_BLOCO
+        )
+        relatorio.update(relatorio_atualizado)
+        yield transacoes
+
+def buscar_chaves_existentes(chaves: List[str]) -> set:
+    """Chaves naturais que já estão na tabela transacoes (somente leitura)"""
+    existentes = set()
+    for inicio in range(0, len(chaves), VALIDACAO_LOTE_CHAVES):
+        result = supabase.admin_client.table("transacoes").select("chave_natural").in_(
+            "chave_natural", chaves[inicio:inicio + VALIDACAO_LOTE_CHAVES]
+        ).execute()
+        existentes.update(linha['chave_natural'] for linha in result.data)
+    return existentes
+
+def validar_arquivo(caminho: str, filename: str, banco: str, sha256: str) -> Dict[str, Any]:
+    """
+    Dry run do upload: processa e classifica o arquivo inteiro e devolve o que
+    seria importado (contagens, totais, período, valores inválidos e transações
+    que já existem no banco) sem gravar nada no Supabase
+    """
+    duplicado = buscar_extrato_duplicado(sha256, banco)
+    relatorio = novo_relatorio_valores(cache.get(f"formato_data:{banco}", 'dialetos'))
+    resumo = {'total_transacoes': 0, 'creditos': 0, 'debitos': 0, 'valor_total': 0.0}
+    integridade = nova_integridade_saldo()
+    data_inicio = data_fim = None
+    total_existentes = 0
+    exemplos_existentes = []
+    
+    with open(caminho, 'rb') as arquivo, \
+            closing(ler_blocos_para_validacao(arquivo, caminho, filename, banco, relatorio)) as blocos:
+        for transacoes in blocos:
+            resumo_bloco = resumir_transacoes(transacoes)
+            for campo in resumo:
+                resumo[campo] += resumo_bloco[campo]
+            verificar_continuidade_saldo(integridade, transacoes)
+            
+            datas = [t['data'] for t in transacoes if t['data']]
+            if datas:
+                data_inicio = min(data_inicio or datas[0], min(datas))
+                data_fim = max(data_fim or datas[0], max(datas))
+            
+            existentes = buscar_chaves_existentes([t['chave_natural'] for t in transacoes])
+            total_existentes += len(existentes)
+            for t in transacoes:
+                if len(exemplos_existentes) >= VALIDACAO_MAX_EXEMPLOS:
+                    break
+                if t['chave_natural'] in existentes:
+                    exemplos_existentes.append({'data': t['data'], 'historico': t['historico'], 'valor': t['valor']})
+    
+    logger.info(f"🔎 Dry run de {filename}: {resumo['total_transacoes']} transações, {total_existentes} já existentes")
+    return {
+        **resumo,
+        'dry_run': True,
+        'valido': True,
+        'periodo': {'inicio': data_inicio, 'fim': data_fim},
+        'valores_invalidos': relatorio,
+        'integridade': fechar_integridade_saldo(integridade, banco),
+        'chaves_existentes': {'total': total_existentes, 'exemplos': exemplos_existentes},
+        'arquivo_ja_importado': duplicado['id'] if duplicado else None
+    }
+
+def processar_job_upload(job: UploadJob, caminho: str, sha256: str, filename: str, banco: str):
+    """Importar o arquivo salvo em disco, registrando sucesso ou erro no job"""
+    try:
+        resumo = importar_arquivo(caminho, filename, banco, job, sha256)
+        logger.info(f"🎉 Extrato {banco} processado e salvo com sucesso!")
+        job.concluir(resumo)
+    except Exception as e:
+        logger.error(f"ERRO CRÍTICO ao processar extrato {banco}: {str(e)}")
+        import traceback
+        logger.error(f"Traceback completo: {traceback.format_exc()}")
+        job.falhar(getattr(e, 'detail', None) or str(e))
+    finally:
+        os.remove(caminho)
+
+def executar_job_upload(job: UploadJob, caminho: str, sha256: str, filename: str, banco: str):
+    """Processar o upload em segundo plano (fora do event loop)"""
+    try:
+        processar_job_upload(job, caminho, sha256, filename, banco)
+    finally:
+        _vagas_upload.release()
+
+def selecionar_membros_zip(zip_extratos: zipfile.ZipFile) -> List[zipfile.ZipInfo]:
+    """
+    Extratos do zip (ignora pastas, arquivos ocultos e formatos não suportados),
+    recusando zips com entradas demais ou tamanho descompactado acima dos limites
+    """
+    entradas = zip_extratos.infolist()
+    if len(entradas) > ZIP_MAX_ENTRADAS:
+        raise HTTPException(status_code=400, detail=f"Zip com mais de {ZIP_MAX_ENTRADAS} entradas")
+    
+    membros = []
+    for membro in entradas:
+        partes = membro.filename.split('/')
+        nome = partes[-1]
+        if membro.is_dir() or partes[0] == '__MACOSX' or nome.startswith('.'):
+            continue
+        if not nome.endswith(EXTENSOES_EXTRATO):
+            logger.warning(f"⚠️ Ignorando {membro.filename} do zip (formato não suportado)")
+            continue
+        if len(membros) >= LOTE_MAX_ARQUIVOS:
+            raise HTTPException(status_code=400, detail=f"Máximo de {LOTE_MAX_ARQUIVOS} arquivos por lote")
+        if membro.file_size > ZIP_MAX_BYTES_ARQUIVO:
+            raise HTTPException(
+                status_code=413,
+                detail=f"{membro.filename} excede {ZIP_MAX_BYTES_ARQUIVO} bytes descompactado"
+            )
+        membros.append(membro)
+    
+    if sum(membro.file_size for membro in membros) > ZIP_MAX_BYTES_TOTAL:
+        raise HTTPException(status_code=413, detail=f"Zip excede {ZIP_MAX_BYTES_TOTAL} bytes descompactado")
+    return membros
+
+def extrair_zip_extratos(caminho_zip: str, banco_padrao: str) -> List[Tuple[str, str, str, str]]:
+    """
+    Extrair os extratos de um .zip para arquivos temporários: (caminho, sha256, nome, banco).
+    Uma pasta AAI/ ou EDUCAÇÃO/ dentro do zip define o banco dos arquivos nela;
+    os demais ficam com o banco informado para o zip. Quantidade de entradas e
+    tamanhos descompactados são conferidos antes de extrair qualquer arquivo
+    """
+    extraidos = []
+    try:
+        with zipfile.ZipFile(caminho_zip) as zip_extratos:
+            membros = selecionar_membros_zip(zip_extratos)
+            for membro in membros:
+                partes = membro.filename.split('/')
+                nome = partes[-1]
+                banco = next((p for p in partes[:-1] if p in BANCOS_VALIDOS), banco_padrao)
+                # ZipExtFile não lê além de file_size, já conferido
+                with zip_extratos.open(membro) as origem:
+                    caminho, sha256 = copiar_para_temporario(origem, nome)
+                extraidos.append((caminho, sha256, nome, banco))
+    except Exception:
+        for caminho, *_ in extraidos:
+            os.remove(caminho)
+        raise
+    finally:
+        os.remove(caminho_zip)
+    
+    return extraidos
+
+def processar_item_lote(job: UploadJob, caminho: str, sha256: str, filename: str, banco: str):
+    """Importar um arquivo do lote ocupando uma vaga de upload (espera a vaga na fila do job)"""
+    with _vagas_upload:
+        processar_job_upload(job, caminho, sha256, filename, banco)
+
+def executar_lote_upload(itens: List[Tuple[UploadJob, str, str, str, str]]):
+    """
+    Importar os arquivos do lote em paralelo; cada um registra o próprio job.
+    Cada arquivo em andamento ocupa uma vaga, então o lote nunca passa de
+    UPLOADS_MAX_EM_ANDAMENTO importações junto com os demais uploads
+    """
+    # A vaga tomada na requisição só garantiu a entrada do lote
+    _vagas_upload.release()
+    with ThreadPoolExecutor(max_workers=LOTE_CONCORRENCIA) as executor:
+        list(executor.map(lambda item: processar_item_lote(*item), itens))
+
+async def validar_upload(caminho: str, sha256: str, filename: str, banco: str) -> JSONResponse:
+    """Executar o dry run na hora (sem job) e liberar arquivo e vaga ao final"""
+    try:
+        resultado = await run_in_threadpool(validar_arquivo, caminho, filename, banco, sha256)
+    except ValueError as e:
+        logger.warning(f"🔎 Dry run de {filename}: arquivo inválido - {e}")
+        return JSONResponse(status_code=422, content={'dry_run': True, 'valido': False, 'erro': str(e)})
+    finally:
+        os.remove(caminho)
+        _vagas_upload.release()
+    
+    return JSONResponse(content=resultado)
+
+def resposta_upload_saturado(request: Request):
+    """Resposta 503 com Retry-After quando o limite de uploads em andamento foi atingido"""
+    headers = {'Retry-After': str(UPLOAD_RETRY_AFTER_SEGUNDOS)}
+    detalhe = "Muitos extratos em processamento no momento. Tente novamente em instantes."
+    
+    if 'application/json' in request.headers.get('accept', ''):
+        return JSONResponse(status_code=503, content={'detail': detalhe}, headers=headers)
+    
+    return HTMLResponse(
+        content=f"""
+        <html><body>
+            <h2>⏳ Servidor ocupado</h2>
+            <p>{detalhe}</p>
+            <a href="/">Voltar</a>
+        </body></html>
+        """,
+        status_code=503,
+        headers=headers
+    )
+
+def pagina_progresso_upload(job_id: str, filename: str, banco: str) -> str:
+    """Página que acompanha o job de upload até o resumo final"""
+    return f"""
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <title>Processando Upload</title>
+        <link href="https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700&display=swap" rel="stylesheet">
+        <style>
+            body {{ font-family: 'Inter', Arial, sans-serif; background: linear-gradient(135deg, #eff6ff 0%, #dbeafe 100%); min-height: 100vh; color: #111827; line-height: 1.6; padding: 1.5rem; }}
+            .container {{ max-width: 900px; margin: 0 auto; }}
+            .success-card {{ background: white; border-radius: 1.5rem; padding: 2.5rem; box-shadow: 0 20px 25px -5px rgb(0 0 0 / 0.1); text-align: center; }}
+            .success-icon {{ font-size: 4rem; display: block; margin-bottom: 1.5rem; }}
+            h1 {{ font-size: 2.5rem; font-weight: 700; color: #111827; margin-bottom: 2rem; }}
+            .success-info {{ background: #f0fdf4; border: 1px solid #dcfce7; border-radius: 1rem; padding: 1.5rem; margin-bottom: 2rem; }}
+            .success-info h3 {{ font-size: 1.25rem; font-weight: 600; color: #166534; margin-bottom: 1rem; display: flex; align-items: center; justify-content: center; gap: 0.5rem; }}
+            .success-info p {{ color: #374151; margin: 0.5rem 0; }}
+            .success-info p strong {{ font-weight: 600; color: #1f2937; }}
+            .btn {{ display: inline-flex; align-items: center; gap: 0.75rem; padding: 0.75rem 1.5rem; border: none; border-radius: 0.75rem; font-weight: 600; text-decoration: none; cursor: pointer; transition: all 0.3s ease; margin: 0.5rem; }}
+            .btn-primary {{ background: #2563eb; color: white; }}
+            .btn-primary:hover {{ background: #1d4ed8; transform: translateY(-2px); }}
+            .actions {{ display: flex; justify-content: center; flex-wrap: wrap; margin-top: 2rem; }}
+            .highlight {{ background: linear-gradient(135deg, #22c55e, #16a34a); color: white; padding: 1rem; border-radius: 1rem; margin: 1rem 0; }}
+            .error {{ background: #f8d7da; border: 1px solid #f5c6cb; border-radius: 1rem; padding: 1.5rem; color: #721c24; margin: 1rem 0; }}
+            .hidden {{ display: none; }}
+        </style>
+    </head>
+    <body>
+        <div class="container">
+            <div class="success-card">
+                <span class="success-icon" id="icone">⏳</span>
+                <h1 id="titulo">Processando Extrato...</h1>
+                
+                <div class="success-info">
+                    <h3>
+                        <span>📤</span>
+                        Extrato {banco}
+                    </h3>
+                    <p><strong>Arquivo:</strong> {filename}</p>
+                    <p><strong>Job:</strong> {job_id}</p>
+                    <p><strong>Etapa:</strong> <span id="etapa">Na fila</span></p>
+                    <p><strong>Linhas Processadas:</strong> <span id="linhas-processadas">0</span></p>
+                    <p><strong>Transações Salvas:</strong> <span id="linhas-inseridas">0</span></p>
+                    <p id="extrato" class="hidden"><strong>ID do Extrato:</strong> <span id="extrato-id"></span></p>
+                </div>
+                
+                <div class="highlight hidden" id="resumo">
+                    <h3 style="margin: 0 0 1rem 0;">📊 Resumo do Processamento</h3>
+                    <p><strong>Transações Importadas:</strong> <span id="total-transacoes"></span></p>
+                    <p><strong>Transações Salvas:</strong> <span id="transacoes-salvas"></span></p>
+                    <p><strong>Já Existentes (ignoradas):</strong> <span id="transacoes-ignoradas"></span></p>
+                    <p><strong>Entradas (+):</strong> <span id="creditos"></span> transações</p>
+                    <p><strong>Saídas (-):</strong> <span id="debitos"></span> transações</p>
+                    <p><strong>Valor Total:</strong> R$ <span id="valor-total"></span></p>
+                    <p id="invalidos" class="hidden"><strong>Valores Inválidos:</strong> <span id="invalidos-texto"></span></p>
+                    <p id="integridade" class="hidden"><strong>Continuidade do Saldo:</strong> <span id="integridade-texto"></span></p>
+                </div>
+                
+                <div class="error hidden" id="erro">
+                    <h3>Não foi possível processar e salvar o arquivo no banco</h3>
+                    <p><strong>Erro:</strong> <span id="erro-mensagem"></span></p>
+                </div>
+                
+                <div class="actions">
+                    <a href="/pendentes" class="btn btn-primary">
+                        <span>📋</span>
+                        Ver Transações Pendentes
+                    </a>
+                    <a href="/" class="btn btn-primary">
+                        <span>🏠</span>
+                        Voltar ao Início
+                    </a>
+                    <a href="/relatorios" class="btn btn-primary">
+                        <span>📊</span>
+                        Ver Relatórios
+                    </a>
+                </div>
+            </div>
+        </div>
+        
+        <script>
+        const JOB_ID = '{job_id}';
+        const ETAPAS = {{
+            NA_FILA: 'Na fila',
+            PROCESSANDO: 'Processando arquivo',
+            SALVANDO: 'Salvando no banco',
+            CONCLUIDO: 'Concluído',
+            ERRO: 'Erro'
+        }};
+        
+        function preencher(id, valor) {{
+            document.getElementById(id).textContent = valor;
+        }}
+        
+        function mostrarResumo(job) {{
+            const resumo = job.resumo;
+            preencher('icone', resumo.duplicado ? '♻️' : '🎉');
+            preencher('titulo', resumo.duplicado ? 'Arquivo Já Importado Anteriormente' : 'Upload Concluído com Sucesso!');
+            preencher('extrato-id', resumo.extrato_id);
+            preencher('total-transacoes', resumo.total_transacoes);
+            preencher('transacoes-salvas', resumo.transacoes_salvas);
+            preencher('transacoes-ignoradas', resumo.transacoes_ignoradas);
+            preencher('creditos', resumo.creditos);
+            preencher('debitos', resumo.debitos);
+            preencher('valor-total', resumo.valor_total.toLocaleString('en-US', {{ minimumFractionDigits: 2, maximumFractionDigits: 2 }}));
+            document.getElementById('extrato').classList.remove('hidden');
+            document.getElementById('resumo').classList.remove('hidden');
+            
+            const invalidos = resumo.valores_invalidos;
+            if (invalidos) {{
+                const celulas = Object.values(invalidos.celulas_invalidas).reduce((a, b) => a + b, 0);
+                if (celulas || invalidos.linhas_descartadas) {{
+                    const exemplos = invalidos.exemplos.map(e => `${{e.coluna}}: "${{e.valor}}"`).join(', ');
+                    preencher('invalidos-texto', `${{celulas}} células inválidas, ${{invalidos.linhas_descartadas}} linhas descartadas` + (exemplos ? ` (ex.: ${{exemplos}})` : ''));
+                    document.getElementById('invalidos').classList.remove('hidden');
+                }}
+            }}
+            
+            const integridade = resumo.integridade;
+            if (integridade && integridade.verificado) {{
+                const quebras = [];
+                if (integridade.lacunas) quebras.push(`${{integridade.lacunas}} lacunas`);
+                if (integridade.duplicadas) quebras.push(`${{integridade.duplicadas}} linhas duplicadas`);
+                if (integridade.descontinuidade_anterior) quebras.push(`diferença de R$ ${{integridade.descontinuidade_anterior.diferenca}} em relação ao extrato anterior`);
+                preencher('integridade-texto', integridade.consistente ? '✅ Consistente' : `⚠️ ${{quebras.join(', ')}}`);
+                document.getElementById('integridade').classList.remove('hidden');
+            }}
+        }}
+        
+        function mostrarErro(job) {{
+            preencher('icone', '❌');
+            preencher('titulo', 'Erro no Processamento');
+            preencher('erro-mensagem', job.erros.join(' | '));
+            document.getElementById('erro').classList.remove('hidden');
+        }}
+        
+        async function acompanharUpload() {{
+            try {{
+                const response = await fetch(`/api/uploads/${{JOB_ID}}`);
+                if (response.ok) {{
+                    const job = await response.json();
+                    preencher('etapa', ETAPAS[job.etapa] || job.etapa);
+                    preencher('linhas-processadas', job.linhas_processadas);
+                    preencher('linhas-inseridas', job.linhas_inseridas);
+                    
+                    if (job.etapa === 'CONCLUIDO') {{
+                        mostrarResumo(job);
+                        return;
+                    }}
+                    if (job.etapa === 'ERRO') {{
+                        mostrarErro(job);
+                        return;
+                    }}
+                }}
+            }} catch (error) {{
+                console.error('Erro ao consultar upload:', error);
+            }}
+            setTimeout(acompanharUpload, 1500);
+        }}
+        
+        acompanharUpload();
+        </script>
+    </body>
+    </html>
+    """
+
 @app.post("/upload-extrato")
-async def upload_extrato(file: UploadFile = File(...), banco: str = Form(...)):
-    """Upload e processamento de extrato bancário - SALVANDO NO BANCO"""
+async def upload_extrato(request: Request, background_tasks: BackgroundTasks,
+                         file: UploadFile = File(...), banco: str = Form(...), dry_run: bool = False):
+    """
+    Upload e processamento de extrato bancário - SALVANDO NO BANCO.
+    Com ?dry_run=1 só valida o arquivo e devolve o relatório, sem gravar nada
+    """
     
     logger.info(f"Recebido upload: {file.filename} para banco {banco}")
     
-    if not file.filename.endswith(('.xlsx', '.xls', '.csv')):
+    if not file.filename.endswith(EXTENSOES_EXTRATO):
         logger.error(f"Arquivo inválido: {file.filename}")
         return HTMLResponse(
             content=f"""
             <html><body>
                 <h2>❌ Erro</h2>
-                <p>Apenas arquivos Excel (.xlsx, .xls) ou CSV (.csv) são aceitos</p>
+                <p>Apenas arquivos Excel (.xlsx, .xls), CSV ({', '.join(('.csv', *COMPRESSOES_CSV))}), OFX (.ofx) ou CNAB (.ret) são aceitos</p>
                 <a href="/">Voltar</a>
             </body></html>
             """,
             status_code=400
         )
     
-    if banco not in ['AAI', 'EDUCAÇÃO']:
+    if banco not in BANCOS_VALIDOS:
         logger.error(f"Banco inválido: {banco}")
         return HTMLResponse(
-            content=f"""
-            <html><body>
-                <h2>❌ Erro</h2>
-                <p>Banco deve ser AAI ou EDUCAÇÃO</p>
-                <a href="/">Voltar</a>
-            </body></html>
-            """,
-            status_code=400
-        )
-    
-    try:
-        logger.info("Lendo conteúdo do arquivo...")
-        content = await file.read()
-        logger.info(f"Arquivo lido: {len(content)} bytes")
-        
-        logger.info("Processando arquivo...")
-        transacoes = processar_arquivo(content, file.filename, banco)
-        logger.info(f"Processadas {len(transacoes)} transações")
-        
-        # NOVO: Verificar se Supabase está configurado
-        if not supabase:
-            logger.error("❌ Supabase não configurado")
-            raise HTTPException(status_code=500, detail="Banco de dados não configurado")
-        
-        logger.info("💾 Salvando extrato no banco...")
-        
-        # 1. Inserir extrato
-        extrato_data = {
-            'banco': banco,
-            'arquivo': file.filename,
-            'total_transacoes': len(transacoes),
-            'status': 'PROCESSADO',
-            'processado_em': datetime.now().isoformat(),
-            'processado_por': 'Sistema'  # TODO: pegar usuário logado
-        }
-        
-        extrato_result = supabase.admin_client.table("extratos").insert(extrato_data).execute()
-        
-        if not extrato_result.data:
-            logger.error("❌ Erro ao salvar extrato no banco")
-            raise HTTPException(status_code=500, detail="Erro ao salvar extrato no banco")
-        
-        extrato_id = extrato_result.data[0]['id']
-        logger.info(f"✅ Extrato salvo com ID: {extrato_id}")
-        
-        # 2. Preparar transações para o banco
-        logger.info("💾 Preparando transações para salvar...")
-        
-        transacoes_para_banco = []
-        for transacao in transacoes:
-            # Criar dados para o banco
-            transacao_banco = {
-                'extrato_id': extrato_id,
-                'banco': transacao['banco'],
-                'data': datetime.strptime(transacao['data'], "%d/%m/%Y").date().isoformat() if transacao['data'] else None,
-                'historico': transacao['historico'],
-                'documento': transacao['documento'],
-                'valor': float(transacao['valor']) if transacao['valor'] else 0,
-                'saldo': float(transacao['saldo']) if transacao['saldo'] else 0,
-                'tipo_transacao': transacao['tipo_transacao'],
-                'status': 'PENDENTE',
-                'forma_pagamento': transacao['forma_pagamento'],
-                'banco_origem': transacao['banco_origem'],
-                'contraparte': transacao['contraparte'],
-                'data_pagamento': datetime.strptime(transacao['data_pagamento'], "%d/%m/%Y").date().isoformat() if transacao['data_pagamento'] else None,
-                'created_at': datetime.now().isoformat()
-            }
-            
-            transacoes_para_banco.append(transacao_banco)
-        
-        # 3. Inserir transações em lotes (Supabase tem limite)
-        logger.info(f"💾 Salvando {len(transacoes_para_banco)} transações no banco...")
-        
-        batch_size = 100  # Inserir de 100 em 100
-        transacoes_salvas = 0
-        
-        for i in range(0, len(transacoes_para_banco), batch_size):
-            batch = transacoes_para_banco[i:i + batch_size]
-            
-            transacoes_result = supabase.admin_client.table("transacoes").insert(batch).execute()
-            
-            if transacoes_result.data:
-                transacoes_salvas += len(transacoes_result.data)
-                logger.info(f"✅ Lote {i//batch_size + 1}: {len(transacoes_result.data)} transações salvas")
-            else:
-                logger.error(f"❌ Erro ao salvar lote {i//batch_size + 1}")
-        
-        logger.info(f"✅ Total de transações salvas: {transacoes_salvas}")
-        
-        # Calcular estatísticas
-        valor_total = sum(t['valor'] for t in transacoes)
-        creditos = [t for t in transacoes if t['valor'] > 0]
-        debitos = [t for t in transacoes if t['valor'] < 0]
-        
-        logger.info(f"🎉 Extrato {banco} processado e salvo com sucesso!")
-        
-        # Retornar página de sucesso
-        html_sucesso = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <title>Upload Concluído</title>
-            <link href="https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700&display=swap" rel="stylesheet">
-            <style>
-                body {{ font-family: 'Inter', Arial, sans-serif; background: linear-gradient(135deg, #eff6ff 0%, #dbeafe 100%); min-height: 100vh; color: #111827; line-height: 1.6; padding: 1.5rem; }}
-                .container {{ max-width: 900px; margin: 0 auto; }}
-                .success-card {{ background: white; border-radius: 1.5rem; padding: 2.5rem; box-shadow: 0 20px 25px -5px rgb(0 0 0 / 0.1); text-align: center; }}
-                .success-icon {{ font-size: 4rem; display: block; margin-bottom: 1.5rem; }}
-                h1 {{ font-size: 2.5rem; font-weight: 700; color: #111827; margin-bottom: 2rem; }}
-                .success-info {{ background: #f0fdf4; border: 1px solid #dcfce7; border-radius: 1rem; padding: 1.5rem; margin-bottom: 2rem; }}
-                .success-info h3 {{ font-size: 1.25rem; font-weight: 600; color: #166534; margin-bottom: 1rem; display: flex; align-items: center; justify-content: center; gap: 0.5rem; }}
-                .success-info p {{ color: #374151; margin: 0.5rem 0; }}
-                .success-info p strong {{ font-weight: 600; color: #1f2937; }}
-                .btn {{ display: inline-flex; align-items: center; gap: 0.75rem; padding: 0.75rem 1.5rem; border: none; border-radius: 0.75rem; font-weight: 600; text-decoration: none; cursor: pointer; transition: all 0.3s ease; margin: 0.5rem; }}
-                .btn-primary {{ background: #2563eb; color: white; }}
-                .btn-primary:hover {{ background: #1d4ed8; transform: translateY(-2px); }}
-                .actions {{ display: flex; justify-content: center; flex-wrap: wrap; margin-top: 2rem; }}
-                .highlight {{ background: linear-gradient(135deg, #22c55e, #16a34a); color: white; padding: 1rem; border-radius: 1rem; margin: 1rem 0; }}
-                
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="success-card">
-                    <span class="success-icon">🎉</span>
-                    <h1>Upload Concluído com Sucesso!</h1>
-                    
-                    <div class="success-info">
-                        <h3>
-                            <span>💾</span>
-                            Extrato {banco} Salvo no Banco de Dados
-                        </h3>
-                        <p><strong>Arquivo:</strong> {file.filename}</p>
-                        <p><strong>Status:</strong> Processado e persistido com sucesso</p>
-                        <p><strong>Data/Hora:</strong> {datetime.now().strftime('%d/%m/%Y às %H:%M:%S')}</p>
-                        <p><strong>ID do Extrato:</strong> {extrato_id}</p>
-                    </div>
-                    
-                    <div class="highlight">
-                        <h3 style="margin: 0 0 1rem 0;">📊 Resumo do Processamento</h3>
-                        <p><strong>Transações Importadas:</strong> {len(transacoes)}</p>
-                        <p><strong>Transações Salvas:</strong> {transacoes_salvas}</p>
-                        <p><strong>Entradas (+):</strong> {len(creditos)} transações</p>
-                        <p><strong>Saídas (-):</strong> {len(debitos)} transações</p>
-                        <p><strong>Valor Total:</strong> R$ {valor_total:,.2f}</p>
-                    </div>
-                    
-                    <div class="actions">
-                        <a href="/pendentes" class="btn btn-primary">
-                            <span>📋</span>
-                            Ver Transações Pendentes ({transacoes_salvas})
-                        </a>
-                        <a href="/" class="btn btn-primary">
-                            <span>🏠</span>
-                            Voltar ao Início
-                        </a>
-                        <a href="/relatorios" class="btn btn-primary">
-                            <span>📊</span>
-                            Ver Relatórios
-                        </a>
-                    </div>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
+            content=f"""
+            <html><body>
+                <h2>❌ Erro</h2>
+                <p>Banco deve ser {' ou '.join(BANCOS_VALIDOS)}</p>
+                <a href="/">Voltar</a>
+            </body></html>
+            """,
+            status_code=400
+        )
+    
+    try:
+        # NOVO: Verificar se Supabase está configurado
+        if not supabase:
+            logger.error("❌ Supabase não configurado")
+            raise HTTPException(status_code=500, detail="Banco de dados não configurado")
+        
+        # Pool saturado: o cliente tenta de novo depois, sem enfileirar mais trabalho
+        if not _vagas_upload.acquire(blocking=False):
+            logger.warning(f"⏳ {UPLOADS_MAX_EM_ANDAMENTO} uploads em andamento - recusando {file.filename}")
+            return resposta_upload_saturado(request)
+        
+        # O arquivo vai para disco e o processamento segue num job em segundo plano;
+        # até o job (ou o dry run) assumir o arquivo, vaga e temporário são liberados aqui
+        caminho = None
+        try:
+            caminho, sha256 = await run_in_threadpool(salvar_upload_em_disco, file)
+            if not dry_run:
+                job = UploadJob(file.filename, banco)
+                background_tasks.add_task(executar_job_upload, job, caminho, sha256, file.filename, banco)
+        except Exception:
+            if caminho:
+                os.remove(caminho)
+            _vagas_upload.release()
+            raise
+        
+        if dry_run:
+            return await validar_upload(caminho, sha256, file.filename, banco)
+        logger.info(f"📥 Upload {file.filename} enfileirado no job {job.job_id}")
+        
+        if 'application/json' in request.headers.get('accept', ''):
+            return JSONResponse(
+                status_code=202,
+                content={'job_id': job.job_id, 'status_url': f"/api/uploads/{job.job_id}"}
+            )
         
-        return HTMLResponse(content=html_sucesso)
+        return HTMLResponse(content=pagina_progresso_upload(job.job_id, file.filename, banco), status_code=202)
         
     except Exception as e:
         logger.error(f"ERRO CRÍTICO ao processar extrato {banco}: {str(e)}")
@@ -1677,25 +2247,225 @@ async def upload_extrato(file: UploadFile = File(...), banco: str = Form(...)):
         return HTMLResponse(content=html_erro, status_code=400)
 
 
+@app.post("/upload-extratos")
+async def upload_extratos_lote(background_tasks: BackgroundTasks,
+                               files: List[UploadFile] = File(...), bancos: List[str] = Form(...)):
+    """
+    Upload de vários extratos (ou de um .zip) de uma vez. `bancos` traz o banco
+    de cada arquivo, na mesma ordem, ou um único banco para todos. Os arquivos são
+    importados em paralelo; o resumo consolidado fica em /api/uploads/lotes/{lote_id}
+    """
+    logger.info(f"Recebido lote com {len(files)} arquivo(s) para {bancos}")
+    
+    if not supabase:
+        logger.error("❌ Supabase não configurado")
+        raise HTTPException(status_code=500, detail="Banco de dados não configurado")
+    
+    if len(bancos) == 1:
+        bancos = bancos * len(files)
+    if len(bancos) != len(files):
+        raise HTTPException(status_code=400, detail="Informe um banco por arquivo ou um único banco para o lote")
+    if len(files) > LOTE_MAX_ARQUIVOS:
+        raise HTTPException(status_code=400, detail=f"Máximo de {LOTE_MAX_ARQUIVOS} arquivos por lote")
+    
+    for file, banco in zip(files, bancos):
+        if not file.filename.endswith((*EXTENSOES_EXTRATO, '.zip')):
+            raise HTTPException(status_code=400, detail=f"Formato não suportado: {file.filename}")
+        if banco not in BANCOS_VALIDOS:
+            raise HTTPException(status_code=400, detail=f"Banco deve ser {' ou '.join(BANCOS_VALIDOS)} ({file.filename})")
+    
+    # Lote aceito só com vaga livre; no processamento cada arquivo ocupa a sua (executar_lote_upload)
+    if not _vagas_upload.acquire(blocking=False):
+        logger.warning(f"⏳ {UPLOADS_MAX_EM_ANDAMENTO} uploads em andamento - recusando lote")
+        raise HTTPException(
+            status_code=503,
+            detail="Muitos extratos em processamento no momento. Tente novamente em instantes.",
+            headers={'Retry-After': str(UPLOAD_RETRY_AFTER_SEGUNDOS)}
+        )
+    
+    arquivos = []
+    try:
+        for file, banco in zip(files, bancos):
+            caminho, sha256 = await run_in_threadpool(salvar_upload_em_disco, file)
+            if file.filename.endswith('.zip'):
+                arquivos.extend(await run_in_threadpool(extrair_zip_extratos, caminho, banco))
+            else:
+                arquivos.append((caminho, sha256, file.filename, banco))
+        
+        if not arquivos:
+            raise HTTPException(status_code=400, detail="Nenhum extrato encontrado no lote")
+        if len(arquivos) > LOTE_MAX_ARQUIVOS:
+            raise HTTPException(status_code=400, detail=f"Máximo de {LOTE_MAX_ARQUIVOS} arquivos por lote")
+        
+        itens = [(UploadJob(nome, banco), caminho, sha256, nome, banco) for caminho, sha256, nome, banco in arquivos]
+        lote = UploadLote([job for job, *_ in itens])
+        background_tasks.add_task(executar_lote_upload, itens)
+    except Exception as e:
+        # Até o lote ser enfileirado, arquivos e vaga são deste request
+        for caminho, *_ in arquivos:
+            os.remove(caminho)
+        _vagas_upload.release()
+        if isinstance(e, zipfile.BadZipFile):
+            raise HTTPException(status_code=400, detail=f"Arquivo zip inválido: {e}")
+        raise
+    
+    logger.info(f"📥 Lote {lote.lote_id} com {len(itens)} arquivo(s) enfileirado")
+    
+    return JSONResponse(
+        status_code=202,
+        content={
+            'lote_id': lote.lote_id,
+            'status_url': f"/api/uploads/lotes/{lote.lote_id}",
+            'arquivos': [
+                {'arquivo': nome, 'banco': banco, 'job_id': job.job_id, 'status_url': f"/api/uploads/{job.job_id}"}
+                for job, _, _, nome, banco in itens
+            ]
+        }
+    )
+
+
+@app.get("/api/uploads/lotes/{lote_id}")
+async def status_upload_lote(lote_id: str):
+    """Progresso do lote: resumo consolidado e o estado de cada arquivo"""
+    lote = UploadLote.obter(lote_id)
+    
+    if not lote:
+        raise HTTPException(status_code=404, detail="Lote não encontrado")
+    
+    return lote
+
+
+@app.get("/api/extratos/{extrato_id}/integridade")
+async def integridade_extrato(extrato_id: str):
+    """Continuidade do saldo verificada na importação do extrato"""
+    if not supabase:
+        logger.error("❌ Supabase não configurado")
+        raise HTTPException(status_code=500, detail="Banco de dados não configurado")
+    
+    result = supabase.admin_client.table("extratos").select("id, banco, arquivo, resumo").eq(
+        "id", extrato_id
+    ).limit(1).execute()
+    
+    if not result.data:
+        raise HTTPException(status_code=404, detail="Extrato não encontrado")
+    
+    extrato = result.data[0]
+    integridade = (extrato.get('resumo') or {}).get('integridade')
+    return {
+        'extrato_id': extrato['id'],
+        'banco': extrato['banco'],
+        'arquivo': extrato['arquivo'],
+        # Extratos importados antes da verificação não têm o relatório
+        'integridade': integridade or {'verificado': False}
+    }
+
+
+@app.get("/api/uploads/{job_id}")
+async def status_upload(job_id: str):
+    """Progresso de um upload: etapa, linhas processadas/inseridas, erros e resumo final"""
+    job = UploadJob.obter(job_id)
+    
+    if not job:
+        raise HTTPException(status_code=404, detail="Upload não encontrado")
+    
+    return job
+
+
+# Colunas que a tabela de pendentes mostra (id vai no checkbox/ações, created_at desempata a ordem padrão)
+COLUNAS_PENDENTES = "id,banco,data,historico,tipo_transacao,valor,status,created_at"
+ORDENACAO_PENDENTES = ('created_at', 'data', 'valor', 'banco', 'tipo_transacao', 'historico')
+# Todos os tipo_transacao que a importação grava: os das regras e o padrão ('OUTROS')
+TIPOS_PENDENTES = tuple(dict.fromkeys(
+    [tipo for _, tipo in REGRAS_TIPO_TRANSACAO] + [FAMILIAS_CLASSIFICACAO['tipo_transacao'][1]]
+))
+TAMANHO_PAGINA_PENDENTES = 50
+TAMANHO_MAXIMO_PENDENTES = 200
+
+def buscar_pagina_pendentes(pagina: int, tamanho: int, ordenar: str, direcao: str,
+                            banco: Optional[str] = None, tipo: Optional[str] = None, busca: Optional[str] = None,
+                            data_inicio: Optional[date] = None, data_fim: Optional[date] = None) -> Tuple[List[dict], int]:
+    """
+    Página de transações pendentes já filtrada e ordenada no banco, só com as
+    colunas da tabela. O total vem da contagem exata do PostgREST (count=exact)
+    na mesma requisição. Retorna (linhas, total)
+    """
+    query = supabase.admin_client.table("transacoes").select(COLUNAS_PENDENTES, count="exact").eq("status", "PENDENTE")
+    if banco:
+        query = query.eq("banco", banco)
+    if tipo:
+        query = query.eq("tipo_transacao", tipo)
+    if busca:
+        query = query.ilike("historico", f"%{busca}%")
+    if data_inicio:
+        query = query.gte("data", data_inicio.isoformat())
+    if data_fim:
+        query = query.lte("data", data_fim.isoformat())
+    
+    inicio = (pagina - 1) * tamanho
+    # id desempata a ordem, para a mesma linha não aparecer em duas páginas; range() do cliente é [início, fim)
+    result = query.order(f"{ordenar}.{direcao},id", desc=direcao == 'desc').range(inicio, inicio + tamanho).execute()
+    return result.data, result.count if result.count is not None else len(result.data)
+
 @app.get("/pendentes")
-async def listar_pendentes():
-    """Listar transações pendentes do Supabase"""
+async def listar_pendentes(pagina: int = 1, tamanho: int = TAMANHO_PAGINA_PENDENTES,
+                           ordenar: str = 'created_at', direcao: str = 'desc',
+                           banco: Optional[str] = None, tipo: Optional[str] = None, busca: Optional[str] = None,
+                           data_inicio: Optional[date] = None, data_fim: Optional[date] = None):
+    """Listar transações pendentes do Supabase, paginadas e filtradas no servidor"""
+    # Parâmetros fora do esperado voltam ao padrão em vez de quebrar a página
+    pagina = max(pagina, 1)
+    tamanho = min(max(tamanho, 1), TAMANHO_MAXIMO_PENDENTES)
+    ordenar = ordenar if ordenar in ORDENACAO_PENDENTES else 'created_at'
+    direcao = direcao if direcao in ('asc', 'desc') else 'desc'
+    banco = banco if banco in BANCOS_VALIDOS else None
+    tipo = tipo or None
+    busca = (busca or '').strip() or None
+    
     try:
         if not supabase:
-            pendentes = []
+            pendentes, total_pendentes = [], 0
         else:
-            # Buscar transações pendentes do Supabase
-            result = supabase.admin_client.table("transacoes").select("*").eq("status", "PENDENTE").order("created_at", desc=True).execute()
-            pendentes = result.data
+            pendentes, total_pendentes = buscar_pagina_pendentes(
+                pagina, tamanho, ordenar, direcao, banco, tipo, busca, data_inicio, data_fim
+            )
         
-        total_pendentes = len(pendentes)
-        logger.info(f"📋 Carregando {total_pendentes} transações pendentes do Supabase")
+        logger.info(f"📋 Carregando página {pagina} ({len(pendentes)} de {total_pendentes}) das transações pendentes do Supabase")
         
     except Exception as e:
         logger.error(f"❌ Erro ao buscar pendentes: {str(e)}")
         pendentes = []
         total_pendentes = 0
     
+    total_paginas = max((total_pendentes + tamanho - 1) // tamanho, 1)
+    filtros_ativos = any((banco, tipo, busca, data_inicio, data_fim))
+    parametros = {
+        'tamanho': tamanho, 'ordenar': ordenar, 'direcao': direcao, 'banco': banco, 'tipo': tipo,
+        'busca': busca, 'data_inicio': data_inicio, 'data_fim': data_fim
+    }
+    parametros = {chave: valor for chave, valor in parametros.items() if valor}
+    
+    def url_pagina(numero: int) -> str:
+        return escape(f"/pendentes?{urlencode({**parametros, 'pagina': numero})}")
+    
+    opcoes_banco = ''.join(
+        f'<option value="{b}"{" selected" if b == banco else ""}>{b}</option>' for b in BANCOS_VALIDOS
+    )
+    opcoes_tipo = ''.join(
+        f'<option value="{t}"{" selected" if t == tipo else ""}>{t}</option>' for t in TIPOS_PENDENTES
+    )
+    opcoes_ordem = ''.join(
+        f'<option value="{valor}"{" selected" if valor == f"{ordenar}:{direcao}" else ""}>{rotulo}</option>'
+        for valor, rotulo in (('created_at:desc', 'Mais recentes'), ('created_at:asc', 'Mais antigas'),
+                              ('data:desc', 'Data (recente primeiro)'), ('data:asc', 'Data (antiga primeiro)'),
+                              ('valor:desc', 'Maior valor'), ('valor:asc', 'Menor valor'),
+                              ('banco:asc', 'Banco'), ('historico:asc', 'Histórico'))
+    )
+    opcoes_tamanho = ''.join(
+        f'<option value="{n}"{" selected" if n == tamanho else ""}>{n}</option>' for n in (25, 50, 100, 200)
+    )
+    primeira_linha = (pagina - 1) * tamanho + 1 if pendentes else 0
+    ultima_linha = (pagina - 1) * tamanho + len(pendentes)
+    
     # Criar HTML com design moderno (mantendo o visual original)
     html_content = f"""
     <!DOCTYPE html>
@@ -1845,6 +2615,27 @@ async def listar_pendentes():
                 color: var(--gray-700);
             }}
             
+            /* Paginação */
+            .paginacao {{
+                display: flex;
+                justify-content: space-between;
+                align-items: center;
+                gap: var(--space-4);
+                padding: var(--space-4) var(--space-6);
+                font-size: 0.875rem;
+                color: var(--gray-600);
+            }}
+            
+            .paginacao-links {{
+                display: flex;
+                gap: var(--space-2);
+            }}
+            
+            .paginacao-links .desabilitado {{
+                opacity: 0.5;
+                pointer-events: none;
+            }}
+            
             /* Table Container - MANTENDO ESTILO ORIGINAL */
             .table-container {{
                 background: white;
@@ -2333,7 +3124,7 @@ async def listar_pendentes():
                         <span>📋</span>
                         Conciliações Pendentes
                     </h1>
-                    <p>Total de {total_pendentes} transações aguardando conciliação</p>
+                    <p>Total de {total_pendentes} transações {'encontradas com os filtros' if filtros_ativos else 'aguardando conciliação'}</p>
                 </div>
                 <a href="/" class="btn btn-primary">
                     <span>🏠</span>
@@ -2347,8 +3138,7 @@ async def listar_pendentes():
                     <label for="filtro-banco">Banco</label>
                     <select id="filtro-banco" onchange="filtrarTabela()">
                         <option value="">Todos os Bancos</option>
-                        <option value="AAI">AAI</option>
-                        <option value="EDUCAÇÃO">EDUCAÇÃO</option>
+                        {opcoes_banco}
                     </select>
                 </div>
                 
@@ -2356,17 +3146,37 @@ async def listar_pendentes():
                     <label for="filtro-tipo">Tipo</label>
                     <select id="filtro-tipo" onchange="filtrarTabela()">
                         <option value="">Todos os Tipos</option>
-                        <option value="PIX">PIX</option>
-                        <option value="TED">TED</option>
-                        <option value="PAGAMENTO">PAGAMENTO</option>
-                        <option value="TARIFA">TARIFA</option>
-                        <option value="DÉBITO">DÉBITO</option>
+                        {opcoes_tipo}
                     </select>
                 </div>
                 
                 <div class="filter-group">
                     <label for="filtro-busca">Buscar</label>
-                    <input type="text" id="filtro-busca" placeholder="Buscar no histórico..." onkeyup="filtrarTabela()">
+                    <input type="text" id="filtro-busca" placeholder="Buscar no histórico..." value="{escape(busca or '')}" onchange="filtrarTabela()">
+                </div>
+                
+                <div class="filter-group">
+                    <label for="filtro-data-inicio">De</label>
+                    <input type="date" id="filtro-data-inicio" value="{data_inicio or ''}" onchange="filtrarTabela()">
+                </div>
+                
+                <div class="filter-group">
+                    <label for="filtro-data-fim">Até</label>
+                    <input type="date" id="filtro-data-fim" value="{data_fim or ''}" onchange="filtrarTabela()">
+                </div>
+                
+                <div class="filter-group">
+                    <label for="filtro-ordem">Ordenar por</label>
+                    <select id="filtro-ordem" onchange="filtrarTabela()">
+                        {opcoes_ordem}
+                    </select>
+                </div>
+                
+                <div class="filter-group">
+                    <label for="filtro-tamanho">Por página</label>
+                    <select id="filtro-tamanho" onchange="filtrarTabela()">
+                        {opcoes_tamanho}
+                    </select>
                 </div>
                 
                 <div class="filter-group">
@@ -2396,7 +3206,21 @@ async def listar_pendentes():
                     <tbody>"""
 
     # ADICIONANDO TRANSAÇÕES DO SUPABASE NO HTML
-    if not pendentes:
+    if not pendentes and filtros_ativos:
+        html_content += """
+                        <tr>
+                            <td colspan="8" style="text-align: center; padding: var(--space-8); color: var(--gray-600);">
+                                <div style="display: flex; flex-direction: column; align-items: center; gap: 1rem;">
+                                    <span style="font-size: 3rem;">🔍</span>
+                                    <div>
+                                        <h3 style="color: var(--gray-800); margin-bottom: 0.5rem;">Nenhuma transação pendente com esses filtros</h3>
+                                        <p>Altere ou limpe os filtros para ver as demais transações.</p>
+                                    </div>
+                                    <a href="/pendentes" class="btn btn-primary">🧹 Limpar filtros</a>
+                                </div>
+                            </td>
+                        </tr>"""
+    elif not pendentes:
         html_content += """
                         <tr>
                             <td colspan="8" style="text-align: center; padding: var(--space-8); color: var(--gray-600);">
@@ -2445,12 +3269,23 @@ async def listar_pendentes():
                             </td>
                         </tr>"""
 
-    html_content += """
+    html_content += f"""
                     </tbody>
                 </table>
+                <nav class="paginacao">
+                    <span>Mostrando {primeira_linha}–{ultima_linha} de {total_pendentes} · Página {pagina} de {total_paginas}</span>
+                    <div class="paginacao-links">
+                        <a href="{url_pagina(1)}" class="btn btn-primary{' desabilitado' if pagina <= 1 else ''}">⏮️</a>
+                        <a href="{url_pagina(max(pagina - 1, 1))}" class="btn btn-primary{' desabilitado' if pagina <= 1 else ''}">◀️ Anterior</a>
+                        <a href="{url_pagina(min(pagina + 1, total_paginas))}" class="btn btn-primary{' desabilitado' if pagina >= total_paginas else ''}">Próxima ▶️</a>
+                        <a href="{url_pagina(total_paginas)}" class="btn btn-primary{' desabilitado' if pagina >= total_paginas else ''}">⏭️</a>
+                    </div>
+                </nav>
             </section>
         </div>
-        
+        """
+    
+    html_content += """
        <!-- Modal de Conciliação - MANTENDO ORIGINAL -->
        <div id="modal-conciliacao" class="modal">
            <div class="modal-content">
@@ -2535,8 +3370,7 @@ async def listar_pendentes():
                            <div class="form-group">
                                <label>Banco <small style="color: var(--gray-500);">(Automático)</small></label>
                                <select id="banco-origem" class="auto-filled" disabled>
-                                   <option value="AAI">AAI</option>
-                                   <option value="EDUCAÇÃO">EDUCAÇÃO</option>
+                                   """ + ''.join(f'<option value="{banco}">{banco}</option>' for banco in BANCOS_VALIDOS) + """
                                </select>
                            </div>
                        </div>
@@ -2676,23 +3510,24 @@ function detectarContraparte(historico) {
 }
 
 function filtrarTabela() {
-    const banco = document.getElementById('filtro-banco').value;
-    const tipo = document.getElementById('filtro-tipo').value;
-    const busca = document.getElementById('filtro-busca').value.toLowerCase();
-    
-    const linhas = document.querySelectorAll('#tabela-pendentes tbody tr');
+    // Filtros, ordem e paginação são aplicados no servidor: recarrega na página 1 com os novos parâmetros
+    const [ordenar, direcao] = document.getElementById('filtro-ordem').value.split(':');
+    const filtros = {
+        banco: document.getElementById('filtro-banco').value,
+        tipo: document.getElementById('filtro-tipo').value,
+        busca: document.getElementById('filtro-busca').value.trim(),
+        data_inicio: document.getElementById('filtro-data-inicio').value,
+        data_fim: document.getElementById('filtro-data-fim').value,
+        ordenar: ordenar,
+        direcao: direcao,
+        tamanho: document.getElementById('filtro-tamanho').value
+    };
     
-    linhas.forEach(linha => {
-        const bancoDaLinha = linha.getAttribute('data-banco');
-        const tipoDaLinha = linha.getAttribute('data-tipo');
-        const historicoDaLinha = linha.getAttribute('data-historico');
-        
-        const mostraBanco = !banco || bancoDaLinha === banco;
-        const mostraTipo = !tipo || tipoDaLinha === tipo;
-        const mostraBusca = !busca || historicoDaLinha.includes(busca);
-        
-        linha.style.display = (mostraBanco && mostraTipo && mostraBusca) ? '' : 'none';
+    const params = new URLSearchParams();
+    Object.entries(filtros).forEach(([chave, valor]) => {
+        if (valor) params.set(chave, valor);
     });
+    window.location.search = params.toString();
 }
 
 function selecionarTodos() {
@@ -2743,14 +3578,14 @@ function popularDropdown(classificacoes) {
 
 async function buscarDadosTransacao(transacaoId) {
     try {
-        const response = await fetch('/api/transacoes');
-        const data = await response.json();
-        const transacao = data.transacoes.find(t => t.id === transacaoId);
-        if (transacao) {
-            preencherModal(transacao);
+        const response = await fetch('/api/transacoes/' + encodeURIComponent(transacaoId));
+        if (!response.ok) {
+            throw new Error(response.status === 404 ? 'transação não encontrada' : 'Erro HTTP ' + response.status);
         }
+        preencherModal(await response.json());
     } catch (error) {
         console.error('Erro ao buscar transação:', error);
+        alert('Erro ao carregar os dados da transação: ' + error.message);
     }
 }
 
@@ -3077,52 +3912,105 @@ document.head.appendChild(style);
     
     return HTMLResponse(content=html_content)
 
+# Colunas que a tabela de conciliados mostra (nomes da hierarquia vêm do cache de lookups pelos ids)
+COLUNAS_CONCILIADOS = (
+    "id,banco,data,historico,valor,classificacao_id,plano_contas_id,item_id,"
+    "forma_pagamento,centro_custo,nome_recebedor,data_referencia,conciliado_em"
+)
+TAMANHO_PAGINA_CONCILIADOS = 50
+TAMANHO_MAXIMO_CONCILIADOS = 200
+
+# Campo com o nome resolvido -> (coluna do id na transação, busca no cache, tabela de origem)
+HIERARQUIA_CONCILIADOS = {
+    'classificacao_nome': ('classificacao_id', cache.get_classificacao_by_id, 'classificacoes'),
+    'plano_contas_nome': ('plano_contas_id', cache.get_plano_by_id, 'planos_contas'),
+    'item_nome': ('item_id', cache.get_item_by_id, 'itens'),
+}
+
+def resolver_nomes_hierarquia(transacoes: List[dict]):
+    """
+    Preenche classificacao_nome, plano_contas_nome e item_nome pelo cache de
+    lookups. Ids fora do cache (ex.: registros desativados depois da conciliação)
+    são buscados numa única consulta por tabela
+    """
+    for campo, (coluna, buscar_no_cache, tabela) in HIERARQUIA_CONCILIADOS.items():
+        faltando = set()
+        for transacao in transacoes:
+            registro = buscar_no_cache(transacao[coluna]) if transacao.get(coluna) else None
+            transacao[campo] = registro['nome'] if registro else '-'
+            if transacao.get(coluna) and not registro:
+                faltando.add(transacao[coluna])
+        
+        if faltando:
+            result = supabase.admin_client.table(tabela).select("id, nome").in_("id", list(faltando)).execute()
+            nomes = {str(registro['id']): registro['nome'] for registro in result.data}
+            for transacao in transacoes:
+                if transacao.get(coluna) in faltando:
+                    transacao[campo] = nomes.get(str(transacao[coluna]), '-')
+
+def buscar_pagina_conciliados(tamanho: int, cursor: Optional[str] = None, banco: Optional[str] = None,
+                              data_inicio: Optional[date] = None,
+                              data_fim: Optional[date] = None) -> Tuple[List[dict], int, int, Optional[str]]:
+    """
+    Página de transações conciliadas em ordem (conciliado_em, id) decrescente,
+    continuando do cursor, só com as colunas da tabela.
+    Retorna (linhas, total, offset, next_cursor)
+    """
+    def consulta(contar: bool):
+        query = supabase.admin_client.table("transacoes").select(
+            COLUNAS_CONCILIADOS, count="estimated" if contar else None
+        ).eq("status", "CONCILIADO").not_.is_("conciliado_em", "null")
+        if banco:
+            query = query.eq("banco", banco)
+        if data_inicio:
+            query = query.gte("data", data_inicio.isoformat())
+        if data_fim:
+            query = query.lte("data", data_fim.isoformat())
+        return query
+    
+    return buscar_pagina_keyset(consulta, 'conciliado_em', tamanho, cursor)
+
 @app.get("/conciliados")
-def listar_conciliados():
-    """Listar transações já conciliadas do Supabase"""
+async def listar_conciliados(tamanho: int = TAMANHO_PAGINA_CONCILIADOS, cursor: Optional[str] = None,
+                             banco: Optional[str] = None, data_inicio: Optional[date] = None,
+                             data_fim: Optional[date] = None):
+    """Listar transações já conciliadas do Supabase, paginadas por cursor (conciliado_em, id)"""
+    tamanho = min(max(tamanho, 1), TAMANHO_MAXIMO_CONCILIADOS)
+    banco = banco if banco in BANCOS_VALIDOS else None
+    total_conciliados, offset, next_cursor = 0, 0, None
+    
     try:
         if not supabase:
             conciliados = []
         else:
-            # Buscar transações conciliadas do Supabase
-            result = supabase.admin_client.table("transacoes").select(
-            "*,classificacao:classificacao_id(*),plano_contas:plano_contas_id(*),item:item_id(*)"
-            ).eq("status", "CONCILIADO").order("conciliado_em", desc=True).execute()
-            
-            print("🔍 DEBUG - Resultado da query:")
-            if result.data:
-                print(f"Total de transações: {len(result.data)}")
-                primeira_transacao = result.data[0]
-                print(f"Primeira transação: {primeira_transacao}")
-                print(f"Classificacao field: {primeira_transacao.get('classificacao')}")
-                print(f"Plano_contas field: {primeira_transacao.get('plano_contas')}")
-                print(f"Item field: {primeira_transacao.get('item')}")
+            # Garante que lookups estejam em cache
+            if not cache.get_all_lookups():
+                await carregar_lookups_cache()
             
-            conciliados = []
-            for transacao in result.data:
-            # Extrair nomes das tabelas relacionadas
-                if transacao.get('classificacao') and transacao['classificacao']:
-                    transacao['classificacao_nome'] = transacao['classificacao']['nome']
-                else:
-                    transacao['classificacao_nome'] = '-'
-                
-                if transacao.get('plano_contas') and transacao['plano_contas']:
-                    transacao['plano_contas_nome'] = transacao['plano_contas']['nome']
-                else:
-                    transacao['plano_contas_nome'] = '-'
-                
-                if transacao.get('item') and transacao['item']:
-                    transacao['item_nome'] = transacao['item']['nome']
-                else:
-                    transacao['item_nome'] = '-'
-            
-                conciliados.append(transacao)
+            conciliados, total_conciliados, offset, next_cursor = buscar_pagina_conciliados(
+                tamanho, cursor, banco, data_inicio, data_fim
+            )
+            resolver_nomes_hierarquia(conciliados)
+            logger.info(f"✅ Carregadas {len(conciliados)} de {total_conciliados} transações conciliadas (a partir da {offset + 1}ª)")
     
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"❌ Erro ao buscar conciliados: {str(e)}")
         conciliados = []
     
-    total_conciliados = len(conciliados)
+    filtros = {'tamanho': tamanho, 'banco': banco, 'data_inicio': data_inicio, 'data_fim': data_fim}
+    filtros = {chave: valor for chave, valor in filtros.items() if valor}
+    url_primeira = escape(f"/conciliados?{urlencode(filtros)}")
+    url_proxima = escape(f"/conciliados?{urlencode({**filtros, 'cursor': next_cursor})}") if next_cursor else ''
+    opcoes_banco = ''.join(
+        f'<option value="{b}"{" selected" if b == banco else ""}>{b}</option>' for b in BANCOS_VALIDOS
+    )
+    opcoes_tamanho = ''.join(
+        f'<option value="{n}"{" selected" if n == tamanho else ""}>{n}</option>' for n in (25, 50, 100, 200)
+    )
+    primeira_linha = offset + 1 if conciliados else 0
+    ultima_linha = offset + len(conciliados)
     
     html_content = f"""
     <!DOCTYPE html>
@@ -3261,6 +4149,47 @@ def listar_conciliados():
                 font-weight: 500;
             }}
             
+            /* Filtros e paginação */
+            .filters {{
+                background: white;
+                border-radius: var(--radius-xl);
+                padding: var(--space-6);
+                margin-bottom: var(--space-6);
+                box-shadow: var(--shadow-md);
+                border: 1px solid var(--gray-200);
+                display: flex;
+                gap: var(--space-4);
+                flex-wrap: wrap;
+                align-items: flex-end;
+            }}
+            
+            .filter-group {{
+                display: flex;
+                flex-direction: column;
+                gap: var(--space-2);
+            }}
+            
+            .filter-group label {{
+                font-size: 0.875rem;
+                font-weight: 600;
+                color: var(--gray-700);
+            }}
+            
+            .paginacao {{
+                display: flex;
+                justify-content: space-between;
+                align-items: center;
+                gap: var(--space-4);
+                padding: var(--space-4) var(--space-6);
+                font-size: 0.875rem;
+                color: var(--gray-600);
+            }}
+            
+            .paginacao-links {{
+                display: flex;
+                gap: var(--space-2);
+            }}
+            
             /* Table Container - MANTENDO ESTILO ORIGINAL */
             .table-container {{
                 background: white;
@@ -3481,19 +4410,51 @@ def listar_conciliados():
                     </div>
                     <div class="stat-item">
                         <span class="stat-number">R$ {sum(float(t.get('valor', 0)) for t in conciliados):,.2f}</span>
-                        <span class="stat-label">Valor Total Processado</span>
+                        <span class="stat-label">Valor Processado (nesta página)</span>
                     </div>
                     <div class="stat-item">
                         <span class="stat-number">{len([t for t in conciliados if float(t.get('valor', 0)) > 0])}</span>
-                        <span class="stat-label">Entradas (+)</span>
+                        <span class="stat-label">Entradas (+) nesta página</span>
                     </div>
                     <div class="stat-item">
                         <span class="stat-number">{len([t for t in conciliados if float(t.get('valor', 0)) < 0])}</span>
-                        <span class="stat-label">Saídas (-)</span>
+                        <span class="stat-label">Saídas (-) nesta página</span>
                     </div>
                 </div>
             </section>
             
+            <!-- Filters -->
+            <form class="filters" method="get" action="/conciliados">
+                <div class="filter-group">
+                    <label for="filtro-banco">Banco</label>
+                    <select id="filtro-banco" name="banco">
+                        <option value="">Todos os Bancos</option>
+                        {opcoes_banco}
+                    </select>
+                </div>
+                
+                <div class="filter-group">
+                    <label for="filtro-data-inicio">De</label>
+                    <input type="date" id="filtro-data-inicio" name="data_inicio" value="{data_inicio or ''}">
+                </div>
+                
+                <div class="filter-group">
+                    <label for="filtro-data-fim">Até</label>
+                    <input type="date" id="filtro-data-fim" name="data_fim" value="{data_fim or ''}">
+                </div>
+                
+                <div class="filter-group">
+                    <label for="filtro-tamanho">Por página</label>
+                    <select id="filtro-tamanho" name="tamanho">
+                        {opcoes_tamanho}
+                    </select>
+                </div>
+                
+                <div class="filter-group">
+                    <button type="submit" class="btn btn-primary">🔍 Filtrar</button>
+                </div>
+            </form>
+            
             <!-- Table -->
             <section class="table-container">
                 <table>
@@ -3517,14 +4478,14 @@ def listar_conciliados():
                     <tbody>"""
 
     if not conciliados:
-        html_content += """
+        html_content += f"""
                         <tr>
                             <td colspan="13" style="text-align: center; padding: var(--space-8); color: var(--gray-600);">
                                 <div style="display: flex; flex-direction: column; align-items: center; gap: 1rem;">
                                     <span style="font-size: 3rem;">✅</span>
                                     <div>
                                         <h3 style="color: var(--gray-800); margin-bottom: 0.5rem;">Nenhuma transação conciliada</h3>
-                                        <p>Ainda não há transações conciliadas no sistema.</p>
+                                        <p>{'Nenhuma transação conciliada com esses filtros.' if banco or data_inicio or data_fim else 'Ainda não há transações conciliadas no sistema.'}</p>
                                     </div>
                                     <a href="/pendentes" class="btn btn-primary">📋 Ver Pendentes</a>
                                 </div>
@@ -3579,11 +4540,21 @@ def listar_conciliados():
                             <td style="white-space: nowrap;">{data_conciliacao}</td>
                         </tr>"""
 
-    html_content += """
+    html_content += f"""
                     </tbody>
                 </table>
+                <nav class="paginacao">
+                    <span>Mostrando {primeira_linha}–{ultima_linha} de {total_conciliados}</span>
+                    <div class="paginacao-links">
+                        {f'<a href="{url_primeira}" class="btn btn-primary">⏮️ Primeira página</a>' if cursor else ''}
+                        {f'<a href="{url_proxima}" class="btn btn-primary">Próxima ▶️</a>' if next_cursor else ''}
+                    </div>
+                </nav>
             </section>
         </div>
+        """
+    
+    html_content += """
 
         <script>
         // === SISTEMA DE AUTENTICAÇÃO ===
@@ -3686,62 +4657,195 @@ async def debug_info():
     except Exception as e:
         return {'error': str(e)}
 
-import json
+STATS_VAZIAS = {
+    'total_transacoes': 0,
+    'pendentes': 0,
+    'conciliados': 0,
+    'valor_total': 0,
+    'por_banco': {}
+}
+
+def montar_stats(grupos: List[dict]) -> Dict[str, Any]:
+    """
+    Estatísticas de /api/stats a partir dos totais por (banco, status): cada
+    grupo tem banco, status, quantidade e valor_total
+    """
+    stats = {**STATS_VAZIAS, 'por_banco': {}}
+    for grupo in grupos:
+        quantidade, valor = int(grupo['quantidade'] or 0), float(grupo['valor_total'] or 0)
+        stats['total_transacoes'] += quantidade
+        stats['valor_total'] += valor
+        if grupo['status'] == 'PENDENTE':
+            stats['pendentes'] += quantidade
+        elif grupo['status'] == 'CONCILIADO':
+            stats['conciliados'] += quantidade
+        
+        por_status = stats['por_banco'].setdefault(grupo['banco'] or '-', {})
+        atual = por_status.setdefault(grupo['status'] or '-', {'quantidade': 0, 'valor_total': 0.0})
+        atual['quantidade'] += quantidade
+        atual['valor_total'] = round(atual['valor_total'] + valor, 2)
+    
+    stats['valor_total'] = round(stats['valor_total'], 2)
+    return stats
 
 @app.get("/api/stats")
 async def get_stats():
-    cached_stats = cache.get('main_stats', 'stats')
-    if cached_stats:
-        logger.info("Stats do cache")
-        cached_stats = json.loads(cached_stats)  # 🔥 garante que seja dict
-        return cached_stats
+    """
+    Obter estatísticas das transações pelos contadores por (banco, status),
+    mantidos a cada upload e conciliação. O Supabase (view
+    transacoes_estatisticas) só é lido se os contadores ainda não existem
+    """
+    grupos = cache.get_contadores()
+    if grupos is not None:
+        return montar_stats(grupos)
     
-    """Obter estatísticas do banco de dados Supabase"""
     try:
         if not supabase:
-            return {
-                'total_transacoes': 0,
-                'pendentes': 0,
-                'conciliados': 0,
-                'valor_total': 0
-            }
+            return montar_stats([])
         
         logger.info("📊 Calculando estatísticas do Supabase...")
-        
-        all_transacoes = supabase.admin_client.table("transacoes").select("status, valor").execute()
-        
-        total_transacoes = len(all_transacoes.data)
-        pendentes = len([t for t in all_transacoes.data if t.get('status') == 'PENDENTE'])
-        conciliados = len([t for t in all_transacoes.data if t.get('status') == 'CONCILIADO'])
-        valor_total = sum(float(t.get('valor') or 0) for t in all_transacoes.data)
-        
-        stats_data = {
-            'total_transacoes': total_transacoes,
-            'pendentes': pendentes,
-            'conciliados': conciliados,
-            'valor_total': valor_total
-        }
-
-        cache.set('main_stats', json.dumps(stats_data), 'stats')  # 🔥 salva como string JSON
-        return stats_data
+        grupos = await asyncio.to_thread(reconciliar_contadores_transacoes)
+        return montar_stats(grupos or [])
         
     except Exception as e:
         logger.error(f"❌ Erro ao calcular stats: {str(e)}")
-        return {
-            'total_transacoes': 0,
-            'pendentes': 0,
-            'conciliados': 0,
-            'valor_total': 0
-        }
+        return montar_stats([])
+
 
 
+def codificar_cursor(cursor: Dict[str, Any]) -> str:
+    """Cursor opaco da paginação (base64 do JSON), devolvido como next_cursor"""
+    return base64.urlsafe_b64encode(json.dumps(cursor).encode('utf-8')).decode('ascii')
+
+def decodificar_cursor(cursor: str, coluna: str = 'created_at') -> Dict[str, Any]:
+    """Cursor recebido do cliente (ordenado por `coluna`, id); 400 se não for um next_cursor válido"""
+    try:
+        dados = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        # Mesmos tipos do cursor gerado por buscar_pagina_keyset (bool é int para o isinstance)
+        tipos = {coluna: str, 'id': (str, int), 'total': int, 'offset': int}
+        if not isinstance(dados, dict) or not all(
+            isinstance(dados.get(campo), tipo) and not isinstance(dados[campo], bool) for campo, tipo in tipos.items()
+        ) or dados['offset'] < 0:
+            raise ValueError(cursor)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    return dados
+
+def buscar_pagina_keyset(consulta: Callable[[bool], Any], coluna: str, limite: int,
+                         cursor: Optional[str]) -> Tuple[List[dict], int, int, Optional[str]]:
+    """
+    Página em ordem (coluna, id) decrescente continuando do cursor (keyset): o
+    custo de cada página não depende de quantas vieram antes. `consulta(contar)`
+    devolve a consulta já filtrada, com contagem se `contar`; o total é contado
+    só na primeira página e segue dentro do cursor.
+    Retorna (linhas, total, offset, next_cursor)
+    """
+    posicao = decodificar_cursor(cursor, coluna) if cursor else None
+    linhas = []
+    
+    if posicao:
+        total, offset = posicao['total'], posicao['offset']
+        # Primeiro o restante do valor do cursor: várias linhas podem ter o mesmo (ex.: um bloco importado)
+        linhas = consulta(False).eq(coluna, posicao[coluna]).lt(
+            "id", posicao['id']
+        ).order("id", desc=True).limit(limite + 1).execute().data
+    
+    if len(linhas) <= limite:
+        query = consulta(posicao is None)
+        if posicao:
+            query = query.lt(coluna, posicao[coluna])
+        # Ordem composta num único parâmetro (coluna.desc,id.desc): o cliente não encadeia order()
+        result = query.order(f"{coluna}.desc,id", desc=True).limit(limite + 1 - len(linhas)).execute()
+        linhas += result.data
+        if posicao is None:
+            total, offset = result.count if result.count is not None else len(result.data), 0
+    
+    has_more = len(linhas) > limite
+    linhas = linhas[:limite]
+    next_cursor = None
+    if has_more:
+        ultima = linhas[-1]
+        next_cursor = codificar_cursor({
+            coluna: ultima[coluna], 'id': ultima['id'], 'total': total, 'offset': offset + len(linhas)
+        })
+    return linhas, total, offset, next_cursor
+
+def consulta_transacoes(filtro: TransacaoFilter, contar: bool = False):
+    """Consulta de transações com os filtros aplicados (sem ordem nem limite)"""
+    query = supabase.admin_client.table("transacoes").select("*", count="estimated" if contar else None)
+    
+    if filtro.status:
+        query = query.eq("status", filtro.status.value)
+    if filtro.banco:
+        query = query.eq("banco", filtro.banco.value)
+    if filtro.data_inicio:
+        query = query.gte("data", filtro.data_inicio.isoformat())
+    if filtro.data_fim:
+        query = query.lte("data", filtro.data_fim.isoformat())
+    if filtro.classificacao_id:
+        query = query.eq("classificacao_id", filtro.classificacao_id)
+    if filtro.busca:
+        query = query.ilike("historico", f"%{filtro.busca}%")
+    return query
+
+def buscar_pagina_transacoes(filtro: TransacaoFilter) -> Tuple[List[dict], int, int, Optional[str]]:
+    """
+    Página de transações em ordem (created_at, id) decrescente continuando do
+    cursor, com total estimado. Retorna (linhas, total, offset, next_cursor)
+    """
+    return buscar_pagina_keyset(
+        lambda contar: consulta_transacoes(filtro, contar), 'created_at', filtro.limite, filtro.cursor
+    )
+
+# Front-end: todas as transações seguindo o next_cursor de /api/transacoes (páginas do tamanho máximo)
+JS_BUSCAR_TODAS_TRANSACOES = """
+        async function buscarTodasTransacoes() {
+            const transacoes = [];
+            let cursor = null;
+            do {
+                const url = '/api/transacoes?limite=1000' + (cursor ? '&cursor=' + encodeURIComponent(cursor) : '');
+                const response = await fetch(url);
+                if (!response.ok) throw new Error('Erro HTTP ' + response.status);
+                const pagina = await response.json();
+                transacoes.push(...pagina.data);
+                cursor = pagina.next_cursor;
+            } while (cursor);
+            return transacoes;
+        }
+"""
+
+def resolver_lookups_transacao(row: dict, lookup_stats: Optional[Dict[str, int]] = None) -> dict:
+    """Transação com os nomes de classificação, plano de contas e item (cache-first)"""
+    transacao = dict(row)
+    lookup_stats = lookup_stats if lookup_stats is not None else {'classificacao': 0, 'plano': 0, 'item': 0}
+    
+    if transacao.get('classificacao_id'):
+        nome_classificacao = cache.get_classificacao_by_id(transacao['classificacao_id'])
+        if nome_classificacao:
+            transacao['classificacao'] = nome_classificacao['nome']
+            lookup_stats['classificacao'] += 1
+    
+    if transacao.get('plano_contas_id'):
+        nome_plano = cache.get_plano_by_id(transacao['plano_contas_id'])
+        if nome_plano:
+            transacao['plano_contas'] = nome_plano['nome'] 
+            lookup_stats['plano'] += 1
+    
+    if transacao.get('item_id'):
+        nome_item = cache.get_item_by_id(transacao['item_id'])
+        if nome_item:
+            transacao['item'] = nome_item['nome']
+            lookup_stats['item'] += 1
+    
+    return transacao
 
-@app.get("/api/transacoes")
-async def listar_transacoes(status: Optional[str] = None, banco: Optional[str] = None):
+@app.get("/api/transacoes", response_model=ListResponse)
+async def listar_transacoes(filtro: TransacaoFilter = Depends()):
     """
-    Lista transações com lookups otimizados
+    Lista transações com lookups otimizados, filtradas por TransacaoFilter e
+    paginadas por cursor: a próxima página vem de ?cursor=<next_cursor>
     """
-    logger.info(f"🔍 Consultando transações - Status: {status}, Banco: {banco}")
+    logger.info(f"🔍 Consultando transações - Filtro: {filtro.model_dump(exclude_none=True)}")
     
     try:
         # Garante que lookups estejam em cache
@@ -3749,17 +4853,7 @@ async def listar_transacoes(status: Optional[str] = None, banco: Optional[str] =
         if not lookups_cache:
             await carregar_lookups_cache()
         
-        # Buscar transações usando supabase (não supabase_pool)
-        query = supabase.admin_client.table("transacoes").select("*")
-        
-        if status:
-            query = query.eq("status", status)
-            
-        if banco:
-            query = query.eq("banco", banco)
-        
-        result = query.order("created_at", desc=True).limit(500).execute()
-        rows = result.data
+        rows, total, offset, next_cursor = buscar_pagina_transacoes(filtro)
         
         transacoes = []
         lookup_stats = {'classificacao': 0, 'plano': 0, 'item': 0}
@@ -3767,37 +4861,42 @@ async def listar_transacoes(status: Optional[str] = None, banco: Optional[str] =
         logger.info(f"📊 Encontradas {len(rows)} transações")
         
         for row in rows:
-            transacao = dict(row)
-            
             # Lookups otimizados (cache-first)
-            if transacao.get('classificacao_id'):
-                nome_classificacao = cache.get_classificacao_by_id(transacao['classificacao_id'])
-                if nome_classificacao:
-                    transacao['classificacao'] = nome_classificacao['nome']
-                    lookup_stats['classificacao'] += 1
-            
-            if transacao.get('plano_contas_id'):
-                nome_plano = cache.get_plano_by_id(transacao['plano_contas_id'])
-                if nome_plano:
-                    transacao['plano_contas'] = nome_plano['nome'] 
-                    lookup_stats['plano'] += 1
-            
-            if transacao.get('item_id'):
-                nome_item = cache.get_item_by_id(transacao['item_id'])
-                if nome_item:
-                    transacao['item'] = nome_item['nome']
-                    lookup_stats['item'] += 1
-            
-            transacoes.append(transacao)
+            transacoes.append(resolver_lookups_transacao(row, lookup_stats))
         
         logger.info(f"✅ Processadas {len(transacoes)} transações com lookup otimizado (cache hits: classificação={lookup_stats['classificacao']}, plano={lookup_stats['plano']}, item={lookup_stats['item']})")
         
-        return {"success": True, "transacoes": transacoes, "total": len(transacoes)}
+        return ListResponse(
+            data=transacoes,
+            total=total,
+            offset=offset,
+            limite=filtro.limite,
+            has_more=next_cursor is not None,
+            next_cursor=next_cursor
+        )
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"❌ Erro ao listar transações: {e}")
         raise HTTPException(status_code=500, detail=f"Erro interno: {str(e)}")
     
+@app.get("/api/transacoes/{transacao_id}")
+async def obter_transacao(transacao_id: str):
+    """Uma transação pelo id, com os mesmos lookups da listagem (ex.: modal de conciliação)"""
+    if not supabase:
+        raise HTTPException(status_code=500, detail="Banco de dados não configurado")
+    
+    lookups_cache = cache.get_all_lookups()
+    if not lookups_cache:
+        await carregar_lookups_cache()
+    
+    result = supabase.admin_client.table("transacoes").select("*").eq("id", transacao_id).limit(1).execute()
+    if not result.data:
+        raise HTTPException(status_code=404, detail="Transação não encontrada")
+    
+    return resolver_lookups_transacao(result.data[0])
+
 @app.get("/api/debug/transacoes")
 async def debug_transacoes():
     """Debug para ver estrutura das transações"""
@@ -3949,9 +5048,8 @@ async def conciliar_transacao(dados: ConciliacaoRequest):
         
         logger.info(f"✅ Transação {dados.transacao_id} conciliada com sucesso")
 
-        # 🟢 Invalida cache após sucesso
-        cache.invalidate_pattern('*', 'transacoes')
-        cache.invalidate_pattern('*', 'stats')
+        # 🟢 Atualiza os contadores de /api/stats (status anterior -> CONCILIADO)
+        cache.mudar_status_contadores([transacao], 'CONCILIADO')
         
         return {'success': True, 'message': 'Transação conciliada com sucesso'}
         
@@ -4856,6 +5954,7 @@ async def relatorios():
         
         
         <script>
+        """ + JS_BUSCAR_TODAS_TRANSACOES + """
         async function atualizarStats() {
             try {
                 const response = await fetch('/api/stats');
@@ -4945,15 +6044,19 @@ async def relatorios():
             container.innerHTML = '<div class="loading"><div class="spinner"></div>Carregando...</div>';
             
             try {
-                const response = await fetch('/api/transacoes');
+                // Totais por banco e status já agregados no banco de dados (todas as transações)
+                const response = await fetch('/api/stats');
+                if (!response.ok) throw new Error('Erro HTTP ' + response.status);
                 const data = await response.json();
                 
                 const porBanco = {};
-                data.transacoes.forEach(t => {
-                    if (!porBanco[t.banco]) porBanco[t.banco] = {total: 0, valor: 0, conciliados: 0};
-                    porBanco[t.banco].total++;
-                    porBanco[t.banco].valor += t.valor;
-                    if (t.status === 'CONCILIADO') porBanco[t.banco].conciliados++;
+                Object.entries(data.por_banco || {}).forEach(([banco, porStatus]) => {
+                    porBanco[banco] = {total: 0, valor: 0, conciliados: 0};
+                    Object.entries(porStatus).forEach(([status, grupo]) => {
+                        porBanco[banco].total += grupo.quantidade;
+                        porBanco[banco].valor += grupo.valor_total;
+                        if (status === 'CONCILIADO') porBanco[banco].conciliados += grupo.quantidade;
+                    });
                 });
                 
                 setTimeout(() => {
@@ -5025,19 +6128,18 @@ async def relatorios():
     console.log('🔍 DEBUG: Testando API de transações...');
     
     try {
-        const response = await fetch('/api/transacoes');
-        const data = await response.json();
+        const transacoes = await buscarTodasTransacoes();
         
-        console.log('📊 Total de transações:', data.transacoes?.length || 0);
+        console.log('📊 Total de transações:', transacoes.length);
         
-        if (data.transacoes && data.transacoes.length > 0) {
-            console.log('📋 Primeira transação:', data.transacoes[0]);
+        if (transacoes.length > 0) {
+            console.log('📋 Primeira transação:', transacoes[0]);
             
             // Contar status
             const status = {};
             const classificacoes = {};
             
-            data.transacoes.forEach(t => {
+            transacoes.forEach(t => {
                 // Contar por status
                 const st = t.status || 'INDEFINIDO';
                 status[st] = (status[st] || 0) + 1;
@@ -5061,17 +6163,12 @@ async def relatorios():
     container.innerHTML = '<div class="loading"><div class="spinner"></div>Carregando...</div>';
     
     try {
-        const response = await fetch('/api/transacoes');
-        const data = await response.json();
-        
-        if (!data.success || !data.transacoes) {
-            throw new Error('Dados inválidos recebidos da API');
-        }
+        const transacoes = await buscarTodasTransacoes();
         
         // Agrupar por classificação
         const porClassificacao = {};
         
-        data.transacoes.forEach(t => {
+        transacoes.forEach(t => {
             let classificacao = 'Não Classificado';
             
             if (t.classificacao && t.classificacao.trim() !== '') {
@@ -6309,6 +7406,7 @@ async def pagina_configuracoes():
         </div>
         
         <script>
+        """ + JS_BUSCAR_TODAS_TRANSACOES + """
         // Variáveis globais
         let classificacoesData = {};
         let transacoesData = [];
@@ -6349,9 +7447,9 @@ async def pagina_configuracoes():
     }
     
     try {
-        const [classificacoesResponse, transacoesResponse] = await Promise.all([
+        const [classificacoesResponse, transacoes] = await Promise.all([
             fetch('/api/classificacoes'),
-            fetch('/api/transacoes')
+            buscarTodasTransacoes()
         ]);
         
         if (classificacoesResponse.ok) {
@@ -6359,10 +7457,7 @@ async def pagina_configuracoes():
             classificacoesData = classificacoesResult.classificacoes;
         }
         
-        if (transacoesResponse.ok) {
-            const transacoesResult = await transacoesResponse.json();
-            transacoesData = transacoesResult.transacoes;
-        }
+        transacoesData = transacoes;
     } catch (error) {
         console.error('Erro ao carregar dados:', error);
         mostrarAlerta('Erro ao carregar dados do sistema', 'danger');
@@ -7374,7 +8469,7 @@ async def obter_classificacoes():
             raise HTTPException(status_code=500, detail="Banco não configurado")
         
         # Verificar cache primeiro
-        cached_data = cache.get('estrutura', 'classificacoes')
+        cached_data = cache.get('classificacoes:estrutura', 'classificacoes')
         if cached_data:
             logger.info("✅ Usando classificações do cache")
             return cached_data
@@ -7429,7 +8524,7 @@ async def obter_classificacoes():
         }
         
         # Armazenar no cache por 1 hora
-        cache.set('estrutura', response_data, 'classificacoes')
+        cache.set('classificacoes:estrutura', response_data, 'classificacoes')
         
         logger.info(f"✅ Estrutura carregada: {len(estrutura)} classificações")
         
@@ -7503,7 +8598,7 @@ async def criar_classificacao_normalizada(dados: ClassificacaoRequest):
         
         if result.data:
             logger.info(f"✅ Classificação criada: {dados.nome}")   
-            cache.invalidate_pattern('*', 'classificacoes')
+            cache.invalidar_classificacoes()
             return {'success': True, 'message': 'Classificação criada com sucesso'}
         else:
             raise HTTPException(status_code=500, detail="Erro ao criar classificação")
@@ -7536,7 +8631,7 @@ async def atualizar_classificacao_normalizada(dados: UpdateClassificacaoRequest)
         
         if update_result.data:
             logger.info(f"✅ Classificação atualizada: {dados.nome_antigo} -> {dados.nome_novo}")
-            cache.invalidate_pattern('*', 'classificacoes')
+            cache.invalidar_classificacoes()
             return {'success': True, 'message': 'Classificação atualizada com sucesso'}
         else:
             raise HTTPException(status_code=500, detail="Erro ao atualizar classificação")
@@ -7576,7 +8671,7 @@ async def excluir_classificacao_normalizada(nome: str):
         
         if delete_result.data:
             logger.info(f"✅ Classificação excluída: {nome}")
-            cache.invalidate_pattern('*', 'classificacoes')
+            cache.invalidar_classificacoes()
             return {'success': True, 'message': 'Classificação excluída com sucesso'}
         else:
             raise HTTPException(status_code=500, detail="Erro ao excluir classificação")
@@ -7615,7 +8710,7 @@ async def criar_plano_contas_normalizado(dados: PlanoContasRequest):
         
         if result.data:
             logger.info(f"✅ Plano criado: {dados.nome} em {dados.classificacao}")
-            cache.invalidate_pattern('*', 'classificacoes')
+            cache.invalidar_classificacoes()
             return {'success': True, 'message': 'Plano de contas criado com sucesso'}
         else:
             raise HTTPException(status_code=500, detail="Erro ao criar plano de contas")
@@ -7654,7 +8749,7 @@ async def atualizar_plano_contas_normalizado(dados: UpdatePlanoContasRequest):
         
         if update_result.data:
             logger.info(f"✅ Plano atualizado: {dados.nome_antigo} -> {dados.nome_novo}")
-            cache.invalidate_pattern('*', 'classificacoes')
+            cache.invalidar_classificacoes()
             return {'success': True, 'message': 'Plano de contas atualizado com sucesso'}
         else:
             raise HTTPException(status_code=500, detail="Erro ao atualizar plano de contas")
@@ -7699,7 +8794,7 @@ async def excluir_plano_contas_normalizado(classificacao: str, plano: str):
         
         if delete_result.data:
             logger.info(f"✅ Plano excluído: {plano} de {classificacao}")
-            cache.invalidate_pattern('*', 'classificacoes')
+            cache.invalidar_classificacoes()
             return {'success': True, 'message': 'Plano de contas excluído com sucesso'}
         else:
             raise HTTPException(status_code=500, detail="Erro ao excluir plano de contas")
@@ -7744,7 +8839,7 @@ async def criar_item_normalizado(dados: ItemRequest):
         
         if result.data:
             logger.info(f"✅ Item criado: {dados.nome} em {dados.classificacao}/{dados.plano_contas}")
-            cache.invalidate_pattern('*', 'classificacoes')
+            cache.invalidar_classificacoes()
             return {'success': True, 'message': 'Item criado com sucesso'}
         else:
             raise HTTPException(status_code=500, detail="Erro ao criar item")
@@ -7789,7 +8884,7 @@ async def atualizar_item_normalizado(dados: UpdateItemRequest):
         
         if update_result.data:
             logger.info(f"✅ Item atualizado: {dados.nome_antigo} -> {dados.nome_novo}")
-            cache.invalidate_pattern('*', 'classificacoes')
+            cache.invalidar_classificacoes()
             return {'success': True, 'message': 'Item atualizado com sucesso'}
         else:
             raise HTTPException(status_code=500, detail="Erro ao atualizar item")
@@ -7840,7 +8935,7 @@ async def excluir_item_normalizado(classificacao: str, plano: str, item: str):
         
         if delete_result.data:
             logger.info(f"✅ Item excluído: {item} de {classificacao}/{plano}")
-            cache.invalidate_pattern('*', 'classificacoes')
+            cache.invalidar_classificacoes()
             return {'success': True, 'message': 'Item excluído com sucesso'}
         else:
             raise HTTPException(status_code=500, detail="Erro ao excluir item")
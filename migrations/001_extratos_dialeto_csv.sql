@@ -0,0 +1,4 @@
+-- Dialeto do CSV (encoding e separador) detectado no upload.
+-- Uploads seguintes do mesmo banco reaproveitam o dialeto e pulam a detecção.
+ALTER TABLE extratos ADD COLUMN IF NOT EXISTS csv_encoding TEXT;
+ALTER TABLE extratos ADD COLUMN IF NOT EXISTS csv_separador TEXT;
@@ -0,0 +1,5 @@
+-- Hash SHA-256 do arquivo enviado e resumo do processamento.
+-- Um upload com o mesmo hash (e banco) devolve o extrato existente sem reprocessar.
+ALTER TABLE extratos ADD COLUMN IF NOT EXISTS arquivo_sha256 TEXT;
+ALTER TABLE extratos ADD COLUMN IF NOT EXISTS resumo JSONB;
+CREATE INDEX IF NOT EXISTS idx_extratos_arquivo_sha256 ON extratos (arquivo_sha256, banco);
@@ -0,0 +1,4 @@
+-- Chave natural da transação: hash de banco, data, documento, valor, histórico
+-- e posição da linha no dia. Extratos de períodos sobrepostos inserem só as linhas novas.
+ALTER TABLE transacoes ADD COLUMN IF NOT EXISTS chave_natural TEXT;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_transacoes_chave_natural ON transacoes (chave_natural);
@@ -0,0 +1,3 @@
+-- Paginação por cursor de /api/transacoes: ordem (created_at, id) decrescente
+-- lida direto do índice, com custo constante por página.
+CREATE INDEX IF NOT EXISTS idx_transacoes_created_at_id ON transacoes (created_at DESC, id DESC);
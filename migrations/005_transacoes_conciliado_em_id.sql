@@ -0,0 +1,4 @@
+-- Paginação por cursor de /conciliados: ordem (conciliado_em, id) decrescente
+-- das conciliadas lida direto do índice parcial, com custo constante por página.
+CREATE INDEX IF NOT EXISTS idx_transacoes_conciliado_em_id ON transacoes (conciliado_em DESC, id DESC)
+    WHERE status = 'CONCILIADO' AND conciliado_em IS NOT NULL;
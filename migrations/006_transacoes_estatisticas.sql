@@ -0,0 +1,9 @@
+-- Estatísticas de /api/stats agregadas no banco: uma linha por (banco, status)
+-- com quantidade e soma dos valores, lidas numa única requisição.
+CREATE OR REPLACE VIEW transacoes_estatisticas AS
+SELECT banco,
+       status,
+       COUNT(*) AS quantidade,
+       COALESCE(SUM(valor), 0) AS valor_total
+FROM transacoes
+GROUP BY banco, status;
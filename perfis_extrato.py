@@ -0,0 +1,153 @@
+# perfis_extrato.py
+"""
+Perfis de layout de extrato: como ler o arquivo de cada banco/conta (nomes
+das colunas, formato de data, separador decimal, linhas antes do cabeçalho
+e convenção de sinal). Os perfis ficam no JSON de PERFIS_EXTRATO_ARQUIVO,
+então uma conta com layout novo entra sem mudar código.
+
+Cada perfil é reconhecido pela assinatura (hash) do seu cabeçalho normalizado.
+Exemplo de perfil:
+
+    {
+        "nome": "Banco X - conta corrente",
+        "cabecalho": ["Data Lançamento", "Descrição", "Nº Doc", "Valor", "D/C", "Saldo"],
+        "colunas": {"Data": "Data Lançamento", "Histórico": "Descrição", "Documento": "Nº Doc",
+                    "Valor (R$)": "Valor", "Saldo (R$)": "Saldo"},
+        "formato_data": "%d/%m/%Y",
+        "decimal": ".",
+        "linhas_ignoradas": 2,
+        "sinal": {"coluna": "D/C", "debito": "D"}
+    }
+
+Arquivos sem perfil seguem o layout padrão (colunas Data, Histórico,
+Documento, Valor (R$) e Saldo (R$), decimal com vírgula, sinal no valor)
+"""
+import hashlib
+import json
+import os
+import unicodedata
+from typing import Any, Dict, Iterable, Optional
+
+from loguru import logger
+
+PERFIS_EXTRATO_ARQUIVO = os.getenv(
+    "PERFIS_EXTRATO_ARQUIVO", os.path.join(os.path.dirname(os.path.abspath(__file__)), "perfis_extrato.json")
+)
+
+# Colunas do layout padrão que um perfil pode mapear
+COLUNAS_PERFIL = ['Data', 'Histórico', 'Documento', 'Valor (R$)', 'Saldo (R$)']
+
+# Linhas do início do arquivo examinadas em busca de um cabeçalho conhecido
+MAX_LINHAS_CABECALHO = 20
+
+# Campos opcionais do perfil e seus valores padrão
+CAMPOS_PADRAO_PERFIL = {
+    'colunas': {},              # coluna do layout padrão -> nome da coluna no arquivo
+    'encoding': None,           # None = detectado pela amostra do arquivo
+    'separador': None,          # idem
+    'formato_data': None,       # None = detectado entre FORMATOS_DATA
+    'decimal': ',',             # ',' -> 1.234,56 | '.' -> 1,234.56
+    'linhas_ignoradas': 0,      # linhas antes do cabeçalho
+    'sinal': 'normal',          # 'normal', 'invertido' ou {'coluna': ..., 'debito': ...}
+}
+
+
+def normalizar_nome_coluna(nome: Any) -> str:
+    """Nome da coluna sem acentos, aspas e espaços extras, em minúsculas"""
+    texto = unicodedata.normalize('NFKD', str(nome)).encode('ascii', 'ignore').decode('ascii')
+    return ' '.join(texto.strip().strip('"\'').split()).casefold()
+
+
+def assinatura_cabecalho(colunas: Iterable[Any]) -> str:
+    """Hash do cabeçalho normalizado; colunas vazias do final não contam"""
+    nomes = [normalizar_nome_coluna(coluna) for coluna in colunas]
+    while nomes and (nomes[-1] in ('', 'none', 'nan') or nomes[-1].startswith('unnamed:')):
+        nomes.pop()
+    return hashlib.sha256('|'.join(nomes).encode('utf-8')).hexdigest()
+
+
+def validar_perfil(perfil: Dict[str, Any]) -> Dict[str, Any]:
+    """Perfil completo (campos padrão preenchidos). Levanta ValueError se for inconsistente"""
+    if not perfil.get('nome') or not perfil.get('cabecalho'):
+        raise ValueError("Perfil precisa de 'nome' e 'cabecalho'")
+
+    perfil = {**CAMPOS_PADRAO_PERFIL, **perfil}
+    cabecalho = {normalizar_nome_coluna(coluna) for coluna in perfil['cabecalho']}
+
+    desconhecidas = set(perfil['colunas']) - set(COLUNAS_PERFIL)
+    if desconhecidas:
+        raise ValueError(f"Colunas desconhecidas em 'colunas': {sorted(desconhecidas)}")
+    ausentes = [nome for nome in perfil['colunas'].values() if normalizar_nome_coluna(nome) not in cabecalho]
+    if ausentes:
+        raise ValueError(f"Colunas mapeadas que não estão no cabeçalho: {ausentes}")
+
+    if perfil['decimal'] not in (',', '.'):
+        raise ValueError("'decimal' deve ser ',' ou '.'")
+    if not isinstance(perfil['linhas_ignoradas'], int) or perfil['linhas_ignoradas'] < 0:
+        raise ValueError("'linhas_ignoradas' deve ser um inteiro >= 0")
+    if perfil['linhas_ignoradas'] >= MAX_LINHAS_CABECALHO:
+        raise ValueError(f"'linhas_ignoradas' deve ser menor que {MAX_LINHAS_CABECALHO}")
+
+    sinal = perfil['sinal']
+    if isinstance(sinal, dict):
+        if not sinal.get('coluna') or not sinal.get('debito'):
+            raise ValueError("'sinal' por coluna precisa de 'coluna' e 'debito'")
+        if normalizar_nome_coluna(sinal['coluna']) not in cabecalho:
+            raise ValueError(f"Coluna de sinal '{sinal['coluna']}' não está no cabeçalho")
+    elif sinal not in ('normal', 'invertido'):
+        raise ValueError("'sinal' deve ser 'normal', 'invertido' ou {'coluna': ..., 'debito': ...}")
+
+    perfil['assinatura'] = assinatura_cabecalho(perfil['cabecalho'])
+    return perfil
+
+
+def carregar_perfis(caminho: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Perfis do arquivo JSON (lista de perfis), indexados pela assinatura do
+    cabeçalho. Perfil inválido é ignorado com log, sem impedir os demais
+    """
+    if not os.path.exists(caminho):
+        logger.info(f"Sem arquivo de perfis de extrato em {caminho}: só o layout padrão")
+        return {}
+
+    try:
+        with open(caminho, encoding='utf-8') as arquivo:
+            definicoes = json.load(arquivo)
+    except (OSError, ValueError) as e:
+        logger.error(f"❌ Erro ao ler perfis de extrato de {caminho}: {e}")
+        return {}
+
+    perfis = {}
+    for definicao in definicoes:
+        try:
+            perfil = validar_perfil(definicao)
+        except ValueError as e:
+            logger.error(f"❌ Perfil de extrato ignorado ({definicao.get('nome')}): {e}")
+            continue
+        if perfil['assinatura'] in perfis:
+            logger.warning(f"⚠️ Perfil {perfil['nome']} tem o mesmo cabeçalho de "
+                           f"{perfis[perfil['assinatura']]['nome']} e foi ignorado")
+            continue
+        perfis[perfil['assinatura']] = perfil
+
+    logger.info(f"📋 {len(perfis)} perfis de extrato carregados")
+    return perfis
+
+
+PERFIS = carregar_perfis(PERFIS_EXTRATO_ARQUIVO)
+
+# Muda quando o conjunto de perfis muda (entra na chave do cache da detecção)
+VERSAO_PERFIS = hashlib.sha256('|'.join(sorted(PERFIS)).encode('utf-8')).hexdigest()[:12]
+
+# Linhas do início do arquivo que decidem o perfil (até o cabeçalho mais abaixo entre os perfis)
+LINHAS_ATE_CABECALHO = max((perfil['linhas_ignoradas'] for perfil in PERFIS.values()), default=0) + 1
+
+
+def perfil_por_cabecalho(colunas: Iterable[Any], posicao: int = 0) -> Optional[Dict[str, Any]]:
+    """Perfil cujo cabeçalho é `colunas`, encontrado na linha `posicao` do arquivo (None se nenhum)"""
+    if not PERFIS:
+        return None
+    perfil = PERFIS.get(assinatura_cabecalho(colunas))
+    if perfil and perfil['linhas_ignoradas'] == posicao:
+        return perfil
+    return None
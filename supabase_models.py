@@ -1,8 +1,11 @@
 # models.py
-from pydantic import BaseModel, EmailStr, validator
+from pydantic import BaseModel, EmailStr, Field, validator
 from typing import Optional, List
 from datetime import datetime, date
 from enum import Enum
+import os
+import re
+import unicodedata
 import uuid
 
 # === ENUMS ===
@@ -15,9 +18,14 @@ class StatusTransacaoEnum(str, Enum):
     PENDENTE = "PENDENTE"
     CONCILIADO = "CONCILIADO"
 
-class BancoEnum(str, Enum):
-    AAI = "AAI"
-    EDUCACAO = "EDUCAÇÃO"
+def _nome_membro_banco(banco: str) -> str:
+    """Nome do membro do enum: sem acentos, maiúsculo (EDUCAÇÃO -> EDUCACAO)"""
+    texto = unicodedata.normalize('NFKD', banco).encode('ascii', 'ignore').decode('ascii')
+    return re.sub(r'\W+', '_', texto).strip('_').upper()
+
+# Bancos/contas aceitos: conta nova entra pela variável BANCOS (ex.: "AAI,EDUCAÇÃO,XP"), sem mudar código
+BANCOS = [banco.strip() for banco in os.getenv("BANCOS", "AAI,EDUCAÇÃO").split(",") if banco.strip()]
+BancoEnum = Enum('BancoEnum', {_nome_membro_banco(banco): banco for banco in BANCOS}, type=str)
 
 # === MODELOS BASE ===
 class BaseResponse(BaseModel):
@@ -219,8 +227,9 @@ class TransacaoFilter(BaseModel):
     data_fim: Optional[date] = None
     classificacao_id: Optional[str] = None
     busca: Optional[str] = None
-    limite: int = 100
-    offset: int = 0
+    limite: int = Field(100, ge=1, le=1000)
+    # Paginação por cursor (next_cursor da página anterior) em vez de offset
+    cursor: Optional[str] = None
 
 # === MODELOS DE RESPOSTA ===
 class ListResponse(BaseModel):
@@ -229,6 +238,7 @@ class ListResponse(BaseModel):
     offset: int
     limite: int
     has_more: bool
+    next_cursor: Optional[str] = None
 
 class ErrorResponse(BaseModel):
     success: bool = False
@@ -0,0 +1,291 @@
+# tests/referencia_linha_a_linha.py
+"""
+Implementação linha a linha de processar_arquivo (com detectar_forma_pagamento,
+processar_valor_moeda e detectar_contraparte_backend), copiada de main.py
+antes do motor colunar de extrato_service. Serve só de referência para o
+teste de paridade
+"""
+import io
+import uuid
+from datetime import datetime
+
+import pandas as pd
+from loguru import logger
+
+
+def detectar_forma_pagamento(historico):
+    """Detectar forma de pagamento baseado no histórico"""
+    historico_upper = historico.upper()
+    
+    if 'PIX' in historico_upper:
+        return 'PIX'
+    elif 'TED' in historico_upper:
+        return 'TED'
+    elif 'DOC' in historico_upper:
+        return 'DOC'
+    elif 'DÉBITO AUTOMÁTICO' in historico_upper or 'DEBITO AUTOMATICO' in historico_upper:
+        return 'Débito Automático'
+    elif 'CARTÃO' in historico_upper or 'CARTAO' in historico_upper:
+        return 'Cartão'
+    elif 'BOLETO' in historico_upper:
+        return 'Boleto'
+    elif 'TRANSFERÊNCIA' in historico_upper or 'TRANSFERENCIA' in historico_upper:
+        return 'Transferência'
+    elif 'DEPÓSITO' in historico_upper or 'DEPOSITO' in historico_upper:
+        return 'Depósito'
+    elif 'SAQUE' in historico_upper:
+        return 'Saque'
+    elif 'TARIFA' in historico_upper:
+        return 'Tarifa'
+    else:
+        return 'Outros'
+
+# Modelos Pydantic para validação
+
+def processar_valor_moeda(valor_raw):
+    """Função para processar valores monetários uniformemente"""
+    if isinstance(valor_raw, str):
+        # Remove espaços, pontos (milhares) e substitui vírgula por ponto (decimal)
+        valor_str = str(valor_raw).strip()
+        # Remove símbolos de moeda se existir
+        valor_str = valor_str.replace('R$', '').replace('$', '').strip()
+        # Remove pontos que são separadores de milhares e substitui vírgula por ponto
+        valor_str = valor_str.replace('.', '').replace(',', '.')
+        # Remove espaços extras
+        valor_str = valor_str.replace(' ', '')
+        try:
+            return float(valor_str) if valor_str and valor_str != '-' else 0.0
+        except ValueError:
+            logger.warning(f"Valor inválido encontrado: {valor_raw}")
+            return 0.0
+    else:
+        return float(valor_raw) if pd.notna(valor_raw) else 0.0
+
+def processar_arquivo(file_content: bytes, filename: str, banco: str):
+    """Processar arquivo CSV ou Excel e extrair transações"""
+    try:
+                
+        logger.info(f"Iniciando processamento de {filename} para banco {banco}")
+        
+        # Detectar tipo de arquivo
+        if filename.endswith('.csv'):
+            # Processar CSV - aplicar mesma tratativa para ambos os bancos
+            logger.info("Processando arquivo CSV...")
+            
+            # Tentar diferentes codificações
+            encodings = ['utf-8', 'latin-1', 'cp1252', 'iso-8859-1']
+            df = None
+            
+            for encoding in encodings:
+                try:
+                    content_str = file_content.decode(encoding)
+                    # Tentar diferentes separadores
+                    separadores = [';', ',', '\t']
+                    for sep in separadores:
+                        try:
+                            df = pd.read_csv(
+                                io.StringIO(content_str), 
+                                sep=sep,
+                                encoding=encoding,
+                                na_values=['', 'nan', 'NaN', 'null', 'NULL']
+                            )
+                            if len(df.columns) > 1:  # Se encontrou múltiplas colunas, provavelmente acertou o separador
+                                logger.info(f"CSV lido com encoding {encoding} e separador '{sep}'")
+                                break
+                        except:
+                            continue
+                    if df is not None and len(df.columns) > 1:
+                        break
+                except:
+                    continue
+                    
+            if df is None:
+                raise ValueError("Não foi possível ler o arquivo CSV com nenhuma codificação testada")
+                
+        else:
+            # Processar Excel - aplicar mesma tratativa para ambos os bancos
+            logger.info("Processando arquivo Excel...")
+            df = pd.read_excel(
+                io.BytesIO(file_content), 
+                engine='openpyxl',
+                na_values=['', 'nan', 'NaN', 'null', 'NULL']
+            )
+        
+        logger.info(f"Arquivo lido com {len(df)} linhas e colunas: {list(df.columns)}")
+        
+        # Limpar nomes das colunas (remover espaços extras)
+        df.columns = df.columns.str.strip()
+        
+        # Verificar se tem as colunas necessárias - mesmo critério para ambos os bancos
+        colunas_necessarias = ['Data', 'Histórico', 'Valor (R$)']
+        colunas_faltando = [col for col in colunas_necessarias if col not in df.columns]
+        
+        if colunas_faltando:
+            logger.warning(f"Colunas obrigatórias não encontradas: {colunas_faltando}")
+            logger.info(f"Colunas disponíveis: {list(df.columns)}")
+            raise ValueError(f"Colunas obrigatórias não encontradas: {colunas_faltando}")
+        
+        transacoes = []
+        linhas_processadas = 0
+        
+        for index, row in df.iterrows():
+            try:
+                # Pular linha de cabeçalho e saldo anterior - mesmo critério para ambos
+                if pd.isna(row.get('Data')) or 'SALDO ANTERIOR' in str(row.get('Histórico', '')).upper():
+                    continue
+                    
+                # Extrair dados - mesmo processamento para ambos os bancos
+                data = row.get('Data')
+                if isinstance(data, pd.Timestamp):
+                    data_str = data.strftime('%Y-%m-%d')
+                else:
+                    data_str = str(data)
+                    
+                historico = str(row.get('Histórico', '')).strip()
+                documento = str(row.get('Documento', '')).strip()
+                
+                # APLICAR MESMA TRATATIVA DE VALOR PARA AMBOS OS BANCOS
+                valor_raw = row.get('Valor (R$)', 0)
+                valor = processar_valor_moeda(valor_raw)
+                
+                # APLICAR MESMA TRATATIVA DE SALDO PARA AMBOS OS BANCOS
+                saldo_raw = row.get('Saldo (R$)', 0)
+                saldo = processar_valor_moeda(saldo_raw)
+                
+                # Log para debug - especialmente para EDUCAÇÃO
+                if banco == 'EDUCAÇÃO':
+                    logger.debug(f"EDUCAÇÃO - Linha {index}: Valor raw='{valor_raw}' -> processado={valor}, Saldo raw='{saldo_raw}' -> processado={saldo}")
+                
+                # Classificar tipo de transação - mesmo critério para ambos
+                tipo_transacao = 'OUTROS'
+                historico_upper = historico.upper()
+                if 'PIX' in historico_upper:
+                    tipo_transacao = 'PIX'
+                elif 'TED' in historico_upper:
+                    tipo_transacao = 'TED'
+                elif 'PAGAMENTO' in historico_upper:
+                    tipo_transacao = 'PAGAMENTO'
+                elif 'TARIFA' in historico_upper:
+                    tipo_transacao = 'TARIFA'
+                elif 'DEBITO' in historico_upper or 'DÉBITO' in historico_upper:
+                    tipo_transacao = 'DÉBITO'
+                elif 'CREDITO' in historico_upper or 'CRÉDITO' in historico_upper:
+                    tipo_transacao = 'CRÉDITO'
+                
+                transacao = {
+                    'id': str(uuid.uuid4()),
+                    'banco': banco,
+                    'data': data_str,
+                    'historico': historico,
+                    'documento': documento,
+                    'valor': valor,
+                    'saldo': saldo,
+                    'tipo_transacao': tipo_transacao,
+                    'status': 'PENDENTE',
+                    'classificacao': '',
+                    'plano_contas': '',
+                    'item': '',
+                    'forma_pagamento': detectar_forma_pagamento(historico),  # Autopreenchido
+                    'banco_origem': banco,  # Autopreenchido (AAI ou EDUCAÇÃO)
+                    'centro_custo': '',
+                    'nome_recebedor': '',
+                    'data_pagamento': data_str,  # Autopreenchido com data do extrato
+                    'data_referencia': '',
+                    'observacoes': '',
+                    'conciliado_em': None,
+                    'conciliado_por': None,
+                    'created_at': datetime.now().isoformat(),
+                    'contraparte': detectar_contraparte_backend(historico)  # NOVO CAMPO ADICIONADO
+                }
+                
+                transacoes.append(transacao)
+                linhas_processadas += 1
+                
+            except Exception as e:
+                logger.warning(f"Erro ao processar linha {index}: {e}")
+                continue
+        
+        logger.info(f"Processamento concluído para {banco}: {linhas_processadas} transações de {len(df)} linhas")
+        return transacoes
+        
+    except Exception as e:
+        logger.error(f"ERRO CRÍTICO ao processar arquivo {banco}: {e}")
+        logger.error(f"Tipo do erro: {type(e)}")
+        import traceback
+        logger.error(f"Traceback completo: {traceback.format_exc()}")
+        raise ValueError(f"Erro ao processar arquivo: {str(e)}")
+
+def detectar_contraparte_backend(historico):
+    """Detectar contraparte baseado no histórico"""
+    if not historico:
+        return 'Não identificado'
+    
+    historico = historico.upper()
+    
+    # Padrões comuns de contrapartes
+    padroes = [
+        ('PAGSEGURO', 'PagSeguro'),
+        ('MERCADO PAGO', 'Mercado Pago'),
+        ('IFood', 'iFood'),
+        ('UBER', 'Uber'),
+        ('99', '99 Taxi'),
+        ('TÁXI', 'Taxi'),
+        ('POSTO', 'Posto de Combustível'),
+        ('DROGARIA', 'Drogaria'),
+        ('FARMÁCIA', 'Farmácia'),
+        ('SUPERMERCADO', 'Supermercado'),
+        ('RESTAURANTE', 'Restaurante'),
+        ('HOSPITAL', 'Hospital'),
+        ('CLÍNICA', 'Clínica'),
+        ('ESCOLA', 'Escola'),
+        ('UNIVERSIDADE', 'Universidade'),
+        ('ALUGUEL', 'Proprietário'),
+        ('CONDOMINIO', 'Síndico'),
+        ('IPTU', 'Prefeitura'),
+        ('IPVA', 'Governo Estadual'),
+        ('ENERGIA', 'Companhia Energética'),
+        ('ÁGUA', 'Companhia de Água'),
+        ('TELEFONE', 'Operadora Telefônica'),
+        ('INTERNET', 'Provedor Internet'),
+        ('NETFLIX', 'Netflix'),
+        ('SPOTIFY', 'Spotify'),
+        ('AMAZON', 'Amazon'),
+        ('GOOGLE', 'Google'),
+        ('FACEBOOK', 'Facebook'),
+        ('INSTAGRAM', 'Instagram'),
+        ('IFOOD', 'iFood'),
+        ('RAKUTEN', 'Rakuten'),
+        ('PICPAY', 'PicPay'),
+        ('NUBANK', 'Nubank'),
+        ('ITAU', 'Itaú'),
+        ('BRADESCO', 'Bradesco'),
+        ('SANTANDER', 'Santander'),
+        ('BB', 'Banco do Brasil'),
+        ('CAIXA', 'Caixa Econômica'),
+        ('BANCO', 'Banco'),
+        ('SALÁRIO', 'Empregador'),
+        ('FGTS', 'Governo'),
+        ('INSS', 'Governo'),
+        ('IRPF', 'Receita Federal'),
+        ('PIX', 'Transferência PIX'),
+        ('TED', 'Transferência TED'),
+        ('DOC', 'Transferência DOC'),
+        ('BOLETO', 'Cobrança Boleto')
+    ]
+    
+    for padrao, contraparte in padroes:
+        if padrao in historico:
+            return contraparte
+    
+    # Tentar identificar CPF/CNPJ no histórico
+    import re
+    cpf_cnpj = re.search(r'(\d{3}\.?\d{3}\.?\d{3}-?\d{2}|\d{2}\.?\d{3}\.?\d{3}/?\d{4}-?\d{2})', historico)
+    if cpf_cnpj:
+        return f"CPF/CNPJ: {cpf_cnpj.group(0)}"
+    
+    # Se não encontrou nenhum padrão específico
+    partes = historico.split()
+    if len(partes) > 3:
+        return ' '.join(partes[:3]) + '...'
+    
+    return historico if historico else 'Não identificado'
@@ -0,0 +1,162 @@
+# tests/supabase_falso.py
+"""
+Supabase em memória para os testes: cobre só a parte do query builder do
+postgrest que a aplicação usa (select/insert/upsert/update, filtros eq, in_,
+lt, gt, gte, lte, ilike, is_, not_, order, range e limit)
+"""
+import itertools
+import re
+from types import SimpleNamespace
+
+
+def _valor(linha, coluna):
+    """Valor da coluna, seguindo caminhos JSON como resumo->integridade->>data"""
+    valor = linha
+    for parte in re.split(r'->>?', coluna):
+        valor = valor.get(parte) if isinstance(valor, dict) else None
+    return valor
+
+
+class ConsultaFalsa:
+    def __init__(self, banco, tabela):
+        self.banco = banco
+        self.tabela = tabela
+        self.operacao = 'select'
+        self.dados = None
+        self.on_conflict = None
+        self.colunas = '*'
+        self.filtros = []
+        self.ordens = []
+        self.inicio = 0
+        self.limite = None
+        self.negar = False
+
+    def select(self, colunas='*', count=None):
+        self.colunas = colunas
+        return self
+
+    def insert(self, dados):
+        self.operacao, self.dados = 'insert', dados
+        return self
+
+    def upsert(self, dados, on_conflict=None, ignore_duplicates=False):
+        self.operacao, self.dados, self.on_conflict = 'upsert', dados, on_conflict
+        return self
+
+    def update(self, dados):
+        self.operacao, self.dados = 'update', dados
+        return self
+
+    def delete(self):
+        self.operacao = 'delete'
+        return self
+
+    @property
+    def not_(self):
+        self.negar = True
+        return self
+
+    def _filtro(self, coluna, teste):
+        negar, self.negar = self.negar, False
+        self.filtros.append(lambda linha: teste(_valor(linha, coluna)) != negar)
+        return self
+
+    def eq(self, coluna, valor):
+        return self._filtro(coluna, lambda x: x == valor)
+
+    def in_(self, coluna, valores):
+        valores = set(valores)
+        return self._filtro(coluna, lambda x: x in valores)
+
+    def is_(self, coluna, valor):
+        return self._filtro(coluna, lambda x: x is None)
+
+    def lt(self, coluna, valor):
+        return self._filtro(coluna, lambda x: x is not None and x < valor)
+
+    def gt(self, coluna, valor):
+        return self._filtro(coluna, lambda x: x is not None and x > valor)
+
+    def gte(self, coluna, valor):
+        return self._filtro(coluna, lambda x: x is not None and x >= valor)
+
+    def lte(self, coluna, valor):
+        return self._filtro(coluna, lambda x: x is not None and x <= valor)
+
+    def ilike(self, coluna, padrao):
+        trecho = padrao.strip('%').lower()
+        return self._filtro(coluna, lambda x: x is not None and trecho in x.lower())
+
+    def order(self, coluna, desc=False, nullsfirst=False):
+        # postgrest 0.10 aceita várias colunas numa string só: "a.desc,id"
+        partes = f"{coluna}{'.desc' if desc else ''}".split(',')
+        self.ordens += [(parte.split('.')[0], parte.endswith('.desc')) for parte in partes]
+        return self
+
+    def range(self, inicio, fim):
+        # Como no postgrest 0.10.8, o fim chega exclusivo
+        self.inicio, self.limite = inicio, fim - inicio
+        return self
+
+    def limit(self, quantidade):
+        self.limite = quantidade
+        return self
+
+    def _linhas(self):
+        return [linha for linha in self.banco.tabelas.setdefault(self.tabela, [])
+                if all(filtro(linha) for filtro in self.filtros)]
+
+    def execute(self):
+        if self.banco.antes_de_executar:
+            self.banco.antes_de_executar(self)
+
+        if self.operacao in ('insert', 'upsert'):
+            tabela = self.banco.tabelas.setdefault(self.tabela, [])
+            existentes = {linha.get(self.on_conflict) for linha in tabela} if self.on_conflict else set()
+            inseridas = []
+            for linha in self.dados if isinstance(self.dados, list) else [self.dados]:
+                if self.on_conflict and linha.get(self.on_conflict) in existentes:
+                    continue
+                linha = {'id': f"{self.tabela}-{next(self.banco.ids)}", **linha}
+                existentes.add(linha.get(self.on_conflict))
+                inseridas.append(linha)
+            tabela.extend(inseridas)
+            return SimpleNamespace(data=[dict(linha) for linha in inseridas], count=None)
+
+        linhas = self._linhas()
+        if self.operacao == 'update':
+            for linha in linhas:
+                linha.update(self.dados)
+            return SimpleNamespace(data=[dict(linha) for linha in linhas], count=None)
+        if self.operacao == 'delete':
+            self.banco.tabelas[self.tabela] = [l for l in self.banco.tabelas[self.tabela] if l not in linhas]
+            return SimpleNamespace(data=linhas, count=None)
+
+        for coluna, desc in reversed(self.ordens):
+            linhas = sorted(linhas, key=lambda l: (_valor(l, coluna) is not None, _valor(l, coluna) or ''),
+                            reverse=desc)
+        contagem = len(linhas)
+        linhas = linhas[self.inicio:]
+        if self.limite is not None:
+            linhas = linhas[:self.limite]
+        if self.colunas != '*' and '(' not in self.colunas:
+            nomes = [nome.strip() for nome in self.colunas.split(',')]
+            linhas = [{nome: linha.get(nome) for nome in nomes} for linha in linhas]
+        return SimpleNamespace(data=[dict(linha) for linha in linhas], count=contagem)
+
+
+class BancoFalso:
+    def __init__(self):
+        self.tabelas = {}
+        self.ids = itertools.count(1)
+        # Gancho para simular falhas: recebe a consulta antes de executá-la
+        self.antes_de_executar = None
+
+    def table(self, tabela):
+        return ConsultaFalsa(self, tabela)
+
+
+class SupabaseFalso:
+    def __init__(self):
+        self.admin_client = BancoFalso()
+        self.client = self.admin_client
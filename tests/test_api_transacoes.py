@@ -0,0 +1,126 @@
+# tests/test_api_transacoes.py
+"""API de transações contra o Supabase em memória"""
+import base64
+import json
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+import main
+from supabase_falso import SupabaseFalso
+
+
+def _transacao(i, **campos):
+    return {
+        'id': f"t{i:03d}", 'banco': 'AAI', 'status': 'PENDENTE', 'valor': 10.0, 'historico': 'PIX',
+        'created_at': f"2025-01-01T00:00:{i:02d}", 'classificacao_id': None, 'plano_contas_id': None,
+        'item_id': None, **campos
+    }
+
+
+@pytest.fixture
+def supabase(monkeypatch):
+    falso = SupabaseFalso()
+    monkeypatch.setattr(main, 'supabase', falso)
+    return falso
+
+
+@pytest.fixture
+def cliente(supabase):
+    return TestClient(main.app)
+
+
+def test_transacao_por_id_fora_da_primeira_pagina(supabase, cliente):
+    supabase.admin_client.tabelas['transacoes'] = [_transacao(i) for i in range(30)]
+
+    # A mais antiga fica fora de uma página de 10 por created_at
+    assert 't000' not in [t['id'] for t in cliente.get('/api/transacoes?limite=10').json()['data']]
+    resposta = cliente.get('/api/transacoes/t000')
+
+    assert resposta.status_code == 200
+    assert resposta.json()['id'] == 't000'
+
+
+def test_transacao_por_id_inexistente(supabase, cliente):
+    assert cliente.get('/api/transacoes/nao-existe').status_code == 404
+
+
+CURSOR_VALIDO = {'created_at': '2025-01-01T00:00:07', 'id': 't007', 'total': 30, 'offset': 10}
+
+
+def _cursor_json(dados):
+    return base64.urlsafe_b64encode(json.dumps(dados).encode('utf-8')).decode('ascii')
+
+
+def test_cursor_ida_e_volta():
+    assert main.decodificar_cursor(main.codificar_cursor(CURSOR_VALIDO)) == CURSOR_VALIDO
+    por_conciliacao = {**CURSOR_VALIDO, 'conciliado_em': '2025-02-01T10:00:00'}
+    assert main.decodificar_cursor(main.codificar_cursor(por_conciliacao), 'conciliado_em') == por_conciliacao
+
+
+@pytest.mark.parametrize('cursor', [
+    '%%%', 'nao-e-base64', 'é', _cursor_json([1, 2]), _cursor_json(5), _cursor_json('created_at id total offset'),
+    _cursor_json({'id': 't007', 'total': 30, 'offset': 10}),
+    _cursor_json({**CURSOR_VALIDO, 'offset': 'a'}),
+    _cursor_json({**CURSOR_VALIDO, 'offset': -1}),
+    _cursor_json({**CURSOR_VALIDO, 'total': True}),
+    _cursor_json({**CURSOR_VALIDO, 'created_at': {'$gt': ''}}),
+    _cursor_json({**CURSOR_VALIDO, 'id': None}),
+])
+def test_cursor_malformado_e_400(supabase, cliente, cursor):
+    supabase.admin_client.tabelas['transacoes'] = [_transacao(i) for i in range(5)]
+
+    with pytest.raises(HTTPException) as erro:
+        main.decodificar_cursor(cursor)
+    assert erro.value.status_code == 400
+    assert cliente.get('/api/transacoes', params={'cursor': cursor}).status_code == 400
+
+
+def _todas_as_paginas(cliente, limite, **filtros):
+    paginas, cursor = [], None
+    while True:
+        resposta = cliente.get('/api/transacoes', params={'limite': limite, **filtros, **({'cursor': cursor} if cursor else {})})
+        assert resposta.status_code == 200
+        paginas.append(resposta.json())
+        cursor = paginas[-1]['next_cursor']
+        if not cursor:
+            return paginas
+
+
+@pytest.mark.parametrize('limite', [1, 3, 4, 7, 30])
+def test_empates_no_created_at_nao_repetem_nem_pulam_linhas(supabase, cliente, limite):
+    # Blocos de 7 linhas com o mesmo created_at (como um lote importado)
+    linhas = [_transacao(i, created_at=f"2025-01-01T00:00:{i // 7:02d}") for i in range(28)]
+    supabase.admin_client.tabelas['transacoes'] = linhas
+
+    paginas = _todas_as_paginas(cliente, limite)
+    ids = [t['id'] for pagina in paginas for t in pagina['data']]
+
+    # Ordem (created_at, id) decrescente, cada linha uma única vez
+    esperado = [t['id'] for t in sorted(linhas, key=lambda t: (t['created_at'], t['id']), reverse=True)]
+    assert ids == esperado
+    assert [pagina['offset'] for pagina in paginas] == list(range(0, 28, limite))
+    assert {pagina['total'] for pagina in paginas} == {28}
+    assert all(pagina['has_more'] for pagina in paginas[:-1])
+
+
+@pytest.mark.parametrize('quantidade', [0, 1, 8, 9])
+def test_ultima_pagina_sem_next_cursor(supabase, cliente, quantidade):
+    supabase.admin_client.tabelas['transacoes'] = [_transacao(i) for i in range(quantidade)]
+
+    ultima = _todas_as_paginas(cliente, 4)[-1]
+
+    assert ultima['next_cursor'] is None
+    assert ultima['has_more'] is False
+    assert len(ultima['data']) == (quantidade % 4 or min(quantidade, 4))
+
+
+def test_cursor_segue_os_filtros(supabase, cliente):
+    supabase.admin_client.tabelas['transacoes'] = [
+        _transacao(i, status='CONCILIADO' if i % 2 else 'PENDENTE') for i in range(10)
+    ]
+
+    paginas = _todas_as_paginas(cliente, 2, status='PENDENTE')
+
+    assert [t['id'] for pagina in paginas for t in pagina['data']] == ['t008', 't006', 't004', 't002', 't000']
@@ -0,0 +1,167 @@
+# tests/test_arquivos_estruturados.py
+"""Leitura de OFX (SGML e XML), CNAB 240 e CNAB 400 até as transações do layout padrão"""
+import io
+
+from extrato_service import (
+    CNAB240_LOTE_EXTRATO, CNAB240_SEGMENTO_E, CNAB240_SEGMENTO_T, CNAB240_SEGMENTO_U, CNAB400_DETALHE,
+    processar_estruturado_em_blocos
+)
+
+
+def _transacoes(conteudo: bytes, filename: str, linhas_por_bloco: int = 1000):
+    blocos = processar_estruturado_em_blocos(io.BytesIO(conteudo), filename, 'AAI', linhas_por_bloco)
+    return [(t['data'], t['valor'], t['historico'], t['documento']) for bloco in blocos for t in bloco]
+
+
+def _linha_fixa(largura: int, campos: dict) -> str:
+    """Linha de largura fixa com cada texto na posição (início, fim) do manual FEBRABAN"""
+    linha = [' '] * largura
+    for (inicio, fim), texto in campos.items():
+        assert len(texto) <= fim - inicio + 1, texto
+        linha[inicio - 1:inicio - 1 + len(texto)] = texto
+    return ''.join(linha)
+
+
+def _centavos(valor: float, largura: int) -> str:
+    return f"{round(valor * 100):0{largura}d}"
+
+
+OFX_SGML = b"""OFXHEADER:100
+DATA:OFXSGML
+VERSION:102
+ENCODING:USASCII
+CHARSET:1252
+
+<OFX>
+<BANKMSGSRSV1><STMTTRNRS><STMTRS>
+<BANKTRANLIST>
+<DTSTART>20250201
+<STMTTRN>
+<TRNTYPE>CREDIT
+<DTPOSTED>20250203120000[-3:BRT]
+<TRNAMT>1500.00
+<FITID>A1
+<MEMO>PIX RECEBIDO CLIENTE
+<STMTTRN>
+<TRNTYPE>DEBIT
+<DTPOSTED>20250204
+<TRNAMT>-45,90
+<FITID>A2
+<CHECKNUM>000123
+<NAME>PAGAMENTO BOLETO ENERGIA
+</STMTTRN>
+<STMTTRN>
+<TRNTYPE>FEE
+<DTPOSTED>20250205
+<TRNAMT>-12.5
+<FITID>A3
+<MEMO>Tarifa pacote servi\xe7os
+</BANKTRANLIST>
+</STMTRS></STMTTRNRS></BANKMSGSRSV1>
+</OFX>
+"""
+
+OFX_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<?OFX OFXHEADER="200" VERSION="220" SECURITY="NONE"?>
+<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>
+<STMTTRN><TRNTYPE>DEBIT</TRNTYPE><DTPOSTED>20250310</DTPOSTED><TRNAMT>-1234.56</TRNAMT><FITID>X1</FITID><REFNUM>R-9</REFNUM><MEMO>TED ENVIADA FORNECEDOR ÇÃO</MEMO></STMTTRN>
+<STMTTRN><TRNTYPE>CREDIT</TRNTYPE><DTPOSTED>20250311083000</DTPOSTED><TRNAMT>200.00</TRNAMT><FITID>X2</FITID><NAME>DEPOSITO</NAME></STMTTRN>
+</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>
+""".encode('utf-8')
+
+
+def test_ofx_sgml():
+    assert _transacoes(OFX_SGML, 'extrato.ofx') == [
+        ('2025-02-03', 1500.0, 'PIX RECEBIDO CLIENTE', 'A1'),
+        ('2025-02-04', -45.9, 'PAGAMENTO BOLETO ENERGIA', '000123'),
+        ('2025-02-05', -12.5, 'Tarifa pacote serviços', 'A3'),
+    ]
+
+
+def test_ofx_xml():
+    assert _transacoes(OFX_XML, 'EXTRATO.OFX') == [
+        ('2025-03-10', -1234.56, 'TED ENVIADA FORNECEDOR ÇÃO', 'R-9'),
+        ('2025-03-11', 200.0, 'DEPOSITO', 'X2'),
+    ]
+
+
+def test_ofx_tag_cortada_entre_leituras(monkeypatch):
+    import extrato_service
+    monkeypatch.setattr(extrato_service, 'TAMANHO_LEITURA_OFX', 7)
+    assert _transacoes(OFX_SGML, 'extrato.ofx', linhas_por_bloco=2) == _transacoes(OFX_SGML, 'extrato.ofx')
+
+
+def _cnab240(*detalhes: str) -> bytes:
+    header_arquivo = _linha_fixa(240, {(1, 3): '341', (4, 7): '0000', (8, 8): '0'})
+    header_lote = _linha_fixa(240, {
+        (1, 3): '341', (8, 8): '1', CNAB240_LOTE_EXTRATO['data_saldo']: '31012025',
+        CNAB240_LOTE_EXTRATO['saldo']: _centavos(1000, 18), CNAB240_LOTE_EXTRATO['situacao_saldo']: 'C'
+    })
+    trailer = _linha_fixa(240, {(1, 3): '341', (8, 8): '9'})
+    return '\r\n'.join([header_arquivo, header_lote, *detalhes, trailer]).encode('latin-1') + b'\r\n'
+
+
+def _segmento_e(data: str, valor: float, tipo: str, historico: str, documento: str) -> str:
+    return _linha_fixa(240, {
+        (8, 8): '3', (14, 14): 'E', CNAB240_SEGMENTO_E['data']: data,
+        CNAB240_SEGMENTO_E['valor']: _centavos(valor, 18), CNAB240_SEGMENTO_E['tipo']: tipo,
+        CNAB240_SEGMENTO_E['historico']: historico, CNAB240_SEGMENTO_E['documento']: documento
+    })
+
+
+def test_cnab240_extrato_segmento_e():
+    conteudo = _cnab240(
+        _segmento_e('03022025', 250.75, 'C', 'PIX RECEBIDO', 'DOC1'),
+        _segmento_e('04022025', 1000.5, 'D', 'PAGAMENTO FORNECEDOR', 'DOC2'),
+    )
+    blocos = processar_estruturado_em_blocos(io.BytesIO(conteudo), 'extrato.ret', 'AAI', 1000)
+    transacoes = [t for bloco in blocos for t in bloco]
+
+    assert [(t['data'], t['valor'], t['historico'], t['documento']) for t in transacoes] == [
+        ('2025-02-03', 250.75, 'PIX RECEBIDO', 'DOC1'),
+        ('2025-02-04', -1000.5, 'PAGAMENTO FORNECEDOR', 'DOC2'),
+    ]
+    # Saldo corrido a partir do saldo inicial do lote (1.000,00 C)
+    assert [t['saldo'] for t in transacoes] == [1250.75, 250.25]
+
+
+def test_cnab240_retorno_cobranca_segmentos_t_u():
+    segmento_t = _linha_fixa(240, {
+        (8, 8): '3', (14, 14): 'T', CNAB240_SEGMENTO_T['nosso_numero']: '00000000000000012345',
+        CNAB240_SEGMENTO_T['documento']: 'NF-777'
+    })
+    segmento_u = _linha_fixa(240, {
+        (8, 8): '3', (14, 14): 'U', CNAB240_SEGMENTO_U['valor_pago']: _centavos(99.9, 15),
+        CNAB240_SEGMENTO_U['data_ocorrencia']: '10022025', CNAB240_SEGMENTO_U['data_credito']: '11022025'
+    })
+
+    assert _transacoes(_cnab240(segmento_t, segmento_u), 'cobranca.RET') == [
+        ('2025-02-11', 99.9, 'CREDITO LIQUIDACAO BOLETO 00000000000000012345', 'NF-777'),
+    ]
+
+
+def test_cnab400_retorno_cobranca():
+    header = _linha_fixa(400, {(1, 1): '0', (2, 2): '2', (3, 9): 'RETORNO'})
+    detalhes = [
+        _linha_fixa(400, {
+            (1, 1): '1', CNAB400_DETALHE['data_ocorrencia']: '150225', CNAB400_DETALHE['documento']: 'TIT0000001',
+            CNAB400_DETALHE['valor_pago']: _centavos(350.4, 13), CNAB400_DETALHE['data_credito']: '170225'
+        }),
+        # Sem data de crédito: vale a da ocorrência
+        _linha_fixa(400, {
+            (1, 1): '1', CNAB400_DETALHE['data_ocorrencia']: '160225', CNAB400_DETALHE['documento']: 'TIT0000002',
+            CNAB400_DETALHE['valor_pago']: _centavos(10, 13), CNAB400_DETALHE['data_credito']: '000000'
+        }),
+        # Título sem pagamento: ignorado
+        _linha_fixa(400, {
+            (1, 1): '1', CNAB400_DETALHE['data_ocorrencia']: '160225', CNAB400_DETALHE['documento']: 'TIT0000003',
+            CNAB400_DETALHE['valor_pago']: _centavos(0, 13)
+        }),
+    ]
+    trailer = _linha_fixa(400, {(1, 1): '9'})
+    conteudo = '\n'.join([header, *detalhes, trailer]).encode('latin-1')
+
+    assert _transacoes(conteudo, 'cobranca.ret') == [
+        ('2025-02-17', 350.4, 'CREDITO LIQUIDACAO BOLETO TIT0000001', 'TIT0000001'),
+        ('2025-02-16', 10.0, 'CREDITO LIQUIDACAO BOLETO TIT0000002', 'TIT0000002'),
+    ]
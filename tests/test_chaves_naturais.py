@@ -0,0 +1,59 @@
+# tests/test_chaves_naturais.py
+"""Chave natural das transações: estável entre importações e distinta para lançamentos idênticos"""
+import io
+
+import pandas as pd
+
+from extrato_service import gerar_chaves_naturais, processar_arquivo, processar_csv_em_blocos
+
+CSV = (
+    "Data;Histórico;Documento;Valor (R$);Saldo (R$)\n"
+    "01/02/2025;TARIFA PIX;0;-1,00;999,00\n"
+    "01/02/2025;TARIFA PIX;0;-1,00;998,00\n"
+    "01/02/2025;TARIFA PIX;0;-1,00;997,00\n"
+    "02/02/2025;TARIFA PIX;0;-1,00;996,00\n"
+    "02/02/2025;PIX RECEBIDO CLIENTE;7;50,00;1.046,00\n"
+)
+
+
+def _chaves(conteudo: str):
+    return [t['chave_natural'] for t in processar_arquivo(conteudo.encode('utf-8'), 'extrato.csv', 'AAI')]
+
+
+def test_linhas_identicas_no_mesmo_dia_tem_chaves_distintas():
+    chaves = _chaves(CSV)
+
+    assert len(chaves) == 5
+    assert len(set(chaves)) == 5
+
+
+def test_ordinal_reinicia_a_cada_dia():
+    datas = pd.Series(['2025-02-01', '2025-02-01', '2025-02-02'])
+    documentos, historicos = pd.Series(['0'] * 3), pd.Series(['TARIFA PIX'] * 3)
+    valores = pd.Series([-1.0] * 3)
+
+    primeira_do_dia_1, segunda_do_dia_1, primeira_do_dia_2 = gerar_chaves_naturais(
+        'AAI', datas, documentos, valores, historicos
+    )
+    so_dia_2, = gerar_chaves_naturais('AAI', datas[2:], documentos[2:], valores[2:], historicos[2:])
+
+    assert primeira_do_dia_1 != segunda_do_dia_1
+    assert primeira_do_dia_2 == so_dia_2
+
+
+def test_reimportar_o_mesmo_arquivo_gera_as_mesmas_chaves():
+    assert _chaves(CSV) == _chaves(CSV)
+
+
+def test_chaves_nao_dependem_do_tamanho_do_bloco():
+    inteiro = _chaves(CSV)
+    for linhas_por_bloco in (1, 2, 4):
+        blocos = processar_csv_em_blocos(io.BytesIO(CSV.encode('utf-8')), 'AAI', linhas_por_bloco)
+        assert [t['chave_natural'] for bloco in blocos for t in bloco] == inteiro
+
+
+def test_chave_muda_com_banco_valor_ou_historico():
+    base = _chaves(CSV)[-1]
+    assert processar_arquivo(CSV.encode('utf-8'), 'extrato.csv', 'EDUCAÇÃO')[-1]['chave_natural'] != base
+    assert _chaves(CSV.replace('50,00;', '50,01;'))[-1] != base
+    assert _chaves(CSV.replace('CLIENTE;7', 'CLIENTE B;7'))[-1] != base
@@ -0,0 +1,62 @@
+# tests/test_classificacao.py
+import numpy as np
+import pandas as pd
+import pytest
+
+from extrato_service import (
+    PADROES_CONTRAPARTE, REGRAS_FORMA_PAGAMENTO, REGRAS_TIPO_TRANSACAO, _fallback_contraparte,
+    classificar_historico, classificar_historicos
+)
+
+
+def classificar_por_regras(historico_upper):
+    """Referência: percorre as regras em ordem e fica com a primeira que casa"""
+    if not historico_upper:
+        return 'OUTROS', 'Outros', 'Não identificado'
+    tipo = next((rotulo for termos, rotulo in REGRAS_TIPO_TRANSACAO
+                 if any(termo in historico_upper for termo in termos)), 'OUTROS')
+    forma = next((rotulo for termos, rotulo in REGRAS_FORMA_PAGAMENTO
+                  if any(termo in historico_upper for termo in termos)), 'Outros')
+    contraparte = next((rotulo for padrao, rotulo in PADROES_CONTRAPARTE if padrao in historico_upper), None)
+    return tipo, forma, contraparte or _fallback_contraparte(historico_upper)
+
+
+@pytest.mark.parametrize('historico', [
+    'PIX RECEBIDO TED DEVOLVIDA',           # PIX vem antes de TED
+    'TED ENVIADA PIX',                      # ordem no texto não importa, só a da regra
+    'PAGAMENTO BOLETO ENERGIA',
+    'TARIFA DEBITO AUTOMATICO',             # DEBITO AUTOMATICO contém DEBITO
+    'DÉBITO AUTOMÁTICO CONDOMINIO',
+    'CREDITO SALÁRIO BANCO BRADESCO',       # BRADESCO vem antes de BANCO
+    'DOC TRANSFERENCIA NUBANK',
+    'COMPRA CARTAO POSTO 99',
+    'DEPOSITO EM DINHEIRO',
+    'SAQUE 24H',
+    'CPF 123.456.789-00',
+    'QUALQUER COISA SEM REGRA NENHUMA',
+    '',
+])
+def test_primeira_regra_vence(historico):
+    assert classificar_historico(historico) == classificar_por_regras(historico)
+
+
+def test_historico_ausente_nao_herda_rotulos():
+    historicos = pd.Series(['PIX X', None, 'TED Y', np.nan, 'PAGAMENTO BOLETO ENERGIA'], index=[10, 11, 12, 13, 14])
+
+    tipos, formas, contrapartes = classificar_historicos(historicos)
+
+    assert tipos.tolist() == ['PIX', 'OUTROS', 'TED', 'OUTROS', 'PAGAMENTO']
+    assert formas.tolist() == ['PIX', 'Outros', 'TED', 'Outros', 'Boleto']
+    assert contrapartes.tolist() == [
+        'Transferência PIX', 'Não identificado', 'Transferência TED', 'Não identificado', 'Companhia Energética'
+    ]
+    assert tipos.index.tolist() == historicos.index.tolist()
+
+
+def test_versao_colunar_igual_a_linha_a_linha():
+    historicos = pd.Series(['PIX RECEBIDO', 'TARIFA', 'PIX RECEBIDO', 'ALUGUEL TED', '', 'TARIFA'])
+
+    colunas = classificar_historicos(historicos)
+
+    esperado = [classificar_historico(historico) for historico in historicos]
+    assert list(zip(*(coluna.tolist() for coluna in colunas))) == esperado
@@ -0,0 +1,72 @@
+# tests/test_conciliados.py
+"""Página /conciliados: paginação por cursor (conciliado_em, id) contra o Supabase em memória"""
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from supabase_falso import SupabaseFalso
+
+
+def _conciliada(i, **campos):
+    return {
+        'id': f"c{i:03d}", 'banco': 'AAI', 'status': 'CONCILIADO', 'data': '2025-02-01', 'historico': f"PIX {i}",
+        'valor': 10.0, 'classificacao_id': None, 'plano_contas_id': None, 'item_id': None,
+        'forma_pagamento': 'PIX', 'centro_custo': '', 'nome_recebedor': '', 'data_referencia': None,
+        'conciliado_em': f"2025-02-01T10:00:{i // 5:02d}", 'observacoes': 'não vai para a página', **campos
+    }
+
+
+@pytest.fixture
+def supabase(monkeypatch):
+    falso = SupabaseFalso()
+    falso.admin_client.tabelas['transacoes'] = [
+        *(_conciliada(i) for i in range(23)),
+        _conciliada(90, status='PENDENTE', conciliado_em=None),
+        _conciliada(91, conciliado_em=None),
+    ]
+    monkeypatch.setattr(main, 'supabase', falso)
+    return falso
+
+
+def _todas_as_paginas(tamanho, **filtros):
+    paginas, cursor = [], None
+    while True:
+        paginas.append(main.buscar_pagina_conciliados(tamanho, cursor, **filtros))
+        cursor = paginas[-1][3]
+        if not cursor:
+            return paginas
+
+
+@pytest.mark.parametrize('tamanho', [1, 4, 5, 23, 50])
+def test_empates_no_conciliado_em_nao_repetem_nem_pulam_linhas(supabase, tamanho):
+    paginas = _todas_as_paginas(tamanho)
+    ids = [t['id'] for linhas, _, _, _ in paginas for t in linhas]
+
+    conciliadas = [t for t in supabase.admin_client.tabelas['transacoes'] if t['status'] == 'CONCILIADO' and t['conciliado_em']]
+    assert ids == [t['id'] for t in sorted(conciliadas, key=lambda t: (t['conciliado_em'], t['id']), reverse=True)]
+    assert [offset for _, _, offset, _ in paginas] == list(range(0, 23, tamanho))
+    assert {total for _, total, _, _ in paginas} == {23}
+    assert paginas[-1][3] is None
+
+
+def test_so_as_colunas_da_tabela(supabase):
+    linhas, _, _, _ = main.buscar_pagina_conciliados(5)
+    assert set(linhas[0]) == set(main.COLUNAS_CONCILIADOS.split(','))
+
+
+def test_pagina_com_link_para_a_proxima(supabase, monkeypatch):
+    monkeypatch.setattr(main.cache, 'get_all_lookups', lambda: {'carregados': True})
+    cliente = TestClient(main.app)
+
+    primeira = cliente.get('/conciliados', params={'tamanho': 20})
+    _, _, _, next_cursor = main.buscar_pagina_conciliados(20)
+    ultima = cliente.get('/conciliados', params={'tamanho': 20, 'cursor': next_cursor})
+
+    assert primeira.status_code == ultima.status_code == 200
+    assert 'cursor=' in primeira.text and 'PIX 22' in primeira.text
+    assert 'PIX 0<' in ultima.text and 'PIX 22' not in ultima.text
+
+
+@pytest.mark.parametrize('cursor', ['%%%', 'eyJpZCI6IDF9'])
+def test_cursor_malformado_e_400(supabase, cursor):
+    assert TestClient(main.app).get('/conciliados', params={'cursor': cursor}).status_code == 400
@@ -0,0 +1,203 @@
+# tests/test_contadores.py
+"""
+Contadores por (banco, status) de /api/stats: incrementados a cada inserção e
+conciliação, comparados com uma contagem feita do zero na tabela
+"""
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from cache_service import CacheService, cache
+from supabase_falso import SupabaseFalso
+
+
+class RedisFalso:
+    """Hash do Redis em memória (valores como texto, como com decode_responses); fora_do_ar derruba tudo"""
+
+    def __init__(self):
+        self.hashes = {}
+        self.fora_do_ar = False
+
+    def _verificar(self):
+        if self.fora_do_ar:
+            raise ConnectionError('Redis fora do ar')
+
+    def hgetall(self, chave):
+        self._verificar()
+        return dict(self.hashes.get(chave, {}))
+
+    def pipeline(self):
+        return PipelineFalso(self)
+
+
+class PipelineFalso:
+    def __init__(self, redis):
+        self.redis = redis
+        self.comandos = []
+
+    def hincrby(self, chave, campo, valor):
+        self.comandos.append(lambda hashes: hashes.setdefault(chave, {}).__setitem__(
+            campo, str(int(hashes.get(chave, {}).get(campo, 0)) + valor)
+        ))
+
+    def delete(self, chave):
+        self.comandos.append(lambda hashes: hashes.pop(chave, None))
+
+    def hset(self, chave, mapping):
+        self.comandos.append(lambda hashes: hashes.setdefault(chave, {}).update(
+            {campo: str(valor) for campo, valor in mapping.items()}
+        ))
+
+    def execute(self):
+        self.redis._verificar()
+        for comando in self.comandos:
+            comando(self.redis.hashes)
+
+
+@pytest.fixture(params=['memoria', 'redis'])
+def contadores(request, monkeypatch):
+    """Cache global com contadores zerados, só em memória ou com o Redis em memória"""
+    monkeypatch.setattr(cache, 'contadores', {})
+    monkeypatch.setattr(cache, '_lock_contadores', threading.Lock())
+    redis = RedisFalso() if request.param == 'redis' else None
+    monkeypatch.setattr(cache, 'redis_client', redis)
+    monkeypatch.setattr(cache, 'redis_available', redis is not None)
+    return redis
+
+
+def _contagem(transacoes):
+    """Totais por (banco, status) contados do zero, no formato da view transacoes_estatisticas"""
+    grupos = {}
+    for t in transacoes:
+        grupo = grupos.setdefault((t['banco'], t['status']), {
+            'banco': t['banco'], 'status': t['status'], 'quantidade': 0, 'valor_total': 0.0
+        })
+        grupo['quantidade'] += 1
+        grupo['valor_total'] = round(grupo['valor_total'] + t['valor'], 2)
+    return sorted(grupos.values(), key=lambda g: (g['banco'], g['status']))
+
+
+def _contadores():
+    grupos = cache.get_contadores()
+    return None if grupos is None else sorted(grupos, key=lambda g: (g['banco'], g['status']))
+
+
+def _transacao(i, banco='AAI', status='PENDENTE', valor=10.0):
+    return {'id': f"t{i}", 'banco': banco, 'status': status, 'valor': valor, 'chave_natural': f"c{i}"}
+
+
+def test_variacoes_de_transacoes():
+    transacoes = [_transacao(1, valor=0.1), _transacao(2, valor=0.2), _transacao(3, banco='EDUCAÇÃO', valor=-5.0)]
+
+    assert CacheService._variacoes_contadores(transacoes, 1) == {
+        'AAI|PENDENTE|quantidade': 2, 'AAI|PENDENTE|centavos': 30,
+        'EDUCAÇÃO|PENDENTE|quantidade': 1, 'EDUCAÇÃO|PENDENTE|centavos': -500,
+    }
+    assert CacheService._variacoes_contadores(transacoes[:1], -1, 'CONCILIADO') == {
+        'AAI|CONCILIADO|quantidade': -1, 'AAI|CONCILIADO|centavos': -10,
+    }
+    assert CacheService._variacoes_contadores([{'valor': None}], 1) == {'-|-|quantidade': 1, '-|-|centavos': 0}
+
+
+def test_sem_reconciliacao_nao_ha_contadores(contadores):
+    cache.somar_transacoes_contadores([_transacao(1)])
+    assert cache.get_contadores() is None
+
+
+@pytest.fixture
+def supabase(monkeypatch):
+    falso = SupabaseFalso()
+    banco = falso.admin_client
+    banco.tabelas.update({
+        'transacoes': [_transacao(i, valor=1.5 * i) for i in range(1, 4)] + [_transacao(9, 'EDUCAÇÃO', 'CONCILIADO', 7.25)],
+        'classificacoes': [{'id': 'cl1', 'nome': 'RECEITAS', 'ativo': True}],
+        'planos_contas': [{'id': 'pl1', 'nome': 'VENDAS', 'classificacao_id': 'cl1', 'ativo': True}],
+        'itens': [{'id': 'it1', 'nome': 'PIX', 'plano_contas_id': 'pl1', 'ativo': True}],
+        'usuarios': [{'id': 'u1', 'cargo': 'admin', 'ativo': True}],
+    })
+    monkeypatch.setattr(main, 'supabase', falso)
+    monkeypatch.setattr(main, 'INSERT_TENTATIVAS', 1)
+    return banco
+
+
+def _reconciliar(banco):
+    banco.tabelas['transacoes_estatisticas'] = _contagem(banco.tabelas['transacoes'])
+    return main.reconciliar_contadores_transacoes()
+
+
+def _conciliar(transacao_id):
+    return TestClient(main.app).post('/api/conciliar', json={
+        'transacao_id': transacao_id, 'classificacao': 'RECEITAS', 'plano_contas': 'VENDAS', 'item': 'PIX',
+        'forma_pagamento': 'PIX', 'banco_origem': 'AAI', 'centro_custo': '', 'data_pagamento': '2025-02-01'
+    })
+
+
+def test_contadores_acompanham_insercao_e_conciliacao(contadores, supabase):
+    _reconciliar(supabase)
+    assert _contadores() == _contagem(supabase.tabelas['transacoes'])
+
+    # Inserção: só as linhas realmente inseridas contam (a chave c1 já existe)
+    lote = [_transacao(1), _transacao(4, valor=0.1), _transacao(5, 'EDUCAÇÃO', valor=0.2)]
+    resultado = main.inserir_lote(1, lote)
+    assert (resultado['salvas'], resultado['ignoradas']) == (2, 1)
+    assert _contadores() == _contagem(supabase.tabelas['transacoes'])
+
+    # Conciliação: PENDENTE -> CONCILIADO
+    assert _conciliar('t2').status_code == 200
+    assert _contadores() == _contagem(supabase.tabelas['transacoes'])
+
+    # Conciliar de novo é recusado e não mexe nos contadores
+    assert _conciliar('t2').status_code == 400
+    assert _contadores() == _contagem(supabase.tabelas['transacoes'])
+
+    # Nada a corrigir na reconciliação
+    assert cache.reconciliar_contadores(_contagem(supabase.tabelas['transacoes'])) == 0
+
+
+def test_reconciliacao_corrige_deriva(contadores, supabase):
+    _reconciliar(supabase)
+    # Linha gravada por fora da API: os contadores não ficam sabendo
+    supabase.tabelas['transacoes'].append(_transacao(7, valor=3.0))
+    assert _contadores() != _contagem(supabase.tabelas['transacoes'])
+
+    assert cache.reconciliar_contadores(_contagem(supabase.tabelas['transacoes'])) == 1
+    assert _contadores() == _contagem(supabase.tabelas['transacoes'])
+
+
+def test_stats_reconcilia_quando_nao_ha_contadores(contadores, supabase):
+    supabase.tabelas['transacoes_estatisticas'] = _contagem(supabase.tabelas['transacoes'])
+    stats = TestClient(main.app).get('/api/stats').json()
+
+    assert _contadores() == _contagem(supabase.tabelas['transacoes'])
+    assert stats == main.montar_stats(_contagem(supabase.tabelas['transacoes']))
+
+
+def test_redis_fora_do_ar_usa_contadores_em_memoria(monkeypatch, supabase):
+    redis = RedisFalso()
+    monkeypatch.setattr(cache, 'contadores', {})
+    monkeypatch.setattr(cache, 'redis_client', redis)
+    monkeypatch.setattr(cache, 'redis_available', True)
+
+    # A reconciliação grava no Redis e na memória
+    _reconciliar(supabase)
+    assert redis.hashes[CacheService.CHAVE_CONTADORES]
+
+    # Com o Redis fora, os incrementos caem na memória, que ficou sem os feitos no Redis
+    main.inserir_lote(1, [_transacao(4)])
+    redis.fora_do_ar = True
+    main.inserir_lote(2, [_transacao(5)])
+    assert _conciliar('t1').status_code == 200
+
+    esperado = _contagem(supabase.tabelas['transacoes'])
+    assert _contadores() != esperado
+    # A reconciliação seguinte (Redis ainda fora) corrige a memória
+    assert _reconciliar(supabase) is not None
+    assert _contadores() == esperado
+
+    # Redis de volta: ele não viu a última reconciliação e diverge até a próxima
+    redis.fora_do_ar = False
+    assert _contadores() != esperado
+    _reconciliar(supabase)
+    assert _contadores() == esperado
@@ -0,0 +1,96 @@
+# tests/test_dialeto_csv.py
+"""Detecção de encoding e separador do CSV pela amostra e reuso do dialeto já conhecido"""
+import pytest
+
+from extrato_service import TAMANHO_AMOSTRA_CSV, detectar_dialeto_csv, dialeto_compativel, ler_csv
+
+LINHAS = [
+    ['Data', 'Histórico', 'Documento', 'Valor (R$)', 'Saldo (R$)'],
+    ['01/02/2025', 'PIX RECEBIDO JOÃO', '1', '100,00', '1.100,00'],
+    ['02/02/2025', 'TARIFA SERVIÇOS', '2', '-10,00', '1.090,00'],
+]
+
+
+def _csv(sep, encoding='utf-8', linhas=LINHAS):
+    return ''.join(sep.join(linha) + '\r\n' for linha in linhas).encode(encoding)
+
+
+def _amostra(conteudo):
+    return conteudo[:TAMANHO_AMOSTRA_CSV]
+
+
+@pytest.mark.parametrize('sep', [';', ',', '\t'])
+def test_separador(sep):
+    assert detectar_dialeto_csv(_amostra(_csv(sep))) == ('utf-8', sep)
+
+
+def test_ponto_e_virgula_com_virgula_decimal():
+    # Vírgulas nos valores não pesam: o separador sai da linha de cabeçalho
+    assert detectar_dialeto_csv(_csv(';'))[1] == ';'
+
+
+def test_campos_entre_aspas_com_o_outro_separador():
+    linhas = [
+        LINHAS[0],
+        ['01/02/2025', '"PIX; REF; 1; 2; 3"', '1', '"100,00"', '"1.100,00"'],
+        ['02/02/2025', '"TED; CLIENTE; A; B"', '2', '"-10,00"', '"1.090,00"'],
+    ]
+    conteudo = _csv(',', linhas=linhas)
+
+    dialeto = detectar_dialeto_csv(_amostra(conteudo))
+    df = ler_csv(conteudo, dialeto)
+
+    assert dialeto == ('utf-8', ',')
+    assert df['Histórico'].tolist() == ['PIX; REF; 1; 2; 3', 'TED; CLIENTE; A; B']
+    assert df['Valor (R$)'].tolist() == ['100,00', '-10,00']
+
+
+def test_cabecalho_entre_aspas_com_o_separador_dentro():
+    linhas = [['"Data"', '"Histórico; detalhado"', '"Valor (R$)"'], ['01/02/2025', '"PIX"', '"1,00"']]
+    conteudo = _csv(',', linhas=linhas)
+
+    assert detectar_dialeto_csv(conteudo) == ('utf-8', ',')
+    assert list(ler_csv(conteudo).columns) == ['Data', 'Histórico; detalhado', 'Valor (R$)']
+
+
+def test_arquivo_latin1():
+    conteudo = _csv(';', 'latin-1')
+
+    dialeto = detectar_dialeto_csv(_amostra(conteudo))
+    df = ler_csv(conteudo, dialeto)
+
+    assert dialeto == ('latin-1', ';')
+    assert 'Histórico' in df.columns
+    assert df['Histórico'].tolist() == ['PIX RECEBIDO JOÃO', 'TARIFA SERVIÇOS']
+
+
+def test_utf8_com_bom():
+    encoding, sep = detectar_dialeto_csv(b'\xef\xbb\xbf' + _csv(';'))
+    assert (encoding, sep) == ('utf-8-sig', ';')
+
+
+def test_amostra_cortada_no_meio_de_um_caractere_utf8():
+    conteudo = _csv(';')
+    corte = conteudo.index('Ã'.encode('utf-8')) + 1
+    assert detectar_dialeto_csv(conteudo[:corte])[0] == 'utf-8'
+
+
+def test_sem_separador_reconhecido():
+    with pytest.raises(ValueError):
+        detectar_dialeto_csv(b'Data|Historico|Valor\n01/02/2025|PIX|1,00\n')
+
+
+@pytest.mark.parametrize('conteudo, dialeto, compativel', [
+    (_csv(';'), ('utf-8', ';'), True),
+    (_csv(','), ('utf-8', ';'), False),
+    (_csv(';', 'latin-1'), ('latin-1', ';'), True),
+    (_csv(';', 'latin-1'), ('cp1252', ';'), True),
+    # latin-1 decodifica qualquer byte, mas o arquivo é UTF-8
+    (_csv(';'), ('latin-1', ';'), False),
+    # Byte de latin-1 inválido em UTF-8
+    (_csv(';', 'latin-1'), ('utf-8', ';'), False),
+    (_csv(';', linhas=[['Data', 'Descrição', 'Valor (R$)']]), ('utf-8', ';'), False),
+    (_csv(';'), ('encoding-inexistente', ';'), False),
+])
+def test_dialeto_conhecido(conteudo, dialeto, compativel):
+    assert dialeto_compativel(_amostra(conteudo), dialeto) is compativel
@@ -0,0 +1,97 @@
+# tests/test_importacao_extrato.py
+"""
+Importação de um extrato contra o Supabase em memória: o extrato só fica
+PROCESSADO (e deduplicável pelo hash) quando todos os lotes foram salvos
+"""
+import pytest
+
+import main
+from supabase_falso import SupabaseFalso
+from upload_jobs import UploadJob
+
+CSV = (
+    "Data;Histórico;Documento;Valor (R$);Saldo (R$)\n"
+    "01/02/2025;PIX RECEBIDO CLIENTE A;1;100,00;1.100,00\n"
+    "02/02/2025;PIX ENVIADO FORNECEDOR;2;-50,00;1.050,00\n"
+    "03/02/2025;TED RECEBIDA CLIENTE B;3;200,00;1.250,00\n"
+    "04/02/2025;TARIFA BANCARIA;4;-10,00;1.240,00\n"
+)
+
+
+@pytest.fixture
+def supabase(monkeypatch):
+    falso = SupabaseFalso()
+    monkeypatch.setattr(main, 'supabase', falso)
+    monkeypatch.setattr(main, 'INSERT_TAMANHO_LOTE', 2)
+    monkeypatch.setattr(main, 'INSERT_TENTATIVAS', 1)
+    return falso
+
+
+@pytest.fixture(params=['em_memoria', 'em_blocos'])
+def caminho_extrato(request, tmp_path, monkeypatch):
+    if request.param == 'em_blocos':
+        monkeypatch.setattr(main, 'UPLOAD_STREAMING_MIN_BYTES', 0)
+    caminho = tmp_path / 'extrato.csv'
+    caminho.write_bytes(CSV.encode('utf-8'))
+    return str(caminho)
+
+
+def _importar(caminho):
+    return main.importar_arquivo(caminho, 'extrato.csv', 'AAI', UploadJob('extrato.csv', 'AAI'), 'sha-do-arquivo')
+
+
+def _falhar_lote_com(historico):
+    def antes_de_executar(consulta):
+        if consulta.operacao == 'upsert' and any(t['historico'] == historico for t in consulta.dados):
+            raise RuntimeError('timeout do Supabase')
+    return antes_de_executar
+
+
+def test_lote_com_erro_deixa_extrato_parcial_e_reenvio_completa(supabase, caminho_extrato):
+    banco = supabase.admin_client
+    banco.antes_de_executar = _falhar_lote_com('TARIFA BANCARIA')
+
+    resumo = _importar(caminho_extrato)
+
+    assert resumo['status'] == 'PARCIAL'
+    assert (resumo['transacoes_salvas'], resumo['transacoes_com_erro']) == (2, 2)
+    extrato, = banco.tabelas['extratos']
+    assert extrato['status'] == 'PARCIAL' and extrato['arquivo_sha256'] is None
+    assert main.buscar_extrato_duplicado('sha-do-arquivo', 'AAI') is None
+
+    # Mesmo arquivo de novo: não é tratado como duplicado e as transações que faltavam entram
+    banco.antes_de_executar = None
+    resumo = _importar(caminho_extrato)
+
+    assert not resumo.get('duplicado')
+    assert resumo['status'] == 'PROCESSADO'
+    assert (resumo['transacoes_salvas'], resumo['transacoes_ignoradas']) == (2, 2)
+    assert len(banco.tabelas['transacoes']) == 4
+    assert main.buscar_extrato_duplicado('sha-do-arquivo', 'AAI')['id'] == resumo['extrato_id']
+
+    # A partir daqui o hash deduplica
+    assert _importar(caminho_extrato)['duplicado'] is True
+
+
+def test_todos_os_lotes_salvos_marca_processado_com_hash(supabase, caminho_extrato):
+    resumo = _importar(caminho_extrato)
+
+    assert resumo['status'] == 'PROCESSADO'
+    assert resumo['transacoes_com_erro'] == 0
+    extrato, = supabase.admin_client.tabelas['extratos']
+    assert (extrato['status'], extrato['arquivo_sha256']) == ('PROCESSADO', 'sha-do-arquivo')
+
+
+def test_lote_so_com_transacoes_existentes_nao_e_tentado_de_novo(supabase, monkeypatch):
+    # Resposta vazia do upsert = todas as chaves naturais já existiam, não falha
+    monkeypatch.setattr(main, 'INSERT_TENTATIVAS', 3)
+    monkeypatch.setattr(main, 'INSERT_BACKOFF_SEGUNDOS', 0)
+    banco = supabase.admin_client
+    banco.tabelas['transacoes'] = [{'id': 'a', 'chave_natural': 'c1'}, {'id': 'b', 'chave_natural': 'c2'}]
+    upserts = []
+    banco.antes_de_executar = lambda consulta: upserts.append(consulta) if consulta.operacao == 'upsert' else None
+
+    resultado = main.inserir_lote(1, [{'id': 'x', 'chave_natural': 'c1'}, {'id': 'y', 'chave_natural': 'c2'}])
+
+    assert (resultado['salvas'], resultado['ignoradas'], resultado['erro']) == (0, 2, None)
+    assert resultado['tentativas'] == len(upserts) == 1
@@ -0,0 +1,118 @@
+# tests/test_importacao_incremental.py
+"""Importação incremental: só as linhas depois da última já importada do banco (âncora)"""
+import io
+
+import pytest
+
+import main
+from extrato_service import novo_relatorio_valores, processar_arquivo, processar_csv_em_blocos
+from supabase_falso import SupabaseFalso
+from upload_jobs import UploadJob
+
+CABECALHO = 'Data;Histórico;Documento;Valor (R$);Saldo (R$)\n'
+
+# Mais antigo primeiro; saldo encadeado a partir de 1.000,00
+LINHAS = [
+    ('01/02/2025', 'PIX RECEBIDO A', '1', '100,00', '1.100,00'),
+    ('02/02/2025', 'TARIFA', '2', '-10,00', '1.090,00'),
+    ('03/02/2025', 'PIX ENVIADO B', '3', '-40,00', '1.050,00'),
+    ('04/02/2025', 'PIX ENVIADO C', '4', '-50,00', '1.000,00'),
+    ('05/02/2025', 'TED RECEBIDA D', '5', '300,00', '1.300,00'),
+    ('06/02/2025', 'PIX ENVIADO E', '6', '-20,00', '1.280,00'),
+]
+# Última linha do extrato anterior: o PIX ENVIADO B, no meio do arquivo
+ANCORA = {'data': '2025-02-03', 'valor': -40.0, 'saldo': 1050.0}
+AUSENTE = {'data': '2025-01-15', 'valor': -1.0, 'saldo': 900.0}
+
+
+def _csv(linhas):
+    return (CABECALHO + ''.join(';'.join(linha) + '\n' for linha in linhas)).encode('utf-8')
+
+
+def _documentos(transacoes):
+    return [t['documento'] for t in transacoes]
+
+
+def _em_blocos(conteudo, ancora, relatorio, linhas_por_bloco=2):
+    blocos = processar_csv_em_blocos(io.BytesIO(conteudo), 'AAI', linhas_por_bloco, relatorio=relatorio, ancora=ancora)
+    return [t for bloco in blocos for t in bloco]
+
+
+@pytest.mark.parametrize('linhas, novas', [(LINHAS, ['4', '5', '6']), (LINHAS[::-1], ['6', '5', '4'])])
+def test_ancora_no_meio_do_arquivo_em_memoria(linhas, novas):
+    relatorio = novo_relatorio_valores()
+    transacoes = processar_arquivo(_csv(linhas), 'extrato.csv', 'AAI', relatorio=relatorio, ancora=ANCORA)
+
+    assert _documentos(transacoes) == novas
+    assert relatorio['linhas_ja_importadas'] == 3
+    # Mesmas chaves de quando o arquivo é importado inteiro
+    inteiro = {t['documento']: t['chave_natural'] for t in processar_arquivo(_csv(linhas), 'extrato.csv', 'AAI')}
+    assert [t['chave_natural'] for t in transacoes] == [inteiro[d] for d in novas]
+
+
+@pytest.mark.parametrize('linhas_por_bloco', [1, 2, 4, 10])
+def test_ancora_no_meio_do_arquivo_decrescente_em_blocos(linhas_por_bloco):
+    relatorio = novo_relatorio_valores()
+    transacoes = _em_blocos(_csv(LINHAS[::-1]), ANCORA, relatorio, linhas_por_bloco)
+
+    # Bloco de uma linha não tem cadeia de saldo para dizer a ordem: arquivo inteiro
+    novas = ['6', '5', '4', '3', '2', '1'] if linhas_por_bloco == 1 else ['6', '5', '4']
+    assert _documentos(transacoes) == novas
+    inteiro = processar_arquivo(_csv(LINHAS[::-1]), 'extrato.csv', 'AAI')
+    assert [t['chave_natural'] for t in transacoes] == [t['chave_natural'] for t in inteiro[:len(novas)]]
+
+
+def test_leitura_em_blocos_para_no_bloco_da_ancora():
+    relatorio = novo_relatorio_valores()
+    # Linhas depois da âncora com data inválida: seriam descartadas se fossem lidas
+    linhas = LINHAS[::-1] + [('xx/02/2025', 'LIXO', '9', '1,00', '1,00')] * 4
+    transacoes = _em_blocos(_csv(linhas), ANCORA, relatorio)
+
+    assert _documentos(transacoes) == ['6', '5', '4']
+    assert relatorio['linhas_ja_importadas'] == 1
+    assert relatorio['linhas_descartadas'] == 0
+
+
+def test_ancora_em_arquivo_crescente_em_blocos_importa_tudo():
+    # As linhas antigas saem antes de a âncora aparecer (a chave natural as ignora no banco)
+    relatorio = novo_relatorio_valores()
+    assert _documentos(_em_blocos(_csv(LINHAS), ANCORA, relatorio)) == ['1', '2', '3', '4', '5', '6']
+    assert relatorio['linhas_ja_importadas'] == 0
+
+
+@pytest.mark.parametrize('linhas', [LINHAS, LINHAS[::-1]])
+def test_ancora_ausente_importa_o_arquivo_inteiro(linhas):
+    relatorio = novo_relatorio_valores()
+    em_memoria = processar_arquivo(_csv(linhas), 'extrato.csv', 'AAI', relatorio=relatorio, ancora=AUSENTE)
+    em_blocos = _em_blocos(_csv(linhas), AUSENTE, relatorio)
+
+    assert _documentos(em_memoria) == _documentos(em_blocos) == [linha[2] for linha in linhas]
+    assert relatorio['linhas_ja_importadas'] == 0
+
+
+@pytest.fixture
+def supabase(monkeypatch):
+    falso = SupabaseFalso()
+    falso.admin_client.tabelas['extratos'] = [{
+        'id': 'anterior', 'banco': 'AAI', 'status': 'PROCESSADO', 'arquivo_sha256': 'sha-anterior',
+        'resumo': {'integridade': {'ultima': ANCORA}}
+    }]
+    monkeypatch.setattr(main, 'supabase', falso)
+    return falso
+
+
+@pytest.mark.parametrize('streaming_min_bytes', [0, 10 ** 9])
+def test_importacao_de_arquivo_decrescente_salva_so_as_linhas_novas(supabase, tmp_path, monkeypatch,
+                                                                    streaming_min_bytes):
+    monkeypatch.setattr(main, 'UPLOAD_STREAMING_MIN_BYTES', streaming_min_bytes)
+    monkeypatch.setattr(main, 'UPLOAD_LINHAS_POR_BLOCO', 2)
+    caminho = tmp_path / 'extrato.csv'
+    caminho.write_bytes(_csv(LINHAS[::-1]))
+
+    resumo = main.importar_arquivo(str(caminho), 'extrato.csv', 'AAI', UploadJob('extrato.csv', 'AAI'), 'sha-novo')
+
+    assert resumo['status'] == 'PROCESSADO'
+    assert sorted(t['documento'] for t in supabase.admin_client.tabelas['transacoes']) == ['4', '5', '6']
+    assert resumo['incremental']['ancora']['data'] == ANCORA['data']
+    # Saldo conferido a partir da âncora: 1.050,00 - 50,00 = 1.000,00
+    assert resumo['integridade']['descontinuidade_anterior'] is None
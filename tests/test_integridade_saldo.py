@@ -0,0 +1,88 @@
+# tests/test_integridade_saldo.py
+"""Continuidade do saldo (saldo anterior + valores = saldo), com linhas sem saldo informado"""
+import pytest
+
+from extrato_service import (
+    concluir_integridade_saldo, nova_integridade_saldo, processar_arquivo, verificar_continuidade_saldo
+)
+
+CABECALHO = 'Data;Histórico;Documento;Valor (R$);Saldo (R$)\n'
+
+
+def _transacoes(linhas):
+    conteudo = CABECALHO + ''.join(';'.join(linha) + '\n' for linha in linhas)
+    return processar_arquivo(conteudo.encode('utf-8'), 'extrato.csv', 'AAI')
+
+
+def _integridade(transacoes, tamanho_bloco=None, anterior=None):
+    integridade = nova_integridade_saldo()
+    tamanho_bloco = tamanho_bloco or len(transacoes)
+    for inicio in range(0, len(transacoes), tamanho_bloco):
+        verificar_continuidade_saldo(integridade, transacoes[inicio:inicio + tamanho_bloco])
+    return concluir_integridade_saldo(integridade, anterior)
+
+
+# Saldo só no fim de cada dia, como em muitos extratos
+SALDO_POR_DIA = [
+    ('01/02/2025', 'PIX RECEBIDO A', '1', '100,00', ''),
+    ('01/02/2025', 'TARIFA', '2', '-10,00', '1.090,00'),
+    ('02/02/2025', 'PIX ENVIADO B', '3', '-40,00', ''),
+    ('02/02/2025', 'PIX ENVIADO C', '4', '-50,00', '1.000,00'),
+]
+
+
+def test_saldo_em_branco_vira_none():
+    transacoes = _transacoes(SALDO_POR_DIA)
+    assert [t['saldo'] for t in transacoes] == [None, 1090.0, None, 1000.0]
+
+
+@pytest.mark.parametrize('tamanho_bloco', [None, 1, 3])
+def test_saldo_em_branco_nao_conta_como_quebra(tamanho_bloco):
+    integridade = _integridade(_transacoes(SALDO_POR_DIA), tamanho_bloco)
+
+    assert (integridade['lacunas'], integridade['duplicadas']) == (0, 0)
+    assert integridade['linhas_sem_saldo'] == 2
+    assert integridade['verificado'] and integridade['consistente']
+    assert integridade['primeira']['saldo'] == 1090.0 and integridade['ultima']['saldo'] == 1000.0
+
+
+@pytest.mark.parametrize('tamanho_bloco', [None, 3])
+def test_saldo_em_branco_em_arquivo_decrescente(tamanho_bloco):
+    integridade = _integridade(_transacoes(SALDO_POR_DIA[::-1]), tamanho_bloco)
+
+    assert integridade['ordem'] == 'decrescente'
+    assert integridade['lacunas'] == 0 and integridade['consistente']
+
+
+def test_lacuna_real_entre_saldos_conhecidos():
+    # Falta um lançamento de -25,00 entre os saldos de 1.090,00 e 1.000,00
+    linhas = [*SALDO_POR_DIA[:3], ('02/02/2025', 'PIX ENVIADO C', '4', '-50,00', '975,00')]
+    linhas = [*linhas, ('03/02/2025', 'PIX RECEBIDO D', '5', '25,00', '1.000,00')]
+    integridade = _integridade(_transacoes(linhas))
+
+    assert integridade['lacunas'] == 1
+    assert not integridade['consistente']
+    exemplo, = integridade['exemplos']
+    assert (exemplo['saldo_informado'], exemplo['saldo_esperado']) == (975.0, 1000.0)
+
+
+def test_arquivo_consistente():
+    linhas = [
+        ('01/02/2025', 'PIX RECEBIDO A', '1', '100,00', '1.100,00'),
+        ('01/02/2025', 'TARIFA', '2', '-10,00', '1.090,00'),
+        ('02/02/2025', 'PIX ENVIADO B', '3', '-90,00', '1.000,00'),
+    ]
+    integridade = _integridade(_transacoes(linhas))
+
+    assert integridade['linhas_verificadas'] == 2
+    assert integridade['linhas_sem_saldo'] == 0
+    assert integridade['consistente']
+
+
+def test_linhas_sem_saldo_antes_da_primeira_contam_na_continuidade_com_o_anterior():
+    anterior = {'data': '2025-01-31', 'valor': 0.0, 'saldo': 1000.0}
+    integridade = _integridade(_transacoes(SALDO_POR_DIA), anterior=anterior)
+    assert integridade['descontinuidade_anterior'] is None
+
+    integridade = _integridade(_transacoes(SALDO_POR_DIA), anterior={**anterior, 'saldo': 900.0})
+    assert integridade['descontinuidade_anterior']['saldo_esperado'] == 990.0
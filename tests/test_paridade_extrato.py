@@ -0,0 +1,147 @@
+# tests/test_paridade_extrato.py
+"""
+Paridade do motor colunar (extrato_service.processar_arquivo) com a leitura
+linha a linha que ele substituiu (tests/referencia_linha_a_linha.py).
+
+A referência passa por duas normalizações que o motor aplica de propósito
+desde o user-011: data e data_pagamento em ISO (AAAA-MM-DD) e documento
+numérico sem o '.0' do float. Saldo em branco sai como None (desconhecido)
+onde a referência tinha 0.0. Fora isso, os dicts devem ser idênticos
+"""
+import io
+import tracemalloc
+from datetime import datetime
+
+import pytest
+from openpyxl import Workbook
+
+import referencia_linha_a_linha as referencia
+from extrato_service import FORMATOS_DATA, ler_csv, processar_arquivo, processar_csv_em_blocos
+
+CABECALHO = ['Data', 'Histórico', 'Documento', 'Valor (R$)', 'Saldo (R$)']
+
+# Células vazias em todas as colunas, saldo anterior, valores com milhar, 'R$' e '-'
+LINHAS = [
+    [None, 'SALDO ANTERIOR', None, None, '1.000,00'],
+    ['01/02/2025', 'PIX RECEBIDO FULANO', '123', '1.234,56', '2.234,56'],
+    ['01/02/2025', 'TARIFA BANCARIA', None, '-12,50', '2.222,06'],
+    ['02/02/2025', None, None, '-5,00', None],
+    ['03/02/2025', 'PAGAMENTO BOLETO ENERGIA', '00045', 'R$ -100,00', '2.117,06'],
+    [None, 'LINHA SEM DATA', None, '1,00', None],
+    ['04/02/2025', 'TED ENVIADA 123.456.789-00', None, '-', '2.117,06'],
+    ['05/02/2025', 'Compra cartão posto 99 centro', '77', '-50,5', '2.066,56'],
+    ['06/02/2025', 'DEBITO AUTOMATICO CONDOMINIO', 'ABC-1', '-300,00', None],
+    ['07/02/2025', 'CREDITO SALÁRIO BANCO BRADESCO', None, '5.000,00', '6.766,56'],
+]
+
+# Campos gerados a cada execução
+CAMPOS_VOLATEIS = ('id', 'created_at')
+
+
+def _data_iso(texto: str) -> str:
+    for formato in FORMATOS_DATA:
+        try:
+            return datetime.strptime(texto, formato).strftime('%Y-%m-%d')
+        except ValueError:
+            continue
+    return texto
+
+
+def _normalizar_referencia(transacao: dict) -> dict:
+    transacao = {campo: valor for campo, valor in transacao.items() if campo not in CAMPOS_VOLATEIS}
+    transacao['data'] = transacao['data_pagamento'] = _data_iso(transacao['data'])
+    documento = transacao['documento']
+    if documento.endswith('.0') and documento[:-2].isdigit():
+        transacao['documento'] = documento[:-2]
+    return transacao
+
+
+def assert_paridade(conteudo: bytes, filename: str, banco: str):
+    esperadas = [_normalizar_referencia(t) for t in referencia.processar_arquivo(conteudo, filename, banco)]
+    obtidas = processar_arquivo(conteudo, filename, banco)
+
+    assert len(obtidas) == len(esperadas)
+    for esperada, obtida in zip(esperadas, obtidas):
+        obtida = {campo: obtida.get(campo) for campo in esperada}
+        if obtida['saldo'] is None:
+            obtida['saldo'] = 0.0
+        assert obtida == esperada
+
+
+def _csv(linhas, sep=';') -> str:
+    return '\n'.join(sep.join('' if celula is None else celula for celula in linha) for linha in [CABECALHO, *linhas]) + '\n'
+
+
+@pytest.mark.parametrize('banco', ['AAI', 'EDUCAÇÃO'])
+@pytest.mark.parametrize('encoding', ['utf-8', 'latin-1'])
+def test_paridade_csv(banco, encoding):
+    assert_paridade(_csv(LINHAS).encode(encoding), 'extrato.csv', banco)
+
+
+def test_paridade_csv_separador_tab():
+    assert_paridade(_csv(LINHAS, sep='\t').encode('utf-8'), 'extrato.csv', 'AAI')
+
+
+def _xlsx(linhas) -> bytes:
+    planilha = Workbook()
+    aba = planilha.active
+    aba.append(CABECALHO)
+    for data, historico, documento, valor, saldo in linhas:
+        aba.append([
+            datetime.strptime(data, '%d/%m/%Y') if data else None,
+            historico,
+            int(documento) if documento and documento.isdigit() else documento,
+            float(valor.replace('R$', '').replace('.', '').replace(',', '.')) if valor and valor != '-' else valor,
+            float(saldo.replace('.', '').replace(',', '.')) if saldo else None,
+        ])
+    saida = io.BytesIO()
+    planilha.save(saida)
+    return saida.getvalue()
+
+
+@pytest.mark.parametrize('banco', ['AAI', 'EDUCAÇÃO'])
+def test_paridade_xlsx(banco):
+    assert_paridade(_xlsx(LINHAS), 'extrato.xlsx', banco)
+
+
+# Pico de memória aceito na leitura do arquivo em disco, em múltiplos do tamanho do arquivo
+MULTIPLO_MAXIMO_MEMORIA = 3
+
+
+def _escrever_csv(caminho, quantidade: int):
+    with open(caminho, 'w', encoding='utf-8') as arquivo:
+        arquivo.write(';'.join(CABECALHO) + '\n')
+        for i in range(quantidade):
+            arquivo.write(f"{1 + i % 28:02d}/02/2025;PIX RECEBIDO CLIENTE {i % 500};{i};-1.234,{i % 100:02d};9.876,54\n")
+    return caminho
+
+
+def _pico_memoria(funcao) -> int:
+    tracemalloc.start()
+    try:
+        funcao()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def _pico_em_blocos(caminho) -> int:
+    def consumir():
+        with open(caminho, 'rb') as arquivo:
+            for _ in processar_csv_em_blocos(arquivo, 'AAI', 2000, ('utf-8', ';')):
+                pass
+    return _pico_memoria(consumir)
+
+
+def test_memoria_csv_em_disco(tmp_path):
+    """O CSV em disco é lido via mmap, sem cópias do tamanho do arquivo (bytes, texto decodificado)"""
+    caminho = _escrever_csv(tmp_path / 'extrato.csv', 60000)
+    pico = _pico_memoria(lambda: ler_csv(str(caminho), ('utf-8', ';')))
+    assert pico <= MULTIPLO_MAXIMO_MEMORIA * caminho.stat().st_size
+
+
+def test_memoria_csv_em_blocos_nao_cresce_com_arquivo(tmp_path):
+    """No upload grande o pico depende do tamanho do bloco, não do arquivo: dobrar as linhas não dobra a memória"""
+    pico_menor = _pico_em_blocos(_escrever_csv(tmp_path / 'menor.csv', 20000))
+    pico_maior = _pico_em_blocos(_escrever_csv(tmp_path / 'maior.csv', 40000))
+    assert pico_maior <= 1.3 * pico_menor
@@ -0,0 +1,40 @@
+# tests/test_pendentes.py
+"""Página /pendentes: filtro por tipo de transação contra o Supabase em memória"""
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from extrato_service import REGRAS_TIPO_TRANSACAO, classificar_historicos
+from supabase_falso import SupabaseFalso
+
+
+def test_filtro_oferece_todos_os_tipos_da_importacao():
+    historicos = [termo for termos, _ in REGRAS_TIPO_TRANSACAO for termo in termos] + ['SEM REGRA', '']
+    tipos, _, _ = classificar_historicos(pd.Series(historicos))
+
+    assert set(tipos) == set(main.TIPOS_PENDENTES)
+    assert {'CRÉDITO', 'OUTROS'} <= set(main.TIPOS_PENDENTES)
+
+
+@pytest.fixture
+def cliente(monkeypatch):
+    falso = SupabaseFalso()
+    falso.admin_client.tabelas['transacoes'] = [
+        {'id': f"t{i}", 'banco': 'AAI', 'data': '2025-02-01', 'historico': historico, 'tipo_transacao': tipo,
+         'valor': 1.0, 'status': 'PENDENTE', 'created_at': f"2025-02-01T00:00:0{i}"}
+        for i, (historico, tipo) in enumerate([
+            ('CREDITO SALARIO', 'CRÉDITO'), ('ESTORNO X', 'OUTROS'), ('PIX RECEBIDO', 'PIX')
+        ])
+    ]
+    monkeypatch.setattr(main, 'supabase', falso)
+    return TestClient(main.app)
+
+
+@pytest.mark.parametrize('tipo, historico', [('CRÉDITO', 'CREDITO SALARIO'), ('OUTROS', 'ESTORNO X')])
+def test_filtrar_por_credito_e_outros(cliente, tipo, historico):
+    pagina = cliente.get('/pendentes', params={'tipo': tipo}).text
+
+    assert f'<option value="{tipo}" selected>' in pagina
+    assert historico in pagina
+    assert 'PIX RECEBIDO' not in pagina
@@ -0,0 +1,124 @@
+# tests/test_upload_lote.py
+"""Upload em lote: limite de uploads em andamento e extração do .zip"""
+import os
+import threading
+import time
+import zipfile
+
+import pytest
+from fastapi import HTTPException
+
+import main
+
+
+@pytest.fixture
+def vagas(monkeypatch):
+    vagas = threading.BoundedSemaphore(2)
+    monkeypatch.setattr(main, '_vagas_upload', vagas)
+    monkeypatch.setattr(main, 'LOTE_CONCORRENCIA', 4)
+    return vagas
+
+
+@pytest.fixture
+def em_andamento(monkeypatch):
+    """Registra o máximo de importações simultâneas de processar_job_upload"""
+    estado = {'atual': 0, 'maximo': 0, 'arquivos': []}
+    trava = threading.Lock()
+
+    def processar_job_upload(job, caminho, sha256, filename, banco):
+        with trava:
+            estado['atual'] += 1
+            estado['maximo'] = max(estado['maximo'], estado['atual'])
+            estado['arquivos'].append(filename)
+        time.sleep(0.05)
+        with trava:
+            estado['atual'] -= 1
+
+    monkeypatch.setattr(main, 'processar_job_upload', processar_job_upload)
+    return estado
+
+
+def _itens(quantidade):
+    return [(None, f"/tmp/{i}.csv", 'sha', f"{i}.csv", 'AAI') for i in range(quantidade)]
+
+
+def _vagas_livres(vagas):
+    livres = 0
+    while vagas.acquire(blocking=False):
+        livres += 1
+    for _ in range(livres):
+        vagas.release()
+    return livres
+
+
+def test_lote_ocupa_uma_vaga_por_arquivo(vagas, em_andamento):
+    vagas.acquire()  # vaga tomada na requisição do lote
+    main.executar_lote_upload(_itens(6))
+
+    assert em_andamento['maximo'] == 2
+    assert len(em_andamento['arquivos']) == 6
+    assert _vagas_livres(vagas) == 2
+
+
+def test_lote_divide_as_vagas_com_outros_uploads(vagas, em_andamento):
+    vagas.acquire()  # upload avulso em andamento
+    vagas.acquire()  # vaga tomada na requisição do lote
+    main.executar_lote_upload(_itens(4))
+
+    assert em_andamento['maximo'] == 1
+    vagas.release()
+    assert _vagas_livres(vagas) == 2
+
+
+def _zip(caminho, membros):
+    with zipfile.ZipFile(caminho, 'w', zipfile.ZIP_DEFLATED) as destino:
+        for nome, conteudo in membros.items():
+            destino.writestr(nome, conteudo)
+    return str(caminho)
+
+
+@pytest.fixture
+def temporarios(monkeypatch):
+    """Caminhos criados por copiar_para_temporario durante o teste"""
+    criados = []
+    copiar = main.copiar_para_temporario
+
+    def copiar_para_temporario(origem, filename):
+        caminho, sha256 = copiar(origem, filename)
+        criados.append(caminho)
+        return caminho, sha256
+
+    monkeypatch.setattr(main, 'copiar_para_temporario', copiar_para_temporario)
+    yield criados
+    for caminho in criados:
+        if os.path.exists(caminho):
+            os.remove(caminho)
+
+
+def test_zip_extrai_extratos_com_banco_da_pasta(tmp_path, temporarios):
+    caminho = _zip(tmp_path / 'lote.zip', {
+        'EDUCAÇÃO/fev.csv': 'a;b\n', 'mar.csv': 'a;b\n', 'leia-me.txt': 'x', '__MACOSX/._fev.csv': 'x'
+    })
+
+    extraidos = main.extrair_zip_extratos(caminho, 'AAI')
+
+    assert [(nome, banco) for _, _, nome, banco in extraidos] == [('fev.csv', 'EDUCAÇÃO'), ('mar.csv', 'AAI')]
+    assert not os.path.exists(caminho)
+
+
+@pytest.mark.parametrize('limite, valor, membros', [
+    # Zip bomb: poucos bytes compactados, muitos descompactados
+    ('ZIP_MAX_BYTES_ARQUIVO', 1024, {'a.csv': '0' * 10_000}),
+    ('ZIP_MAX_BYTES_TOTAL', 15_000, {'a.csv': '0' * 10_000, 'b.csv': '0' * 10_000}),
+    ('ZIP_MAX_ENTRADAS', 3, {f"{i}.txt": 'x' for i in range(4)}),
+])
+def test_zip_acima_dos_limites_e_recusado_sem_extrair(tmp_path, temporarios, monkeypatch, limite, valor, membros):
+    monkeypatch.setattr(main, limite, valor)
+    caminho = _zip(tmp_path / 'lote.zip', membros)
+
+    with pytest.raises(HTTPException) as erro:
+        main.extrair_zip_extratos(caminho, 'AAI')
+
+    assert erro.value.status_code in (400, 413)
+    assert temporarios == []
+    assert not os.path.exists(caminho)
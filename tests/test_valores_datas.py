@@ -0,0 +1,129 @@
+# tests/test_valores_datas.py
+"""
+Conversão colunar de valores (processar_valores_moeda) e datas (converter_datas),
+célula a célula contra a leitura linha a linha (tests/referencia_linha_a_linha.py)
+"""
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import referencia_linha_a_linha as referencia
+from extrato_service import converter_datas, processar_valores_moeda
+
+# (célula, inválida?) - texto que não é número vira 0.0, como na referência, e é contado
+CELULAS_MOEDA = [
+    ('1.234,56', False),
+    ('-1.234,56', False),
+    ('1.234.567,89', False),
+    ('R$ 1.234,56', False),
+    ('R$ -100,00', False),
+    ('R$-0,01', False),
+    (' 50,5 ', False),
+    ('1 234,56', False),
+    ('(123,45)', True),
+    ('R$', False),
+    ('', False),
+    ('   ', False),
+    ('-', False),
+    ('abc', True),
+    ('12,34,56', True),
+    (12.5, False),
+    (-3, False),
+    (np.nan, False),
+    (None, False),
+]
+
+
+@pytest.mark.parametrize('celula, invalida', CELULAS_MOEDA)
+def test_valor_igual_ao_linha_a_linha(celula, invalida):
+    valores, invalidos = processar_valores_moeda(pd.Series([celula], dtype=object))
+
+    assert valores.iloc[0] == referencia.processar_valor_moeda(celula)
+    assert bool(invalidos.iloc[0]) is invalida
+
+
+def test_coluna_inteira_igual_ao_linha_a_linha():
+    serie = pd.Series([celula for celula, _ in CELULAS_MOEDA], dtype=object)
+    valores, invalidos = processar_valores_moeda(serie)
+
+    assert valores.tolist() == [referencia.processar_valor_moeda(celula) for celula in serie]
+    assert invalidos.tolist() == [invalida for _, invalida in CELULAS_MOEDA]
+    assert valores.dtype == 'float64'
+
+
+def test_coluna_numerica_do_excel():
+    valores, invalidos = processar_valores_moeda(pd.Series([1.5, np.nan, -2.0]))
+
+    assert valores.tolist() == [1.5, 0.0, -2.0]
+    assert not invalidos.any()
+
+
+def test_celula_nao_textual_invalida_vira_nan():
+    # Ex.: data numa coluna de valor do Excel - a linha é descartada
+    valores, invalidos = processar_valores_moeda(pd.Series(['1,00', datetime(2025, 2, 1)], dtype=object))
+
+    assert valores.iloc[0] == 1.0 and np.isnan(valores.iloc[1])
+    assert invalidos.tolist() == [False, True]
+
+
+def test_decimal_com_ponto():
+    valores, invalidos = processar_valores_moeda(pd.Series(['1,234.56', '-0.5', 'R$ 10']), decimal='.')
+
+    assert valores.tolist() == [1234.56, -0.5, 10.0]
+    assert not invalidos.any()
+
+
+def _linha_a_linha(textos, formato):
+    return [datetime.strptime(texto, formato).strftime('%Y-%m-%d') for texto in textos]
+
+
+@pytest.mark.parametrize('textos, formato', [
+    (['01/02/2025', '28/02/2025', '31/12/1999'], '%d/%m/%Y'),
+    (['01/02/25', '28/02/25', '31/12/99'], '%d/%m/%y'),
+    (['2025-02-01', '2025-02-28'], '%Y-%m-%d'),
+    (['01.02.2025', '28.02.2025'], '%d.%m.%Y'),
+    (['01/02/2025 10:30:00', '28/02/2025 00:00:00'], '%d/%m/%Y %H:%M:%S'),
+])
+def test_datas_detectadas_iguais_ao_linha_a_linha(textos, formato):
+    datas, invalidas, detectado = converter_datas(pd.Series(textos, dtype=object))
+
+    assert detectado == formato
+    assert datas.tolist() == _linha_a_linha(textos, formato)
+    assert not invalidas.any()
+
+
+def test_ano_com_dois_digitos_nao_vira_ano_25():
+    datas, _, formato = converter_datas(pd.Series(['01/02/25']))
+    assert (datas.iloc[0], formato) == ('2025-02-01', '%d/%m/%y')
+
+
+def test_formato_em_cache_que_nao_serve_e_detectado_de_novo():
+    datas, invalidas, formato = converter_datas(pd.Series(['01/02/25', '02/02/25']), '%d/%m/%Y')
+
+    assert formato == '%d/%m/%y'
+    assert datas.tolist() == ['2025-02-01', '2025-02-02']
+    assert not invalidas.any()
+
+
+def test_datas_invalidas_marcadas():
+    textos = pd.Series(['01/02/2025', '31/02/2025', 'abc', '', '02/02/2025'], dtype=object)
+    datas, invalidas, formato = converter_datas(textos)
+
+    assert formato == '%d/%m/%Y'
+    assert invalidas.tolist() == [False, True, True, True, False]
+    assert datas[~invalidas].tolist() == ['2025-02-01', '2025-02-02']
+
+
+def test_datas_tipadas_pelo_excel():
+    # Timestamp: a referência usava strftime('%Y-%m-%d')
+    celulas = [pd.Timestamp('2025-02-01'), datetime(2025, 2, 2, 15, 0), '03/02/2025']
+    datas, invalidas, _ = converter_datas(pd.Series(celulas, dtype=object))
+
+    assert datas.tolist() == ['2025-02-01', '2025-02-02', '2025-02-03']
+    assert not invalidas.any()
+
+    datas, invalidas, _ = converter_datas(pd.Series(pd.to_datetime(['2025-02-01', None])))
+    assert datas.iloc[0] == '2025-02-01'
+    assert invalidas.tolist() == [False, True]
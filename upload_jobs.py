@@ -0,0 +1,141 @@
+# upload_jobs.py
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from loguru import logger
+
+from cache_service import cache
+
+# Etapas de um job de upload
+ETAPA_NA_FILA = 'NA_FILA'
+ETAPA_PROCESSANDO = 'PROCESSANDO'
+ETAPA_SALVANDO = 'SALVANDO'
+ETAPA_CONCLUIDO = 'CONCLUIDO'
+ETAPA_ERRO = 'ERRO'
+
+
+class UploadJob:
+    """
+    Estado de um upload processado em segundo plano. Cada mudança é gravada
+    no cache (Redis/L1), para que qualquer worker responda ao polling
+    """
+
+    def __init__(self, arquivo: str, banco: str, job_id: Optional[str] = None):
+        agora = datetime.now().isoformat()
+        self.estado: Dict[str, Any] = {
+            'job_id': job_id or str(uuid.uuid4()),
+            'arquivo': arquivo,
+            'banco': banco,
+            'etapa': ETAPA_NA_FILA,
+            'linhas_processadas': 0,
+            'linhas_inseridas': 0,
+            'erros': [],
+            'resumo': None,
+            'criado_em': agora,
+            'atualizado_em': agora
+        }
+        self._salvar()
+
+    @property
+    def job_id(self) -> str:
+        return self.estado['job_id']
+
+    @staticmethod
+    def obter(job_id: str) -> Optional[Dict[str, Any]]:
+        """Estado atual do job (None se não existe ou expirou)"""
+        return cache.get_upload_job(job_id)
+
+    def _salvar(self):
+        self.estado['atualizado_em'] = datetime.now().isoformat()
+        cache.set_upload_job(self.job_id, dict(self.estado))
+
+    def etapa(self, etapa: str):
+        """Registrar mudança de etapa"""
+        logger.info(f"Job {self.job_id}: {etapa}")
+        self.estado['etapa'] = etapa
+        self._salvar()
+
+    def linhas_processadas(self, quantidade: int):
+        """Somar linhas transformadas em transações"""
+        self.estado['linhas_processadas'] += quantidade
+        self._salvar()
+
+    def linhas_inseridas(self, quantidade: int):
+        """Somar transações gravadas no banco"""
+        self.estado['linhas_inseridas'] += quantidade
+        self._salvar()
+
+    def erro(self, mensagem: str):
+        """Registrar erro sem interromper o job (ex.: lote não salvo)"""
+        self.estado['erros'].append(mensagem)
+        self._salvar()
+
+    def concluir(self, resumo: Dict[str, Any]):
+        """Finalizar com sucesso guardando o resumo do upload"""
+        self.estado['resumo'] = resumo
+        self.etapa(ETAPA_CONCLUIDO)
+
+    def falhar(self, mensagem: str):
+        """Finalizar com erro"""
+        self.estado['erros'].append(mensagem)
+        self.etapa(ETAPA_ERRO)
+
+
+class UploadLote:
+    """
+    Vários uploads enviados juntos. Guarda apenas os ids dos jobs de cada
+    arquivo; o estado consolidado é montado na leitura a partir deles
+    """
+
+    def __init__(self, jobs: List[UploadJob], lote_id: Optional[str] = None):
+        self.lote_id = lote_id or str(uuid.uuid4())
+        cache.set_upload_job(f"lote:{self.lote_id}", {
+            'lote_id': self.lote_id,
+            'jobs': [job.job_id for job in jobs],
+            'criado_em': datetime.now().isoformat()
+        })
+
+    @staticmethod
+    def obter(lote_id: str) -> Optional[Dict[str, Any]]:
+        """Estado consolidado do lote (None se não existe ou expirou)"""
+        lote = cache.get_upload_job(f"lote:{lote_id}")
+        if not lote:
+            return None
+
+        arquivos = [UploadJob.obter(job_id) or {'job_id': job_id, 'etapa': ETAPA_ERRO, 'erros': ['Job expirado']}
+                    for job_id in lote['jobs']]
+        resumo = {
+            'arquivos': len(arquivos),
+            'arquivos_com_erro': 0,
+            'arquivos_duplicados': 0,
+            'arquivos_saldo_inconsistente': 0,
+            'total_transacoes': 0,
+            'transacoes_salvas': 0,
+            'transacoes_ignoradas': 0,
+            'creditos': 0,
+            'debitos': 0,
+            'valor_total': 0.0
+        }
+        for arquivo in arquivos:
+            if arquivo['etapa'] == ETAPA_ERRO:
+                resumo['arquivos_com_erro'] += 1
+            elif arquivo['etapa'] == ETAPA_CONCLUIDO:
+                resumo_arquivo = arquivo['resumo']
+                resumo['arquivos_duplicados'] += int(bool(resumo_arquivo.get('duplicado')))
+                integridade = resumo_arquivo.get('integridade') or {}
+                resumo['arquivos_saldo_inconsistente'] += int(integridade.get('verificado', False)
+                                                              and not integridade['consistente'])
+                for campo in ('total_transacoes', 'transacoes_salvas', 'transacoes_ignoradas', 'creditos', 'debitos'):
+                    resumo[campo] += resumo_arquivo.get(campo, 0)
+                resumo['valor_total'] += resumo_arquivo.get('valor_total', 0.0)
+        resumo['valor_total'] = round(resumo['valor_total'], 2)
+
+        finalizado = all(a['etapa'] in (ETAPA_CONCLUIDO, ETAPA_ERRO) for a in arquivos)
+        return {
+            'lote_id': lote_id,
+            'etapa': ETAPA_CONCLUIDO if finalizado else ETAPA_PROCESSANDO,
+            'criado_em': lote['criado_em'],
+            'resumo': resumo,
+            'arquivos': arquivos
+        }